@@ -124,6 +124,14 @@ def configTypeInfo (config: Config.Config) -> None:
     config.setType("showMatchList", Config.typeDefaultBool(False))
     config.setType("previewLines",  Config.typeDefaultInt(5))
     config.setType("commonKeywords", Config.typeDefaultString(""))
+    config.setType("searchCacheSize", Config.typeDefaultInt(64))
+    config.setType("verificationThreads", Config.typeDefaultInt(8))
+    config.setType("verificationProcesses", Config.typeDefaultInt(0))
+    config.setType("streamSearchResults", Config.typeDefaultBool(True))
+    config.setType("completeKeywords", Config.typeDefaultBool(True))
+    config.setType("verificationPageSize", Config.typeDefaultInt(500))
+    config.setType("regExFileBudget", Config.typeDefaultInt(10))
+    config.setType("regExSearchBudget", Config.typeDefaultInt(300))
     config.setType("updateCheckPeriod",  Config.typeDefaultInt(0))
     config.setType("matchOverFiles",  Config.typeDefaultBool(False))
     config.setType("activateFirstMatch", Config.typeDefaultBool(False))
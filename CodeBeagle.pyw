@@ -22,7 +22,7 @@ from tools import FileTools
 # if we are executed from a different working directory. This must even be done before other imports. 
 FileTools.switchToAppDir()
 
-import os, sys, subprocess, shutil
+import os, sys, subprocess, shutil, multiprocessing
 from PyQt5.QtCore import QSettings, QUrl, pyqtSlot, Qt
 from PyQt5.QtGui import QDesktopServices, QCloseEvent, QColor
 from PyQt5.QtWidgets import QApplication, QMainWindow, QMessageBox
@@ -182,4 +182,6 @@ def installDesktopFile() -> None:
         print("Failed to install Desktop file: " + str(e))
 
 if __name__ == "__main__":
+    # Needed by the frozen executable to start the processes which verify search results
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# The standard library modules which cx_Freeze leaves out of the Windows build. A module which CodeBeagle or UpdateIndex
+# imports must not be listed, the frozen exe fails with an ImportError as soon as it is loaded. E.g. the verification
+# pools need queue, multiprocessing and concurrent.futures. TestFreezeConfig imports the search modules with these
+# modules blocked. Run it after adding an import of a standard library module.
+
+import os
+import sys
+import subprocess
+import unittest
+from typing import List
+
+windowsExcludes = ["distutils", "html", "lib2to3", "xml", "test", "tkinter", "pydoc_data", "bz2", "lzma", "ssl",
+                   "pyreadline", "decimal", "curses", "zipfile", "sysconfig"]
+
+# Modules which import everything the search and the index update need from the standard library
+runtimeModules = ["fulltextindex.FullTextIndex", "fulltextindex.IndexUpdater", "fulltextindex.Verification",
+                  "fulltextindex.DirectSearch", "fulltextindex.RegExGuard", "SearchAsync"]
+
+# Runs in a separate interpreter. Imports of excluded modules fail like in the frozen exe, optional imports which
+# catch the ImportError still work. The pools are created because they import parts of multiprocessing on demand.
+checkScript = """
+import sys, importlib
+excludes = set(sys.argv[1].split(","))
+class ExcludedFinder:
+    @staticmethod
+    def find_spec(name, path=None, target=None):
+        if name.split(".")[0] in excludes:
+            raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+        return None
+sys.meta_path.insert(0, ExcludedFinder)
+for name in sys.argv[2].split(","):
+    importlib.import_module(name)
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+ThreadPoolExecutor(1).shutdown()
+ProcessPoolExecutor(1).shutdown()
+"""
+
+def checkImports(excludes: List[str], modules: List[str]) -> str:
+    """Imports 'modules' with the modules in 'excludes' blocked. Returns the error output, it is empty on success."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=root, QT_QPA_PLATFORM="offscreen")
+    process = subprocess.run([sys.executable, "-c", checkScript, ",".join(excludes), ",".join(modules)], cwd=root,
+                             env=env, capture_output=True, text=True)
+    return process.stderr if process.returncode else ""
+
+class TestFreezeConfig(unittest.TestCase):
+    def test_excludes(self) -> None:
+        self.assertEqual(checkImports(windowsExcludes, runtimeModules), "")
+        self.assertIn("No module named 'queue'", checkImports(windowsExcludes + ["queue"], runtimeModules))
+        # The direct search imports queue itself and lists directories on a thread pool
+        error = checkImports(windowsExcludes + ["queue"], ["fulltextindex.DirectSearch"])
+        self.assertIn("DirectSearch.py", error)
+
+if __name__ == "__main__":
+    unittest.main()
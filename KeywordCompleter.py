@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Completes the keyword under the cursor of the search text with the keywords of the index. The most common
+# keywords are offered first. The keywords are looked up by a background thread, each keystroke replaces the
+# pending request and results which arrive after the text changed again are dropped.
+
+import re
+import logging
+import threading
+from typing import Callable, List, Optional, Tuple
+from PyQt5.QtCore import QObject, QStringListModel, Qt, pyqtSignal, pyqtSlot
+from PyQt5.QtWidgets import QCompleter, QLineEdit
+from fulltextindex import SearchMethods
+from fulltextindex.IndexConfiguration import IndexConfiguration
+
+# Keywords shorter than this are not completed, there are too many candidates
+minCompletionPrefix = 2
+
+reKeywordBeforeCursor = re.compile(r"\w+$")
+
+# Returns the location whose keywords complete the search text or None if nothing should be completed
+LocationFunction = Callable[[], Optional[IndexConfiguration]]
+
+class KeywordCompleter (QObject):
+    # Request number, completed keyword, completions
+    completionsFound = pyqtSignal(int, str, list)
+
+    def __init__(self, lineEdit: QLineEdit, location: LocationFunction) -> None:
+        super().__init__(lineEdit)
+        self.lineEdit = lineEdit
+        self.location = location
+        self.model = QStringListModel(self)
+        self.completer = QCompleter(self.model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.setCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        # Not installed as completer of the line edit which already completes the search history
+        self.completer.setWidget(lineEdit)
+        self.completer.activated[str].connect(self.insertCompletion) # pylint: disable=unsubscriptable-object
+        self.completionsFound.connect(self.showCompletions)
+        lineEdit.textEdited.connect(self.textEdited)
+
+        self.lock = threading.Lock()
+        self.requestId = 0
+        self.pending: Optional[Tuple[int, str, IndexConfiguration]] = None
+        self.working = False
+
+    def isCompleting(self) -> bool:
+        """True if a completion is selected in the popup. Return inserts it instead of starting the search."""
+        popup = self.completer.popup()
+        return popup.isVisible() and popup.currentIndex().isValid()
+
+    def __keywordBeforeCursor(self) -> Tuple[int, str]:
+        """Returns the start and the text of the keyword in front of the cursor."""
+        textBefore = self.lineEdit.text()[:self.lineEdit.cursorPosition()]
+        if textBefore.rfind("<!") > textBefore.rfind("!>"):
+            # Inside of a regular expression
+            return len(textBefore), ""
+        match = reKeywordBeforeCursor.search(textBefore)
+        if not match:
+            return len(textBefore), ""
+        return match.start(), match.group()
+
+    @pyqtSlot(str)
+    def textEdited(self, _: str) -> None:
+        keyword = self.__keywordBeforeCursor()[1]
+        indexConf = self.location() if len(keyword) >= minCompletionPrefix else None
+        with self.lock:
+            # Results of older requests are dropped
+            self.requestId += 1
+            if not indexConf:
+                self.pending = None
+            else:
+                self.pending = (self.requestId, keyword, indexConf)
+                if not self.working:
+                    self.working = True
+                    threading.Thread(target=self.__lookup, name="KeywordCompletion", daemon=True).start()
+        if not indexConf:
+            self.completer.popup().hide()
+
+    def __lookup(self) -> None:
+        """Runs in the background until there are no more requests."""
+        while True:
+            with self.lock:
+                request = self.pending
+                self.pending = None
+                if not request:
+                    self.working = False
+                    return
+            requestId, keyword, indexConf = request
+            completions: List[str] = []
+            try:
+                completions = [completion for completion, _ in SearchMethods.completeKeyword(keyword, indexConf)]
+            except Exception as e:
+                logging.warning("Failed to complete '%s': %s", keyword, str(e))
+            self.completionsFound.emit(requestId, keyword, completions)
+
+    @pyqtSlot(int, str, list)
+    def showCompletions(self, requestId: int, keyword: str, completions: List[str]) -> None:
+        if requestId != self.requestId or self.__keywordBeforeCursor()[1] != keyword or not self.lineEdit.hasFocus():
+            return
+        completions = [completion for completion in completions if completion != keyword.lower()]
+        historyPopup = self.lineEdit.completer().popup() if self.lineEdit.completer() else None
+        if not completions or (historyPopup and historyPopup.isVisible()):
+            self.completer.popup().hide()
+            return
+        self.model.setStringList(completions)
+        self.completer.complete()
+
+    @pyqtSlot(str)
+    def insertCompletion(self, completion: str) -> None:
+        start, keyword = self.__keywordBeforeCursor()
+        # The keywords of the index are lower case, keep the case of what was typed
+        completed = keyword + completion[len(keyword):]
+        self.lineEdit.setSelection(start, len(keyword))
+        self.lineEdit.insert(completed)
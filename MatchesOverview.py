@@ -18,8 +18,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import unittest
 import bisect
-import re
 import threading
+from array import array
 from typing import List, Tuple, Optional, Callable, cast
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QFontMetrics, QFont, QWheelEvent
@@ -76,56 +76,37 @@ class FixedSizeSourcePreview(SourceHighlightingTextEdit):
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.wheelEvent = lambda event: None  # type: ignore[method-assign]
 
-class Line:
-    def __init__(self, charPos: int, lineNumber: int) -> None:
-        self.charPos = charPos
-        self.lineNumber = lineNumber
-
-    def __lt__ (self, other: 'Line') -> bool:
-        return self.charPos < other.charPos
-
 # Detects quickly which character position corresponds to which line number.
 # The first line numer is 1.
 class LineMapping:
     def __init__(self,text: str) -> None:
-        self.list: List[Line] = []
-        self.numberMap = {1:0} # line 1 always starts at 0
+        # Positions of the line breaks. Line n ends at lineBreaks[n-1].
+        self.lineBreaks = array("q")
         self.text = text
 
-        reLineBreak = re.compile("\\n")
-        cur = 0
-        line = 1
-        while True:
-            result = reLineBreak.search(text, cur)
-            if result:
-                startPos, endPos = result.span()
-                self.list.append(Line(startPos,line))
-                self.numberMap[line+1] = endPos
-                cur = endPos
-                line = line + 1
-            else:
-                break
+        cur = text.find("\n")
+        while cur != -1:
+            self.lineBreaks.append(cur)
+            cur = text.find("\n", cur+1)
 
     def findLineNumber (self, charPos: int) -> int:
-        if not self.list:
+        if not self.lineBreaks:
             return 0
-        pos = bisect.bisect_left (self.list,  Line(charPos,0))
-        if pos >= len(self.list):
-            return self.list[-1].lineNumber+1
-        return self.list[pos].lineNumber
+        return bisect.bisect_left(self.lineBreaks, charPos) + 1
 
     def getLine(self, lineNumber: int) -> str:
-        if lineNumber == 0 or lineNumber > len(self.numberMap):
+        if lineNumber == 0 or lineNumber > self.lineCount():
             return ""
-        startPos = self.numberMap[lineNumber]
-        if lineNumber == len(self.numberMap):
+        # Line 1 always starts at 0
+        startPos = self.lineBreaks[lineNumber-2]+1 if lineNumber > 1 else 0
+        if lineNumber == self.lineCount():
             endPos = len(self.text)
         else:
-            endPos = self.numberMap[lineNumber+1]-1
+            endPos = self.lineBreaks[lineNumber-1]
         return self.text [startPos:endPos]
 
     def lineCount(self) -> int:
-        return len(self.numberMap)
+        return len(self.lineBreaks)+1
 
 class TestLineMapping(unittest.TestCase):
     def test(self) -> None:
@@ -158,7 +139,7 @@ class MatchesInFile:
 
 # Returns a list of all matches in all files
 # This reads all files and retrieves the matches with some lines surounding them
-def extractMatches (matches: List[str], searchData: FullTextIndex.ContentQuery, linesOfContext: int, 
+def extractMatches (matches: List[str], searchData: FullTextIndex.ContentQuery, linesOfContext: int, encodingHints: Optional[FullTextIndex.EncodingHints]=None,
                     cancelEvent: Optional[threading.Event]=None, reportProgress: Optional[FullTextIndex.ProgressFunction]=None) -> List[MatchesInFile]:
     results: List[MatchesInFile] = []
     lenMatches = len(matches)
@@ -167,7 +148,7 @@ def extractMatches (matches: List[str], searchData: FullTextIndex.ContentQuery,
     for name in matches:
         matchList = MatchesInFile(name)
         try:
-            text = freadall(name)
+            text = freadall(name, encodingHint=encodingHints.get(name) if encodingHints else None)
         except:
             matchList.addMatches(0, ["Failed to open file"])
         else:
@@ -211,6 +192,7 @@ class MatchesOverview (QWidget):
         self.ui.setupUi(self)  # type: ignore[no-untyped-call]
         self.matches: Optional[List[str]] = None
         self.searchData: Optional[FullTextIndex.Query] = None
+        self.encodingHints: Optional[FullTextIndex.EncodingHints] = None
         self.resultHandled = True
         self.sourceFont: QFont = self.font()
         self.lineHeight = 0
@@ -242,9 +224,11 @@ class MatchesOverview (QWidget):
         if self.matches and self.isVisible():
             self.__handleResult()
 
-    def setSearchResult(self, matches: List[str], searchData: Optional[FullTextIndex.Query]) -> None:
+    def setSearchResult(self, matches: List[str], searchData: Optional[FullTextIndex.Query],
+                        encodingHints: Optional[FullTextIndex.EncodingHints] = None) -> None:
         self.matches = matches
         self.searchData = searchData
+        self.encodingHints = encodingHints
         self.resultHandled = False
 
         if self.isVisible():
@@ -266,7 +250,7 @@ class MatchesOverview (QWidget):
         self.matchIndexes = []
 
         if self.matches:
-            results = AsynchronousTask.execute (self, extractMatches, self.matches, self.searchData, self.linesOfContext,
+            results = AsynchronousTask.execute (self, extractMatches, self.matches, self.searchData, self.linesOfContext, self.encodingHints,
                                                 bEnableCancel=True, hasProgress=True)
 
             for result in results:
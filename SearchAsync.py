@@ -18,7 +18,8 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
 import re
-from typing import Pattern, Iterator, cast, Optional
+import functools
+from typing import Pattern, Iterator, Tuple, cast, Optional, Collection
 from PyQt5.QtCore import QObject
 from tools import AsynchronousTask
 from tools.FileTools import fopen
@@ -26,12 +27,14 @@ from fulltextindex import FullTextIndex, IndexConfiguration
 from fulltextindex.IStringMatcher import IStringMatcher, MatchPosition
 from fulltextindex.SearchMethods import SearchMethods, ResultSet, removeDupsAndSort
 from fulltextindex.Query import QueryParams, ContentQuery, FileQuery
+from fulltextindex.Verification import VerificationPager
 
-__all__ = ['ResultSet', 'searchContent', 'searchFileName', 'customSearchScript']
+__all__ = ['ResultSet', 'searchContent', 'searchContentStreaming', 'searchFileName', 'searchFileNameFuzzy', 'customSearchScript']
 
-def searchContent(parent: QObject, params: QueryParams, indexConf: IndexConfiguration.IndexConfiguration, commonKeywordMap: Optional[FullTextIndex.CommonKeywordMap] = None) -> ResultSet:
+def searchContent(parent: QObject, params: QueryParams, indexConf: IndexConfiguration.IndexConfiguration, commonKeywordMap: Optional[FullTextIndex.CommonKeywordMap] = None,
+                  scope: Optional[Collection[str]] = None) -> ResultSet:
     """This executes an indexed or a direct search in the file content. This depends on the IndexConfiguration
-       setting "indexUpdateMode" and "indexType"."""
+       setting "indexUpdateMode" and "indexType". If 'scope' is passed only these files are searched."""
     commonKeywordMap = commonKeywordMap or {}
 
     if not params.strSearch:
@@ -41,11 +44,38 @@ def searchContent(parent: QObject, params: QueryParams, indexConf: IndexConfigur
     result: ResultSet
 
     ftiSearch = SearchMethods()
-    result = AsynchronousTask.execute(parent, ftiSearch.searchContent, searchData, indexConf, commonKeywordMap, bEnableCancel=True, cancelAction=ftiSearch.cancel, hasProgress=True)
+    search = functools.partial(ftiSearch.searchContent, scope=scope)
+    result = AsynchronousTask.execute(parent, search, searchData, indexConf, commonKeywordMap, bEnableCancel=True, cancelAction=ftiSearch.cancel, hasProgress=True)
     result.label = params.strSearch
 
     return result
 
+def searchContentStreaming(params: QueryParams, indexConf: IndexConfiguration.IndexConfiguration,
+                           commonKeywordMap: Optional[FullTextIndex.CommonKeywordMap] = None,
+                           pager: Optional[VerificationPager] = None,
+                           scope: Optional[Collection[str]] = None) -> Tuple[AsynchronousTask.StreamingTask, ContentQuery]:
+    """Prepares a content search which runs in the background. The returned task emits 'matchesFound' with batches of
+       verified matches and 'progressChanged'. Once it is finished its result is the complete ResultSet. The caller starts the task.
+       If 'pager' is passed the verification of many candidates pauses after each page of matches until more are requested.
+       If 'scope' is passed only these files are searched."""
+    commonKeywordMap = commonKeywordMap or {}
+
+    searchData = ContentQuery(params)
+    ftiSearch = SearchMethods()
+    search = functools.partial(ftiSearch.searchContent, pager=pager, scope=scope)
+    task = AsynchronousTask.StreamingTask(search, searchData, indexConf, commonKeywordMap, cancelAction=ftiSearch.cancel)
+    return task, searchData
+
+def searchFileNameFuzzy(parent: Optional[QObject], params: QueryParams, indexConf: IndexConfiguration.IndexConfiguration) -> ResultSet:
+    """Finds files by an abbreviation of their name. Without a parent the search runs in the calling thread, this is
+       fast once the names are loaded."""
+    searchData = FileQuery(params)
+    ftiSearch = SearchMethods()
+    if parent is None:
+        return ftiSearch.searchFileNameFuzzy(searchData, indexConf)
+    result: ResultSet = AsynchronousTask.execute(parent, ftiSearch.searchFileNameFuzzy, searchData, indexConf)
+    return result
+
 def searchFileName(parent: QObject, params: QueryParams, indexConf: IndexConfiguration.IndexConfiguration) -> ResultSet:
     """This executes an indexed or a direct search for the file name. This depends on the IndexConfiguration
        setting "indexUpdateMode" and "indexType"."""
@@ -17,9 +17,9 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os, sys
-from typing import List, Tuple, Optional, cast
+from typing import List, Tuple, Optional, Callable, cast
 from enum import IntEnum
-from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QPoint, QUrl, QModelIndex, QPropertyAnimation, QEasingCurve
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QPoint, QUrl, QModelIndex, QPropertyAnimation, QEasingCurve, QSize
 from PyQt5.QtGui import QFont, QDesktopServices, QShowEvent, QFocusEvent, QPixmap, QIcon, QKeySequence
 from PyQt5.QtWidgets import QFrame, QWidget, QApplication, QMenu, QMessageBox, QFileDialog, QComboBox
 from tools.QHelper import createQAction
@@ -31,6 +31,11 @@ from dialogs import StackTraceMessageBox
 import PathVisualizerDelegate
 from fulltextindex import FullTextIndex
 from fulltextindex import Query
+from fulltextindex import KeywordCaching
+from fulltextindex import Verification
+from fulltextindex import DirectSearch
+from fulltextindex import Facets
+from fulltextindex import SearchMethods
 from fulltextindex.IndexConfiguration import IndexConfiguration, IndexMode
 from fulltextindex.Query import QueryParams
 from fulltextindex.CommentRule import CommentRule
@@ -39,10 +44,17 @@ import CustomContextMenu
 import AppConfig
 import HighlightingRulesCache
 from SearchPageBookmarks import SearchPageBookmarks
+from KeywordCompleter import KeywordCompleter
 from StringListModel import StringListModel
 from Ui_SearchPage import Ui_SearchPage
 from SearchParamHistory import getSearchParamHistory
 
+# Number of entries per section of the facets menu
+maxFacetEntries = 10
+
+# Number of days covered by the entries of the modification time filter, 0 means any time
+modifiedWithinDays = [0, 1, 7, 30, 365]
+
 userHintUseWildcards = """
 <p align='justify'>The search matches words exactly as entered. In order to match words with unknown parts use the asterisk as wildcard.
 E.g. <b>part*</b> matches also <b>partial</b>. See the help for more information about the search syntax.</p>
@@ -75,16 +87,31 @@ def restoreSearchItem(storageKey: str, comboBox: QComboBox) -> None:
 class SearchType(IntEnum):
     SearchContent = 1
     SearchName = 2
+    GoToFile = 3 # fuzzy name search while typing
 
 class SearchState:
-    def __init__(self, searchType: SearchType, configName: str, searchParams: QueryParams, resultSet: SearchAsync.ResultSet, lockedResultSet: Optional[FullTextIndex.SearchResult]):
+    def __init__(self, searchType: SearchType, configName: str, searchParams: QueryParams, resultSet: SearchAsync.ResultSet, lockedResultSet: Optional[FullTextIndex.SearchResult],
+                 modifiedRange: int = 0):
         self.searchType: SearchType = searchType
         self.configName: str = configName
         self.searchParams: QueryParams = searchParams
+        self.modifiedRange: int = modifiedRange # index of the modification time filter, the parameters contain the absolute time
         self.resultSet: SearchAsync.ResultSet = resultSet
         self.lockedResultSet: Optional[FullTextIndex.SearchResult] = lockedResultSet
         self.selectedFileIndex: int = -1
 
+class StreamingSearch:
+    """A content search running in the background whose matches are added to 'model' as they are found."""
+    def __init__(self, task: AsynchronousTask.StreamingTask, searchData: Query.ContentQuery, params: QueryParams,
+                 indexConf: IndexConfiguration, model: StringListModel):
+        self.task = task
+        self.searchData = searchData
+        self.params = params
+        self.indexConf = indexConf
+        self.model = model
+        self.progress = 0
+        self.pager: Optional[Verification.VerificationPager] = None
+
 class SearchPage (QWidget):
     # Triggered when a new search tab is requested which should be opened using a given search string
     # First parameter is the search string, the second the display name of the search configuration (IndexConfiguration)
@@ -110,7 +137,8 @@ class SearchPage (QWidget):
         self.ui.listView.doubleClicked.connect(self.openFileWithSystem)
         self.ui.listView.customContextMenuRequested.connect(self.contextMenuRequested)
         self.ui.listView.clicked.connect(self.fileSelected)
-        self.ui.comboSearch.lineEdit().returnPressed.connect(self.performSearch)
+        self.ui.comboSearch.lineEdit().returnPressed.connect(self.searchTextEntered)
+        self.ui.comboSearch.editTextChanged.connect(self.searchTextChanged)
         self.ui.comboFolderFilter.lineEdit().returnPressed.connect(self.performSearch)
         self.ui.comboExtensionFilter.lineEdit().returnPressed.connect(self.performSearch)
         self.ui.sourceViewer.selectionFinishedWithKeyboardModifier.connect(self.newSearchBasedOnSelection)
@@ -121,7 +149,7 @@ class SearchPage (QWidget):
         self.ui.buttonRegEx.clicked.connect(self.showRegExTester)
         self.ui.comboLocation.currentIndexChanged[str].connect(self.currentLocationChanged) # pylint: disable=unsubscriptable-object
         self.ui.buttonSwitchView.clicked.connect(self.switchView)
-        self.ui.buttonSearch.clicked.connect(self.performSearch)
+        self.ui.buttonSearch.clicked.connect(self.searchButtonClicked)
         self.ui.buttonLockResultSet.clicked.connect(self.lockResultSet)
         self.ui.buttonInfo.clicked.connect(self.performanceInfo)
         self.ui.buttonExport.clicked.connect(self.exportMatches)
@@ -130,10 +158,12 @@ class SearchPage (QWidget):
         self.ui.buttonBackward.clicked.connect(self.backwardClicked)
         self.ui.buttonForward.clicked.connect(self.forwardClicked)
         self.ui.buttonToggleFilters.clicked.connect(self.toggleFilterPanel)
+        self.ui.buttonFacets.clicked.connect(self.showFacets)
         self.ui.comboFolderFilter.currentTextChanged.connect(self.updateFilterPreview)
         self.ui.comboExtensionFilter.currentTextChanged.connect(self.updateFilterPreview)
         self.ui.checkCaseSensitive.stateChanged.connect(self.updateFilterPreview)
         self.ui.checkExcludeComments.stateChanged.connect(self.updateFilterPreview)
+        self.ui.comboModified.currentIndexChanged.connect(self.updateFilterPreview)
 
         # Initialize filter panel state based on configuration
         expandByDefault = AppConfig.appConfig().expandFilterPanelByDefault
@@ -169,12 +199,19 @@ class SearchPage (QWidget):
         self.searchLocationList: List[IndexConfiguration] = []
         self.unavailableConfigName: str = ""
         self.commonKeywordMap = self.__loadCommonKeywordMap()
+        KeywordCaching.setCacheSize(AppConfig.appConfig().searchCacheSize * 1024 * 1024)
+        Verification.configureVerification(AppConfig.appConfig().verificationThreads, AppConfig.appConfig().verificationProcesses)
+        Verification.configureRegExBudget(AppConfig.appConfig().regExFileBudget, AppConfig.appConfig().regExSearchBudget)
         self.sourceFont: QFont = self.font()
 
         self.currentConfigName = self.__chooseInitialLocation ()
         self.searchType: SearchType = SearchType.SearchContent
         self.matches: FullTextIndex.SearchResult = []
-        self.lockedResultSet: Optional[FullTextIndex.SearchResult] = None # matches are filtered with this set
+        self.lockedResultSet: Optional[FullTextIndex.SearchResult] = None # searches are restricted to this set
+        self.streamingSearch: Optional[StreamingSearch] = None
+        self.encodingHints: FullTextIndex.EncodingHints = {} # encodings of the matches known by the index
+        self.skipReasons: FullTextIndex.SkipReasons = {} # matches which the index update skipped or indexed partially
+        self.facets: Optional[Facets.Facets] = None # number of matches per directory and extension, computed by the search
 
         self.searchStateList: List[SearchState] = [] # A history of search states which allows to navigate through different search results
         self.searchStateIndex: int = -1
@@ -190,6 +227,10 @@ class SearchPage (QWidget):
         # Register keyboard hotkeys for bookmars and handling navigation
         self.searchPageBookmarks = SearchPageBookmarks(self)
 
+        self.keywordCompleter: Optional[KeywordCompleter] = None
+        if AppConfig.appConfig().completeKeywords:
+            self.keywordCompleter = KeywordCompleter(self.ui.comboSearch.lineEdit(), self.__completionLocation)
+
         # Initialize filter preview
         self.updateFilterPreview()
 
@@ -204,6 +245,7 @@ class SearchPage (QWidget):
         actions = []
         actions.append(menu.addAction("Find content", lambda: self.setSearchType(SearchType.SearchContent)))
         actions.append(menu.addAction("Find name", lambda: self.setSearchType(SearchType.SearchName)))
+        actions.append(menu.addAction("Go to file", lambda: self.setSearchType(SearchType.GoToFile)))
         pos = self.mapToGlobal(self.ui.widgetSearch.pos())
         pos += QPoint(0, self.ui.buttonSearch.height())
         menu.exec(pos)
@@ -216,10 +258,22 @@ class SearchPage (QWidget):
         self.searchType = searchType
         self.ui.buttonCustomScripts.setEnabled(self.searchType == SearchType.SearchContent)
         self.ui.buttonSwitchView.setEnabled(self.searchType == SearchType.SearchContent)
-        if self.searchType == SearchType.SearchName:
+        if self.searchType != SearchType.SearchContent:
             self.switchView(False)
             self.ui.buttonSwitchView.setChecked(False)
+        if self.searchType == SearchType.GoToFile:
+            indexConf = self.__currentIndexConf()
+            if indexConf:
+                SearchMethods.prefetchFuzzyFinder(indexConf)
+        self.__updateSearchButton()
+
+    def __updateSearchButton(self) -> None:
+        if self.streamingSearch:
+            self.ui.buttonSearch.setText(self.tr("Cancel"))
+        elif self.searchType == SearchType.SearchName:
             self.ui.buttonSearch.setText("Find name")
+        elif self.searchType == SearchType.GoToFile:
+            self.ui.buttonSearch.setText("Go to file")
         else:
             self.ui.buttonSearch.setText("Find content")
 
@@ -318,6 +372,10 @@ class SearchPage (QWidget):
     def currentLocationChanged(self, currentConfigName: str) -> None:
         self.currentConfigName = currentConfigName
         self.__restoreSearchParams()
+        indexConf = self.__currentIndexConf()
+        if indexConf and not indexConf.isFileNameIndexed():
+            # File name searches in this location run against a listing of its files, build it in advance
+            DirectSearch.prefetchFileListing(indexConf.extensions, indexConf.directories, indexConf.dirExcludes)
 
     @pyqtSlot(QModelIndex)
     def fileSelected (self,  index: QModelIndex) -> None:
@@ -334,7 +392,7 @@ class SearchPage (QWidget):
 
     def __showFile (self, name: str, editorState: Optional[EditorState] = None) -> None:
         if self.ui.sourceViewer.currentFile != name:
-            self.ui.sourceViewer.showFile(name, editorState)
+            self.ui.sourceViewer.showFile(name, editorState, self.encodingHints.get(name), self.skipReasons.get(name))
             self.documentShown.emit(name)
 
     @pyqtSlot(str, int)
@@ -386,7 +444,11 @@ class SearchPage (QWidget):
         strExtensionFilter = self.ui.comboExtensionFilter.currentText().strip()
         bCaseSensitive = self.ui.checkCaseSensitive.checkState() == Qt.CheckState.Checked
         bExcludeComments = self.ui.checkExcludeComments.checkState() == Qt.CheckState.Checked
-        return QueryParams(strSearch, strFolderFilter, strExtensionFilter, bCaseSensitive, bExcludeComments, self.__getCommentRuleFromHighlightingCache)
+        days = modifiedWithinDays[self.ui.comboModified.currentIndex()]
+        modifiedSince = Query.modifiedWithin(days) if days else None
+        # Reading all files of a location is only done if the user confirms it, see __confirmFullScan
+        return QueryParams(strSearch, strFolderFilter, strExtensionFilter, bCaseSensitive, bExcludeComments, self.__getCommentRuleFromHighlightingCache,
+                           modifiedSince=modifiedSince, bAllowFullScan=False)
 
     def __getCommentRuleFromHighlightingCache(self, filename: str) -> Optional[CommentRule]:
         rule = HighlightingRulesCache.rules().getRulesByFileName(filename, self.sourceFont)
@@ -401,6 +463,7 @@ class SearchPage (QWidget):
 
     # Returns the search parameters from the UI and the current search configuration (IndexConfiguration) object
     def __prepareSearch (self) -> Tuple[QueryParams, IndexConfiguration]:
+        self.cancelSearch()
         # Remember the current selected file in the current state before pushing the next state into the history
         self.__rememberSelectedFileInState()
         self.__updateSearchResult(SearchAsync.ResultSet()) # clear current results
@@ -438,10 +501,124 @@ class SearchPage (QWidget):
             self.__updateSearchResult(searchResult)
             self.__rememberSearchState(params, searchResult)
 
+    def __sortByRecency(self) -> None:
+        indexConf = self.__currentIndexConf()
+        matches = AsynchronousTask.execute(self, SearchMethods.orderByRecency, self.matches, indexConf)
+        self.__showOrderedMatches(matches)
+
+    def __sortByName(self) -> None:
+        self.__showOrderedMatches(sorted(self.matches))
+
+    def __showOrderedMatches(self, matches: FullTextIndex.SearchResult) -> None:
+        """Shows the same matches in another order."""
+        selectedFiles = self.__getSelectedFiles()
+        self.matches = matches
+        model = StringListModel(matches)
+        listDelegate = cast(PathVisualizerDelegate.PathVisualizerDelegate, self.ui.listView.itemDelegate())
+        model.setSizeHint(listDelegate.computeSizeHint(matches, model.cutLeft))
+        self.ui.listView.setModel(model)
+        # The overview shows the files in the order of the list
+        self.ui.matchesOverview.setSearchResult(matches, self.ui.matchesOverview.searchData, self.encodingHints)
+        if selectedFiles:
+            row = model.findFile(selectedFiles[0])
+            if row != -1:
+                model.setSelectedFileIndex(row)
+                self.ui.listView.setCurrentIndex(model.index(row, 0))
+
+    @pyqtSlot()
+    def showFacets(self) -> None:
+        """Shows the directories and extensions with the most matches. Choosing one narrows the search to it."""
+        indexConf = self.__currentIndexConf()
+        facets = self.facets
+        if facets is None:
+            # E.g. the result of a custom script or a search which is still streaming
+            facets = Facets.computeFacets(self.matches, indexConf.directories if indexConf else [])
+        menu = QMenu()
+        if facets.isEmpty():
+            menu.addAction(self.tr("No matches")).setEnabled(False)
+        else:
+            self.__addFacetSection(menu, self.tr("Top level directories"), facets.topLevel, self.narrowToFolder)
+            self.__addFacetSection(menu, self.tr("Directories"), facets.directories, self.narrowToFolder)
+            self.__addFacetSection(menu, self.tr("Extensions"), facets.extensions, self.narrowToExtension)
+        pos = self.ui.buttonFacets.mapToGlobal(QPoint(0, self.ui.buttonFacets.height()))
+        menu.exec(pos)
+
+    def __addFacetSection(self, menu: QMenu, title: str, counts: Facets.FacetCounts, narrow: Callable[[str], None]) -> None:
+        menu.addSection(title)
+        for name, count in Facets.mostCommon(counts, maxFacetEntries):
+            # Matches directly in the search location can't be selected by a folder filter, a comma separates filters
+            if (narrow == self.narrowToFolder and not name) or "," in name:
+                continue
+            label = name or self.tr("(no extension)")
+            menu.addAction("%s (%u)" % (label, count), lambda name=name: narrow(name))
+
+    def narrowToFolder(self, relativeDirectory: str) -> None:
+        """Replaces the folders of the folder filter by the directory and repeats the search. Excluded folders are kept."""
+        excludes = [part for part in self.ui.comboFolderFilter.currentText().split(",") if part.strip().startswith("-")]
+        self.ui.comboFolderFilter.setEditText(",".join([Facets.folderFilterFor(relativeDirectory)] + excludes))
+        self.performSearch()
+
+    def narrowToExtension(self, extension: str) -> None:
+        self.ui.comboExtensionFilter.setEditText(Facets.extensionFilterFor(extension))
+        self.performSearch()
+
+    @pyqtSlot(str)
+    def searchTextChanged(self, text: str) -> None:
+        """Shows the best matching files for each keystroke while the search type is 'Go to file'."""
+        if self.searchType != SearchType.GoToFile or not self.isVisible():
+            return
+        indexConf = self.__currentIndexConf()
+        if not indexConf:
+            return
+        params = self.getSearchParameterFromUI()
+        try:
+            result = self.__findFilesFuzzy(params, indexConf)
+        except:
+            self.reportFailedSearch(indexConf)
+            return
+        matches = self.__lockedMatches(result.matches)
+        model = StringListModel(matches)
+        listDelegate = cast(PathVisualizerDelegate.PathVisualizerDelegate, self.ui.listView.itemDelegate())
+        model.setSizeHint(listDelegate.computeSizeHint(matches, model.cutLeft))
+        self.ui.listView.setModel(model)
+        self.__showSearchResult(result, matches)
+
+    def __completionLocation(self) -> Optional[IndexConfiguration]:
+        """Keywords are completed for content searches in locations with content index."""
+        if self.searchType != SearchType.SearchContent:
+            return None
+        indexConf = self.__currentIndexConf()
+        if not indexConf or not indexConf.isContentIndexed():
+            return None
+        return indexConf
+
+    @pyqtSlot()
+    def searchTextEntered(self) -> None:
+        # Return inserts the keyword selected in the completion popup
+        if self.keywordCompleter and self.keywordCompleter.isCompleting():
+            return
+        self.performSearch()
+
+    def __findFilesFuzzy(self, params: QueryParams, indexConf: IndexConfiguration) -> SearchAsync.ResultSet:
+        if not params.strSearch:
+            return SearchAsync.ResultSet()
+        if SearchMethods.isFuzzyFinderLoaded(indexConf):
+            return SearchAsync.searchFileNameFuzzy(None, params, indexConf)
+        # The names are read once per location and index update
+        return SearchAsync.searchFileNameFuzzy(self, params, indexConf)
+
     def searchForText (self,  text: str) -> None:
         self.ui.comboSearch.setEditText(text)
         self.performSearch()
 
+    @pyqtSlot()
+    def searchButtonClicked(self) -> None:
+        # While a search streams its results the search button cancels it
+        if self.streamingSearch:
+            self.cancelSearch()
+        else:
+            self.performSearch()
+
     @pyqtSlot()
     def performSearch (self) -> None:
         params, indexConf = self.__prepareSearch ()
@@ -449,60 +626,216 @@ class SearchPage (QWidget):
             return
 
         AppConfig.setLastUsedConfigName(indexConf.displayName())
+        self.__runSearch(params, indexConf)
 
+    def __runSearch(self, params: QueryParams, indexConf: IndexConfiguration) -> None:
         try:
             if self.searchType == SearchType.SearchContent:
-                result = SearchAsync.searchContent (self, params, indexConf,  self.commonKeywordMap)
+                if params.strSearch and AppConfig.appConfig().streamSearchResults:
+                    self.__startStreamingSearch(params, indexConf)
+                    return
+                # A locked result set restricts the search itself, not only the displayed matches
+                result = SearchAsync.searchContent (self, params, indexConf,  self.commonKeywordMap, self.lockedResultSet)
+            elif self.searchType == SearchType.GoToFile:
+                result = self.__findFilesFuzzy(params, indexConf)
             else:
                 result = SearchAsync.searchFileName (self, params, indexConf)
         except Query.QueryError as error:
             self.reportQueryError(error)
+        except FullTextIndex.FullScanRequired as error:
+            if self.__confirmFullScan(error):
+                params.bAllowFullScan = True
+                self.__runSearch(params, indexConf)
         except:
             self.reportFailedSearch(indexConf)
         else:
             self.__updateSearchResult(result)
-            self.__rememberSearchState(params, result)
-            self.__rememberSearchParams(params)
-            text = self.tr(userHintUseWildcards)
-            if self.searchType == SearchType.SearchContent:
-                showUserHint (self, "useWildcards",  self.tr("Try using wildcards"), text,  ButtonType.OK)
-            
-            if indexConf.indexUpdateMode != IndexMode.NoIndexWanted:
-                if self.searchType == SearchType.SearchContent and not indexConf.isContentIndexed():
-                    text = self.tr(userHintContentNotIndexed)
-                    showUserHint (self, "contentSearchNotIndexed_" + indexConf.displayName(), self.tr("This search can be faster"), text, ButtonType.OK)
-                if self.searchType == SearchType.SearchName and not indexConf.isFileNameIndexed():
-                    text = self.tr(userHintFileNameNotIndexed)
-                    showUserHint (self, "fileNameSearchNotIndexed_" + indexConf.displayName(), self.tr("This search can be faster"), text, ButtonType.OK)
+            self.__searchSucceeded(params, indexConf, result)
+
+    def __confirmFullScan(self, error: FullTextIndex.FullScanRequired) -> bool:
+        """Asks the user whether to read all files because the keywords may have been left out of the index."""
+        res = QMessageBox.question(self,
+                                   self.tr("Read all files?"),
+                                   self.tr("The token filter of the index may have removed '") + "', '".join(error.hiddenParts) +
+                                   self.tr("'. The search has to read all %u files of the location. Do you want to continue?") % (error.fileCount, ),
+                                   QMessageBox.StandardButtons(QMessageBox.No | QMessageBox.Yes),
+                                   QMessageBox.No)
+        return QMessageBox.Yes == res
+
+    def __searchSucceeded(self, params: QueryParams, indexConf: IndexConfiguration, result: SearchAsync.ResultSet) -> None:
+        self.__rememberSearchState(params, result)
+        self.__rememberSearchParams(params)
+        text = self.tr(userHintUseWildcards)
+        if self.searchType == SearchType.SearchContent:
+            showUserHint (self, "useWildcards",  self.tr("Try using wildcards"), text,  ButtonType.OK)
+        
+        if indexConf.indexUpdateMode != IndexMode.NoIndexWanted:
+            if self.searchType == SearchType.SearchContent and not indexConf.isContentIndexed():
+                text = self.tr(userHintContentNotIndexed)
+                showUserHint (self, "contentSearchNotIndexed_" + indexConf.displayName(), self.tr("This search can be faster"), text, ButtonType.OK)
+            if self.searchType == SearchType.SearchName and not indexConf.isFileNameIndexed():
+                text = self.tr(userHintFileNameNotIndexed)
+                showUserHint (self, "fileNameSearchNotIndexed_" + indexConf.displayName(), self.tr("This search can be faster"), text, ButtonType.OK)
 
     def __updateSearchResult (self, result: SearchAsync.ResultSet) -> None:
-        if result.label:
-            self.searchFinished.emit(self, result.label)
-        self.perfReport = result.perfReport
-        # Filter results if we currently have a locked result set
-        if self.lockedResultSet:
-            matches = FullTextIndex.intersectSortedLists (self.lockedResultSet, result.matches)
-        else:
-            matches = result.matches
-        self.matches = matches
+        matches = self.__lockedMatches(result.matches)
         self.ui.sourceViewer.setSearchData (result.searchData)
-        self.ui.matchesOverview.setSearchResult(self.matches, result.searchData) 
-        self.ui.labelMatches.setText("%u " % (len(matches), ) + self.tr("matches"))
+        self.__showSearchResult(result, matches)
         model = StringListModel(matches)
         listDelegate = cast(PathVisualizerDelegate.PathVisualizerDelegate, self.ui.listView.itemDelegate())
         sizeHint = listDelegate.computeSizeHint(matches,  model.cutLeft) 
         model.setSizeHint(sizeHint)
         self.ui.listView.setModel(model)
+        self.__activateFirstMatch()
+
+    def __lockedMatches(self, matches: FullTextIndex.SearchResult) -> FullTextIndex.SearchResult:
+        """Filter results if we currently have a locked result set. The order of the matches is kept, e.g. the rank of a fuzzy search."""
+        if not self.lockedResultSet:
+            return matches
+        locked = set(self.lockedResultSet)
+        return [match for match in matches if match in locked]
+
+    def __showSearchResult(self, result: SearchAsync.ResultSet, matches: FullTextIndex.SearchResult) -> None:
+        if result.label:
+            self.searchFinished.emit(self, result.label)
+        self.perfReport = result.perfReport
+        self.matches = matches
+        self.encodingHints = result.encodingHints
+        self.skipReasons = result.skipReasons
+        # The facets of the search don't fit if a locked result set removed matches
+        self.facets = result.facets if matches is result.matches else None
+        self.ui.matchesOverview.setSearchResult(self.matches, result.searchData, result.encodingHints)
+        self.ui.labelMatches.setText("%u " % (len(matches), ) + self.tr("matches"))
+
+    def __activateFirstMatch(self) -> None:
         # Activate first match if enabled in config
         if AppConfig.appConfig().activateFirstMatch:
-            if model.rowCount() > 0:
+            if self.ui.listView.model().rowCount() > 0:
                 index = self.ui.listView.model().index(0, 0)
                 if index.isValid():
                     self.ui.listView.setCurrentIndex(index)
                     self.ui.listView.activated.emit(index)
 
+    def __startStreamingSearch(self, params: QueryParams, indexConf: IndexConfiguration) -> None:
+        """Starts a content search in the background. The matches are shown as soon as they are verified."""
+        pageSize = AppConfig.appConfig().verificationPageSize
+        pager = Verification.VerificationPager(pageSize) if pageSize > 0 else None
+        task, searchData = SearchAsync.searchContentStreaming(params, indexConf, self.commonKeywordMap, pager, self.lockedResultSet)
+        model = cast(StringListModel, self.ui.listView.model())
+        model.setSizeHint(QSize(0, 0))
+        model.setPager(pager)
+        self.streamingSearch = StreamingSearch(task, searchData, params, indexConf, model)
+        self.streamingSearch.pager = pager
+        self.matches = model.filelist
+        self.ui.sourceViewer.setSearchData(searchData)
+        task.matchesFound.connect(self.__addStreamedMatches)
+        task.progressChanged.connect(self.__streamingProgress)
+        task.finished.connect(self.__streamingSearchFinished)
+        self.__updateSearchButton()
+        self.__updateStreamingLabel()
+        task.start()
+
+    @pyqtSlot()
+    def cancelSearch(self) -> None:
+        """Cancels a streaming search. The matches found so far are kept."""
+        if self.streamingSearch:
+            self.streamingSearch.task.cancel()
+
+    def __currentStreamingSearch(self) -> Optional[StreamingSearch]:
+        """Returns the running search if its matches are still displayed."""
+        search = self.streamingSearch
+        if search and search.task is self.sender() and search.model is self.ui.listView.model():
+            return search
+        return None
+
+    @pyqtSlot(list)
+    def __addStreamedMatches(self, matches: List[str]) -> None:
+        search = self.__currentStreamingSearch()
+        if not search:
+            return
+        if not matches:
+            return
+        model = search.model
+        wasEmpty = model.rowCount() == 0
+        listDelegate = cast(PathVisualizerDelegate.PathVisualizerDelegate, self.ui.listView.itemDelegate())
+        if model.addSorted(matches):
+            sizeHint = listDelegate.computeSizeHint(model.filelist, model.cutLeft)
+        else:
+            sizeHint = listDelegate.computeSizeHint(matches, model.cutLeft).expandedTo(model.sizeHint or QSize(0, 0))
+        model.setSizeHint(sizeHint)
+        self.matches = model.filelist
+        self.__updateStreamingLabel()
+        if wasEmpty:
+            self.__activateFirstMatch()
+
+    @pyqtSlot(int)
+    def __streamingProgress(self, percent: int) -> None:
+        search = self.__currentStreamingSearch()
+        if search:
+            search.progress = percent
+            self.__updateStreamingLabel()
+
+    def __updateStreamingLabel(self) -> None:
+        search = self.streamingSearch
+        if not search:
+            return
+        text = "%u " % (len(search.model.filelist), )
+        estimate = search.pager.estimatedMatches() if search.pager else None
+        if estimate is not None:
+            text += self.tr("of about") + " %u " % (max(estimate, len(search.model.filelist)), )
+        text += self.tr("matches")
+        if search.pager and search.pager.isPaused():
+            text += " (" + self.tr("scroll for more") + ")"
+        else:
+            text += " (" + self.tr("searching") + " %u%%)" % (search.progress, )
+        self.ui.labelMatches.setText(text)
+
+    @pyqtSlot()
+    def __streamingSearchFinished(self) -> None:
+        search = self.streamingSearch
+        if not search or search.task is not self.sender():
+            return
+        self.streamingSearch = None
+        search.model.setPager(None)
+        self.__updateSearchButton()
+        task = search.task
+        if search.model is not self.ui.listView.model():
+            return # The user navigated to another search result
+
+        if task.hasException:
+            self.ui.labelMatches.setText("%u " % (len(search.model.filelist), ) + self.tr("matches"))
+            # Raised again to show the stack trace
+            try:
+                raise task.exception
+            except Query.QueryError as error:
+                self.reportQueryError(error)
+            except FullTextIndex.FullScanRequired as error:
+                if self.__confirmFullScan(error):
+                    search.params.bAllowFullScan = True
+                    self.__startStreamingSearch(search.params, search.indexConf)
+            except:
+                self.reportFailedSearch(search.indexConf)
+            return
+
+        if task.isCanceled():
+            # Keep what has been found so far
+            result = SearchAsync.ResultSet(list(search.model.filelist), search.searchData)
+        else:
+            result = task.result
+        result.label = search.params.strSearch
+
+        matches = self.__lockedMatches(result.matches)
+        if matches == search.model.filelist:
+            # All matches are displayed already, don't disturb the user who might look at one of them
+            self.__showSearchResult(result, search.model.filelist)
+        else:
+            # E.g. the result came from the result cache
+            self.__updateSearchResult(result)
+        self.__searchSucceeded(search.params, search.indexConf, result)
+
     def __rememberSearchState(self, params: QueryParams, resultSet: SearchAsync.ResultSet) -> None:
-        self.searchStateList.append(SearchState(self.searchType, self.currentConfigName, params, resultSet, self.lockedResultSet))
+        self.searchStateList.append(SearchState(self.searchType, self.currentConfigName, params, resultSet, self.lockedResultSet,
+                                                self.ui.comboModified.currentIndex()))
         self.searchStateIndex = len(self.searchStateList) - 1
         self.__updateBackForwardButtons()
 
@@ -537,6 +870,7 @@ class SearchPage (QWidget):
     def __updateUIFromSearchState(self) -> None:
         if self.searchStateIndex >= len(self.searchStateList):
             return
+        self.cancelSearch()
         state = self.searchStateList[self.searchStateIndex]
         if state.configName != self.currentConfigName:
             self.setCurrentSearchLocation(state.configName)
@@ -546,6 +880,7 @@ class SearchPage (QWidget):
         self.ui.comboExtensionFilter.setEditText(state.searchParams.strExtensionFilter)
         self.ui.checkCaseSensitive.setChecked(state.searchParams.bCaseSensitive)
         self.ui.checkExcludeComments.setChecked(state.searchParams.bExcludeComments)
+        self.ui.comboModified.setCurrentIndex(state.modifiedRange)
         self.ui.buttonLockResultSet.setChecked(state.lockedResultSet != None)
         self.lockedResultSet = state.lockedResultSet
         self.__updateSearchResult(state.resultSet)
@@ -561,7 +896,7 @@ class SearchPage (QWidget):
     @pyqtSlot(bool)
     def lockResultSet (self,  bChecked: bool) -> None:
         if bChecked:
-            self.lockedResultSet = self.matches[:] # copy the matches, a reference is not enough
+            self.lockedResultSet = sorted(self.matches) # copy the matches, a reference is not enough. They may be ordered by recency.
         else:
             self.lockedResultSet = None
 
@@ -617,6 +952,9 @@ class SearchPage (QWidget):
         if len(files)==1:
             menu.addAction(self.tr("Open containing f&older"),  lambda: self.__browseToFolder(fullpath))
             menu.addAction(self.tr("Search for") + " '" + name + "'",  lambda: self.__searchForFileName(name))
+        if not self.streamingSearch and len(self.matches) > 1:
+            menu.addAction(self.tr("Sort by &modification time"), self.__sortByRecency)
+            menu.addAction(self.tr("Sort by n&ame"), self.__sortByName)
 
         entries = CustomContextMenu.customMenuEntries (AppConfig.appConfig())
         filePairSelected = len(self.__getSelectedFiles()) == 2
@@ -779,6 +1117,10 @@ class SearchPage (QWidget):
         if self.ui.checkExcludeComments.isChecked():
             preview_parts.append("No comments")
 
+        # Modification time
+        if self.ui.comboModified.currentIndex() > 0:
+            preview_parts.append(self.ui.comboModified.currentText())
+
 
         # Join with separator and set with tooltip
         if preview_parts:
@@ -24,6 +24,7 @@ from PyQt5.QtWidgets import QWidget, QListWidgetItem, QDialog, QTextEdit
 from tools.FileTools import Encoding, freadallEx
 from AppConfig import appConfig
 from fulltextindex import FullTextIndex, IStringMatcher
+from fulltextindex.ContentSniffer import SkipReason
 import HighlightingRulesCache
 from BookmarkStorage import getBookmarkStorage
 from widgets.SyntaxHighlighter import SyntaxHighlighter
@@ -49,11 +50,12 @@ class SourceViewer (QWidget):
     currentMatchLineBackgroundColor = QColor(170,255,127)
 
     def __init__ (self, parent: Optional[QWidget]) -> None:
-        self.matches: List[IStringMatcher.MatchPosition]
+        self.matches: IStringMatcher.MatchList
         self.curMatch: int
         self.scrollToMatchLine = -1 # Line of current match (normal search or in document search)
         self.currentFile: str
         self.encoding: Encoding = Encoding.Default
+        self.skipReason: Optional[SkipReason] = None # why the index update didn't index the current file completely
         self.currentLineExtras: List[QTextEdit.ExtraSelection] = []
         self.currentMatchExtras: List[QTextEdit.ExtraSelection] = []
 
@@ -147,7 +149,7 @@ class SourceViewer (QWidget):
 
     def reset (self) -> None:
         self.currentFile = ""
-        self.matches = [] # touples with position and length
+        self.matches = IStringMatcher.MatchList()
         self.__setMatchIndex(-1)
         self.ui.labelCursor.setText("")
         self.ui.labelFile.setText(self.tr("No document loaded"))
@@ -170,11 +172,11 @@ class SourceViewer (QWidget):
         self.searchData = searchData
         self.ui.textEdit.highlighter.setSearchData (searchData)
 
-    def __readFileAndSetEncoding(self, name: str) -> str:
+    def __readFileAndSetEncoding(self, name: str, encodingHint: Optional[Encoding] = None) -> str:
         encoding: Encoding
         text: str
         try:
-            text, encoding = freadallEx(name)
+            text, encoding = freadallEx(name, encodingHint=encodingHint)
         except:
             text = self.tr("Failed to open file")
             self.ui.labelEncoding.hide()
@@ -190,12 +192,34 @@ class SourceViewer (QWidget):
                 self.ui.labelEncoding.setText("Latin1")
         return text
 
-    def showFile (self, name: str, editorState: Optional[EditorState] = None) -> None:
+    def __showSkipReason(self, skipReason: Optional[SkipReason]) -> None:
+        """Tells next to the encoding if content searches can't find the file or only find the start of it."""
+        self.skipReason = skipReason
+        if skipReason is None:
+            return
+        if skipReason == SkipReason.Binary:
+            reason = self.tr("Not indexed: binary file")
+        elif skipReason == SkipReason.Generated:
+            reason = self.tr("Not indexed: generated file")
+        elif skipReason == SkipReason.TooLarge:
+            reason = self.tr("Not indexed: file too large")
+        else:
+            reason = self.tr("Indexed partially: file too large")
+        if not self.ui.labelEncoding.isHidden():
+            reason = self.ui.labelEncoding.text() + " - " + reason
+        self.ui.labelEncoding.setText(reason)
+        self.ui.labelEncoding.show()
+
+    def showFile (self, name: str, editorState: Optional[EditorState] = None, encodingHint: Optional[Encoding] = None,
+                  skipReason: Optional[SkipReason] = None) -> None:
+        """'encodingHint' is the encoding detected by the index update. Reloading the file detects the encoding again.
+           'skipReason' tells why the index update skipped the file or indexed it partially."""
         self.reset()
         self.ui.labelFile.setText(name)
         self.currentFile = name
 
-        text = self.__readFileAndSetEncoding(name)
+        text = self.__readFileAndSetEncoding(name, encodingHint)
+        self.__showSkipReason(skipReason)
 
         rules = HighlightingRulesCache.rules().getRulesByFileName(name,  self.sourceFont)
         self.ui.textEdit.highlighter.setHighlightingRules (rules)
@@ -209,7 +233,7 @@ class SourceViewer (QWidget):
         self.ui.widgetInDocumentSearch.setText(text)
 
         if self.searchData:
-            self.matches = [match for match in self.searchData.matches(text, self.currentFile)]
+            self.matches = self.searchData.matchList(text, self.currentFile)
             self.ui.listMatchesWidget.clear()
             for i in range(len(self.matches)):
                 item = "%u" % (i+1,)
@@ -233,7 +257,7 @@ class SourceViewer (QWidget):
     @pyqtSlot()
     def reloadFile(self) -> None:
         if self.currentFile:
-            self.showFile(self.currentFile)
+            self.showFile(self.currentFile, skipReason=self.skipReason)
 
     @pyqtSlot()
     def showGotoLineDialog(self) -> None:
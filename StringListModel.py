@@ -17,10 +17,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
+from bisect import bisect_left
 from typing import List, Dict, Optional, Any
 from PyQt5.QtCore import Qt, QFileInfo, QAbstractListModel, QModelIndex, QSize
 from PyQt5.QtWidgets import QWidget
 import SourceViewer
+from fulltextindex.Verification import VerificationPager
 from typing import Optional
 
 # Returns the first difference in two strings
@@ -36,8 +38,10 @@ class StringListModel(QAbstractListModel):
         self.filelist = filelist
         self.editorState: Dict[int, SourceViewer.EditorState] = {} # maps from file index to an editor state object
         self.sizeHint: Optional[QSize] = None
-        self.cutLeft = self.__computeCutLeft()
+        # The list may be ordered otherwise than by name, e.g. by modification time
+        self.cutLeft = self.__computeCutLeft(min(filelist, default=""), max(filelist, default=""))
         self.selectedFileIndex = -1
+        self.pager: Optional[VerificationPager] = None # set while a paged search is running
 
     def getEditorState(self, row: int) -> Optional[SourceViewer.EditorState]:
         return self.editorState.get(row)
@@ -54,18 +58,56 @@ class StringListModel(QAbstractListModel):
     def setSizeHint(self, sizeHint: QSize) -> None:
         self.sizeHint = sizeHint
 
+    def setPager(self, pager: Optional[VerificationPager]) -> None:
+        self.pager = pager
+
+    # The view asks for more rows when it is scrolled to the end, a paused search continues with the next page
+    def canFetchMore(self, _: QModelIndex = QModelIndex()) -> bool:
+        return self.pager is not None and self.pager.isPaused()
+
+    def fetchMore(self, _: QModelIndex = QModelIndex()) -> None:
+        if self.pager:
+            self.pager.requestMore()
+
     def findFile(self, fileName: str) -> int:
         for idx, name in enumerate(self.filelist):
             if name == fileName:
                 return idx
         return -1
 
+    def addSorted(self, names: List[str]) -> bool:
+        """Inserts the names into the sorted file list, names which are already in the list are skipped.
+           Returns True if the common prefix which is cut from the displayed names changed."""
+        for name in names:
+            row = len(self.filelist)
+            # Matches usually arrive in sorted order
+            if row and self.filelist[-1] >= name:
+                row = bisect_left(self.filelist, name)
+                if row < len(self.filelist) and self.filelist[row] == name:
+                    continue
+                # Editor states and the selection are stored per row
+                self.editorState = {(r+1 if r >= row else r): state for r, state in self.editorState.items()}
+                if self.selectedFileIndex >= row:
+                    self.selectedFileIndex += 1
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.filelist.insert(row, name)
+            self.endInsertRows()
+
+        cutLeft = self.__computeCutLeft(self.filelist[0], self.filelist[-1]) if self.filelist else 0
+        if cutLeft == self.cutLeft:
+            return False
+        self.cutLeft = cutLeft
+        if self.filelist:
+            self.dataChanged.emit(self.index(0, 0), self.index(len(self.filelist)-1, 0))
+        return True
+
     # If all entries in the list start with the same directory we don't need to display this prefix.
-    def __computeCutLeft (self) -> int:
+    # 'smallest' and 'largest' are the first and the last name in sorted order.
+    def __computeCutLeft (self, smallest: str, largest: str) -> int:
         if len(self.filelist)<2:
             return 0
-        first = os.path.split(self.filelist[0])[0] + os.path.sep
-        last = os.path.split(self.filelist[-1])[0] + os.path.sep
+        first = os.path.split(smallest)[0] + os.path.sep
+        last = os.path.split(largest)[0] + os.path.sep
         firstDiff = firstDifference(first, last)
         if firstDiff is not None:
             # Only cut full directories - go back to the last path seperator
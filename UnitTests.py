@@ -27,10 +27,17 @@ testmodules = [
     'MatchesOverview',
     'tools.Config',
     'tools.FileTools',
+    'fulltextindex.IStringMatcher',
     'fulltextindex.Query',
     'fulltextindex.CommentDetection',
+    'fulltextindex.RegExGuard',
+    'fulltextindex.Facets',
+    'fulltextindex.FuzzyFinder',
+    'fulltextindex.TokenFilter',
+    'fulltextindex.ContentSniffer',
     'fulltextindex.testsuite',
-    'BookmarkStorage'
+    'BookmarkStorage',
+    'FreezeConfig'
     ]
 
 def getModulePath() -> str:
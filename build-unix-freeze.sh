@@ -27,6 +27,8 @@ LIB=$BUILDDIR/lib
 
 if [ "$1" == "linux" ]; then
   echo "Cleanup Linux"
+  # Keep queue, multiprocessing and _posixshmem, the verification pools need them. The keyword dictionary needs mmap.
+  # See FreezeConfig.py
   PYVER=`python3 build-GetPyVer.py`
   rm $BUILDDIR/lib/liblzma-004595ca.so.5.2.2
   rm $BUILDDIR/lib/libreadline-2c5f7b8d.so.6.2
@@ -35,14 +37,12 @@ if [ "$1" == "linux" ]; then
   rm $BUILDDIR/lib/_bz2.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_codecs_kr.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_codecs_tw.cpython-$PYVER-x86_64-linux-gnu.so
-  rm $BUILDDIR/lib/_posixshmem.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_codecs_jp.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_codecs_hk.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/fcntl.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/pyexpat.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_codecs_cn.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/grp.cpython-$PYVER-x86_64-linux-gnu.so
-  rm $BUILDDIR/lib/_queue.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_heapq.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_ctypes.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_json.cpython-$PYVER-x86_64-linux-gnu.so
@@ -51,15 +51,12 @@ if [ "$1" == "linux" ]; then
   rm $BUILDDIR/lib/_pickle.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_statistics.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_contextvars.cpython-$PYVER-x86_64-linux-gnu.so
-  rm $BUILDDIR/lib/_multiprocessing.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_hashlib.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_decimal.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_bisect.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/termios.cpython-$PYVER-x86_64-linux-gnu.so
-  rm $BUILDDIR/lib/mmap.cpython-$PYVER-x86_64-linux-gnu.so
   rm $BUILDDIR/lib/_codecs_iso2022.cpython-$PYVER-x86_64-linux-gnu.so
   rm -r $BUILDDIR/lib/ctypes
-  rm -r $BUILDDIR/lib/multiprocessing
   rm -r $BUILDDIR/lib/xml
   rm -r $BUILDDIR/lib/xmlrpc
   # PyQt
@@ -23,6 +23,7 @@ from enum import IntEnum
 from PyQt5.QtCore import Qt, QObject, pyqtSlot
 from PyQt5.QtGui import QSyntaxHighlighter, QTextCharFormat, QFont, QColor
 from PyQt5.QtWidgets import QDialog, QApplication, QWidget
+from fulltextindex.RegExGuard import backtrackingRisk
 from .Ui_RegExTesterDlg import Ui_RegExTesterDlg
 
 class ExprHighlighter(QSyntaxHighlighter):
@@ -130,10 +131,16 @@ class RegExTesterDlg (QDialog):
         self.setProperty("shadeBackground", True) # fill background with gradient as defined in style sheet
         self.exprHighlighter = ExprHighlighter(self.ui.textEditExpr.document())
         self.textHighlighter = TextHighlighter(self.ui.textEditText.document())
+        self.ui.labelWarning.setStyleSheet("color: darkred")
+        self.ui.labelWarning.hide()
 
     @pyqtSlot ()
     def exprTextChanged(self) -> None:
-        self.textHighlighter.setExpr(self.ui.textEditExpr.toPlainText())
+        exprText = self.ui.textEditExpr.toPlainText()
+        warning = backtrackingRisk(exprText)
+        self.ui.labelWarning.setText(warning or "")
+        self.ui.labelWarning.setVisible(warning is not None)
+        self.textHighlighter.setExpr(exprText)
 
     @pyqtSlot ()
     def setModeSearchFirst(self) -> None:
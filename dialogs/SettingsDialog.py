@@ -150,13 +150,18 @@ class LocationControl (QObject):
         if not index.isValid():
             return
         editor = self.settingsItem
+        # Settings which are only available in the configuration file are kept
+        previous = index.data(Qt.ItemDataRole.UserRole+1)
         location = IndexConfiguration(editor.name(),
                                       editor.extensions(),
                                       editor.directories(),
                                       editor.dirExcludes(),
                                       editor.indexDB(),
                                       editor.indexUpdateMode(),
-                                      editor.indexType())
+                                      editor.indexType(),
+                                      previous.indexSubTokens if previous else False,
+                                      previous.tokenFilter if previous else None,
+                                      previous.contentSniffer if previous else None)
         self.model.setData(index, location, Qt.ItemDataRole.UserRole+1)
 
     def loadDataFromItem(self, index: QModelIndex) -> None:
@@ -388,6 +393,28 @@ class SettingsDialog (QDialog):
             locConf.indexUpdateMode = location.indexUpdateMode
             locConf.indexType = location.indexType
             locConf.indexdb = location.indexdb
+            if location.indexSubTokens:
+                locConf.indexSubTokens = True
+            tokenFilter = location.tokenFilter
+            if tokenFilter.minLength:
+                locConf.minTokenLength = tokenFilter.minLength
+            if tokenFilter.maxLength:
+                locConf.maxTokenLength = tokenFilter.maxLength
+            if tokenFilter.skipNumbers:
+                locConf.skipNumbers = True
+            if tokenFilter.skipHexBlobs:
+                locConf.skipHexBlobs = True
+            if tokenFilter.unfilteredExtensions:
+                locConf.unfilteredExtensions = ",".join(tokenFilter.unfilteredExtensions)
+            sniffer = location.contentSniffer
+            if sniffer.maxFileSize:
+                locConf.maxFileSize = sniffer.maxFileSize
+            if sniffer.indexPartially:
+                locConf.indexLargeFilesPartially = True
+            if sniffer.skipBinary:
+                locConf.skipBinaryFiles = True
+            if sniffer.maxLineLength:
+                locConf.maxLineLength = sniffer.maxLineLength
             setattr(config,  "Index_" + FileTools.removeInvalidFileChars(location.indexName),  locConf)
         config.fontSize = self.ui.editAppFontSize.text()
         config.sourceViewer.fontFamily = self.ui.fontComboBox.currentFont().family()
@@ -16,14 +16,17 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from typing import List, Optional, Pattern, Iterator
+from typing import List, Optional, Pattern, Iterator, Match
 import bisect
 import re
 import unittest
+from array import array
 from dataclasses import dataclass
 
 class TextSpan:
     """Represents a comment range in text with start index and length."""
+    __slots__ = ("index", "length")
+
     def __init__(self, index: int, length: int = 0) -> None:
         self.index = index
         self.length = length
@@ -36,177 +39,204 @@ class TextSpan:
             return NotImplemented
         return self.index == other.index and self.length == other.length
 
+    def __repr__(self) -> str:
+        return "TextSpan(%u, %u)" % (self.index, self.length)
+
+class TextSpans:
+    """Sorted, non overlapping text spans stored as two arrays of offsets. Indexing returns TextSpan objects."""
+    def __init__(self) -> None:
+        self.starts = array("q")
+        self.ends = array("q")
+
+    def append(self, start: int, end: int) -> None:
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, i: int) -> TextSpan:
+        return TextSpan(self.starts[i], self.ends[i]-self.starts[i])
+
+    def __iter__(self) -> Iterator[TextSpan]:
+        for start, end in zip(self.starts, self.ends):
+            yield TextSpan(start, end-start)
+
+    def indexAt(self, position: int) -> int:
+        """Returns the index of the last span which starts at or before the position or 0."""
+        return max(bisect.bisect_right(self.starts, position) - 1, 0)
+
+    def contains(self, position: int) -> bool:
+        i = bisect.bisect_right(self.starts, position) - 1
+        return i >= 0 and position < self.ends[i]
+
 @dataclass
 class TextSegments:
-    strings: List[TextSpan] 
-    comments: List[TextSpan]
+    strings: TextSpans
+    comments: TextSpans
 
-    def __iter__(self) -> Iterator[List[TextSpan]]:
+    def __iter__(self) -> Iterator[TextSpans]:
         # return values in order you want to unpack
         yield self.strings
         yield self.comments
 
-
 reQuote = re.compile("[\"\']")
-reTripleQuote = re.compile(r'"""|\'\'\'')
-
-def findAllStrings(line: str, findTripleQuotes: bool) -> List[TextSpan]:
-    """Returns the position of all strings in a line as a list of TextSpan."""
-
-    quotes = __findAllStrings(line, reQuote, allowMultiline=False)
-    if not findTripleQuotes:
-        return quotes
-    
-    tripleQuoteRanges = __findAllStrings(line, reTripleQuote, allowMultiline=True)
-    quotes = [span for span in quotes if not isInsideTextSpan(span.index, tripleQuoteRanges)]
-    quotes.extend(tripleQuoteRanges)
-    quotes.sort()
-    return quotes
+reQuoteOrTripleQuote = re.compile(r'"""|\'\'\'|["\']')
 
-def __findAllStrings(line: str, reQuote: Pattern[str], allowMultiline: bool = False) -> List[TextSpan]:
-    """Returns the position of all strings in a line as a list of TextSpan."""
-    strings: List[TextSpan] = []
-
-    startPos = -1
-    type = None  # None, ", '
-    quotes = reQuote.finditer(line)
-    for quote in quotes:
-        quotePos = quote.start()
-
-        # Check if quote is escaped. It counts as a valid quote if the number of backslashes is equal
-        if __backSlashesBefore(line, quotePos) % 2 == 0:
-            quoteChar = quote.group(0)
-            if type is None:
-                # type != quoteChar handles corrupt strings: ' "  or " ', use new char as type
-                type = quoteChar
-                startPos = quotePos
-            elif type == quoteChar:
-                # Check if there's a newline between start and end quote (only for single-line strings)
-                if not allowMultiline and (line.find('\n', startPos, quotePos) != -1 or line.find('\r', startPos, quotePos) != -1):
-                    # Not a valid single-line string - reset and treat current quote as new start
-                    type = quoteChar
-                    startPos = quotePos
-                else:
-                    # Found valid string
-                    # Empty strings ("") or single quotes followed immediately by another quote
-                    # should not be treated as string ranges
-                    if quotePos > startPos:
-                        strings.append(TextSpan(startPos, quote.end()-startPos))
-                    type = None
-
-    # Sort strings by start position
-    strings.sort()
-    return strings
-
-def __backSlashesBefore(line: str, pos: int) -> int:
+def _backSlashesBefore(text: str, pos: int) -> int:
     """Count backslashes before a position."""
-    pos -= 1
-    backslashes = 0
-    while pos >= 0:
-        if line[pos] == '\\':
-            backslashes += 1
-            pos -= 1
-        else:
-            break
-    return backslashes
-
-def analyzeText(text: str,
-                lineCommentPattern: Optional[Pattern[str]],
-                multiCommentStart: Optional[Pattern[str]],
-                multiCommentStop: Optional[Pattern[str]],
-                hasTripleQuotes: bool) -> TextSegments:
+    start = pos
+    while pos > 0 and text[pos-1] == '\\':
+        pos -= 1
+    return start - pos
+
+class _NextMatch:
+    """Remembers the next match of an expression. As the lexer only moves forward the expression is searched
+       again only if the lexer moved past the remembered match."""
+    def __init__(self, text: str, expr: Optional[Pattern[str]]) -> None:
+        self.text = text
+        self.expr = expr
+        self.match: Optional[Match[str]] = None
+        self.start = len(text) if expr is None else -1
+
+    def at(self, pos: int) -> int:
+        """Returns the start of the next match at or behind pos or the length of the text."""
+        if self.start < pos:
+            assert self.expr is not None
+            self.match = self.expr.search(self.text, pos)
+            self.start = self.match.start() if self.match else len(self.text)
+        return self.start
+
+class CommentLexer:
     r"""
-    Find all comments and string ranges in the document and return them as TextSpan objects.
+    Finds strings and comments in a single pass over the text. At every position the earliest of a quote, a line
+    comment or the start of a multi line comment wins and the lexer continues behind its end. Therefore comment
+    markers inside strings and quotes inside comments are ignored.
+
+    The text is analyzed lazily: isInsideComment only lexes up to the position it checks.
 
     Args:
         text: The text to analyze
         lineCommentPattern: Compiled regex pattern for single-line comments (e.g., r'//[^\n]*')
         multiCommentStart: Compiled regex pattern for multiline comment start (e.g., r'/\*')
         multiCommentStop: Compiled regex pattern for multiline comment end (e.g., r'\*/')
-        hasTripleQuotes: True if the language has triple quote strings that are handled as comments. The expressions
-          for multiCommentStart and multiCommentStop are left to None then.
-
-    Returns:
-        List of TextSpan objects representing all comments in the text
+        hasTripleQuotes: True if the language has triple quote strings which may span several lines.
     """
-    # First, find all string literals to exclude them from comment detection
-    stringRanges = findAllStrings(text, hasTripleQuotes)
+    def __init__(self, text: str,
+                 lineCommentPattern: Optional[Pattern[str]],
+                 multiCommentStart: Optional[Pattern[str]],
+                 multiCommentStop: Optional[Pattern[str]],
+                 hasTripleQuotes: bool) -> None:
+        self.text = text
+        self.strings = TextSpans()
+        self.comments = TextSpans()
+        self.pos = 0
+        if not multiCommentStop:
+            multiCommentStart = None
+        self.multiCommentStop = multiCommentStop
+        self.__lineComment = _NextMatch(text, lineCommentPattern)
+        self.__multiComment = _NextMatch(text, multiCommentStart)
+        self.__quote = _NextMatch(text, reQuoteOrTripleQuote if hasTripleQuotes else reQuote)
+        # Single line strings end at the end of the line
+        self.__newline = _NextMatch(text, re.compile("[\r\n]"))
+
+    def lexAll(self) -> TextSegments:
+        self.lexUntil(len(self.text))
+        return TextSegments(self.strings, self.comments)
+
+    def isInsideComment(self, position: int) -> bool:
+        self.lexUntil(position)
+        return self.comments.contains(position)
+
+    def isInsideString(self, position: int) -> bool:
+        self.lexUntil(position)
+        return self.strings.contains(position)
+
+    def lexUntil(self, position: int) -> None:
+        """Lexes all strings and comments which start at or before the position."""
+        text = self.text
+        length = len(text)
+        while self.pos <= position and self.pos < length:
+            pos = self.pos
+            lineComment = self.__lineComment.at(pos)
+            multiComment = self.__multiComment.at(pos)
+            quote = self.__quote.at(pos)
+            start = min(lineComment, multiComment, quote)
+            if start > position or start >= length:
+                # Nothing starts before the position, the next call continues here
+                self.pos = min(start, position+1)
+                return
+            # A line comment wins over a multi line comment starting at the same position, e.g. '--' and '--[['
+            if start == lineComment:
+                match = self.__lineComment.match
+                assert match is not None
+                end = match.end()
+                self.comments.append(start, end)
+                self.pos = max(end, start+1)
+            elif start == multiComment:
+                match = self.__multiComment.match
+                assert match is not None and self.multiCommentStop is not None
+                stop = self.multiCommentStop.search(text, match.end())
+                end = stop.end() if stop else length
+                self.comments.append(start, end)
+                self.pos = max(end, start+1)
+            else:
+                match = self.__quote.match
+                assert match is not None
+                self.pos = self.__lexString(start, match.group(0))
+
+    def __lexString(self, start: int, quote: str) -> int:
+        """Returns the position behind the string which starts with the quote at 'start'."""
+        text = self.text
+        if _backSlashesBefore(text, start) % 2:
+            # An escaped quote doesn't start a string
+            return start+1
+        if len(quote) == 3:
+            end = self.__findQuote(quote, start+3, len(text))
+            if end != -1:
+                self.strings.append(start, end+3)
+                return end+3
+            # Without closing triple quote the first quote is handled like a normal quote
+            quote = quote[0]
+        end = self.__findQuote(quote, start+1, self.__newline.at(start+1))
+        if end == -1:
+            # A single line string must be closed on the same line. Continue with the next quote.
+            return start+1
+        self.strings.append(start, end+1)
+        return end+1
+
+    def __findQuote(self, quote: str, pos: int, stop: int) -> int:
+        text = self.text
+        while True:
+            pos = text.find(quote, pos, stop)
+            if pos == -1 or _backSlashesBefore(text, pos) % 2 == 0:
+                return pos
+            pos += 1
 
-    commentRanges: List[TextSpan] = []
+def findAllStrings(line: str, findTripleQuotes: bool) -> List[TextSpan]:
+    """Returns the position of all strings in a line as a list of TextSpan."""
+    return list(CommentLexer(line, None, None, None, findTripleQuotes).lexAll().strings)
 
-    # Collect all single line comments
-    if lineCommentPattern:
-        regLine = lineCommentPattern
-        end = 0
-        while True:
-            beginMatch = regLine.search(text, end)
-            if not beginMatch:
-                break
-            start, end = beginMatch.span()
-            # Only add comment if it's not inside a string literal
-            if not isInsideTextSpan(start, stringRanges):
-                commentRanges.append(TextSpan(start, end - start))
-
-    multiComments: List[TextSpan] = []
-
-    # Now all multi line comments
-    if multiCommentStart and multiCommentStop:
-        regStart = multiCommentStart
-        regEnd = multiCommentStop
-        end = 0
-        while True:
-            beginMatch = regStart.search(text, end)
-            if not beginMatch:
-                break
-            beginStart, end = beginMatch.span()
-            # Only process if not inside a string literal or existing comment
-            if not isInsideTextSpan(beginStart, stringRanges) and not isInsideTextSpan(beginStart, commentRanges):
-                while True:
-                    endMatch = regEnd.search(text, end)
-                    if not endMatch:
-                        multiComments.append(TextSpan(beginStart, len(text) - beginStart))
-                        break
-                    endStart, end = endMatch.span()
-                    multiComments.append(TextSpan(beginStart, end - beginStart))
-                    break
-
-    commentRanges.extend(multiComments)
-    commentRanges.sort()
-
-    # Remove comments which are completely included in other comments
-    i = 1
-    while True:
-        if i >= len(commentRanges):
-            break
-        prevComment = commentRanges[i - 1]
-        comment = commentRanges[i]
-        if comment.index >= prevComment.index and comment.index + comment.length < prevComment.index + prevComment.length:
-            del commentRanges[i]
-        else:
-            i += 1
-
-    return TextSegments(stringRanges, commentRanges)
-
-def isInsideTextSpan(position: int, textSpans: List[TextSpan]) -> bool:
+def analyzeText(text: str,
+                lineCommentPattern: Optional[Pattern[str]],
+                multiCommentStart: Optional[Pattern[str]],
+                multiCommentStop: Optional[Pattern[str]],
+                hasTripleQuotes: bool) -> TextSegments:
+    """Find all comments and string ranges in the document. See CommentLexer for the arguments."""
+    return CommentLexer(text, lineCommentPattern, multiCommentStart, multiCommentStop, hasTripleQuotes).lexAll()
+
+def isInsideTextSpan(position: int, textSpans: TextSpans) -> bool:
     """
     Check if a position is inside a TextSpan.
 
     Args:
         position: The position to check
-        comments: List of TextSpan objects (must be sorted by index)
+        textSpans: The spans found by the lexer, e.g. the comments of analyzeText
 
     Returns:
         True if the position is inside a TextSpan, False otherwise
     """
-    if not textSpans:
-        return False
-    pos = bisect.bisect_right(textSpans, TextSpan(position))
-    if pos > 0:
-        pos -= 1
-    comment = textSpans[pos]
-    if comment.index <= position < comment.index + comment.length:
-        return True
-    return False
+    return textSpans.contains(position)
 
 
 # ============================================================================
@@ -301,15 +331,49 @@ char* s2 = "/* also not a comment */";
         self.assertEqual(comments[0].length, len(text))
 
 
+class TestCommentLexer(unittest.TestCase):
+    """Test the single pass lexer."""
+
+    def test_quotes_inside_comments_ignored(self) -> None:
+        text = '// don\'t\nx = "a" /* it\'s */ y = \'b\''
+        strings, comments = analyzeText(text, re.compile(r'//[^\n]*'), re.compile(r'/\*'), re.compile(r'\*/'), False)
+        self.assertEqual(list(strings), [TextSpan(13, 3), TextSpan(32, 3)])
+        self.assertEqual(list(comments), [TextSpan(0, 8), TextSpan(17, 10)])
+
+    def test_unclosed_string(self) -> None:
+        # The unclosed string ends at the end of the line, the next line has a string with the other quote
+        self.assertEqual(findAllStrings('\'abc\n"x"', False), [TextSpan(5, 3)])
+        # Without closing triple quote the quotes are single quotes
+        self.assertEqual(findAllStrings('"""abc "x"', True), [TextSpan(0, 2), TextSpan(2, 6)])
+
+    def test_lazy(self) -> None:
+        text = "a /* b */ c\n" * 1000
+        lexer = CommentLexer(text, None, re.compile(r'/\*'), re.compile(r'\*/'), False)
+        self.assertFalse(lexer.isInsideComment(0))
+        self.assertTrue(lexer.isInsideComment(2))
+        self.assertTrue(lexer.isInsideComment(8))
+        self.assertFalse(lexer.isInsideComment(9))
+        self.assertLess(lexer.pos, 100)
+        self.assertEqual(len(lexer.comments), 1)
+        self.assertTrue(lexer.isInsideComment(len(text)-8))
+        self.assertEqual(len(lexer.comments), 1000)
+        self.assertEqual(len(lexer.lexAll().comments), 1000)
+
+def _textSpans(*spans: TextSpan) -> TextSpans:
+    textSpans = TextSpans()
+    for span in spans:
+        textSpans.append(span.index, span.index + span.length)
+    return textSpans
+
 class TestIsInsideComment(unittest.TestCase):
     """Test position checking within comments."""
 
     def test_empty_comments(self) -> None:
-        self.assertFalse(isInsideTextSpan(0, []))
-        self.assertFalse(isInsideTextSpan(100, []))
+        self.assertFalse(isInsideTextSpan(0, TextSpans()))
+        self.assertFalse(isInsideTextSpan(100, TextSpans()))
 
     def test_inside_single_comment(self) -> None:
-        comments = [TextSpan(10, 10)]
+        comments = _textSpans(TextSpan(10, 10))
         self.assertFalse(isInsideTextSpan(9, comments))
         self.assertTrue(isInsideTextSpan(10, comments))
         self.assertTrue(isInsideTextSpan(19, comments))
@@ -317,7 +381,7 @@ class TestIsInsideComment(unittest.TestCase):
         self.assertFalse(isInsideTextSpan(35, comments))
 
     def test_multiple_comments(self) -> None:
-        comments = [TextSpan(10, 2), TextSpan(30, 10), TextSpan(50, 10)]
+        comments = _textSpans(TextSpan(10, 2), TextSpan(30, 10), TextSpan(50, 10))
         self.assertFalse(isInsideTextSpan(5, comments))
         self.assertTrue(isInsideTextSpan(11, comments))
         self.assertFalse(isInsideTextSpan(25, comments))
@@ -327,6 +391,20 @@ class TestIsInsideComment(unittest.TestCase):
         self.assertTrue(isInsideTextSpan(55, comments))
         self.assertFalse(isInsideTextSpan(65, comments))
 
+    def test_lexer_output(self) -> None:
+        text = 'a = "x" // one\n/* two\n */ b = 1; // "three"'
+        strings, comments = analyzeText(text, re.compile(r'//[^\n]*'), re.compile(r'/\*'), re.compile(r'\*/'), False)
+        for position, char in enumerate(text):
+            inComment = any(span.index <= position < span.index + span.length for span in comments)
+            self.assertEqual(isInsideTextSpan(position, comments), inComment, position)
+            inString = any(span.index <= position < span.index + span.length for span in strings)
+            self.assertEqual(isInsideTextSpan(position, strings), inString, position)
+        self.assertTrue(isInsideTextSpan(text.index("one"), comments))
+        self.assertTrue(isInsideTextSpan(text.index("two"), comments))
+        self.assertFalse(isInsideTextSpan(text.index("b ="), comments))
+        self.assertTrue(isInsideTextSpan(text.index("x"), strings))
+        self.assertFalse(isInsideTextSpan(text.index("three"), strings))
+
 class TestCommentExclusionInQueries(unittest.TestCase):
     """Test that queries correctly exclude matches in comments."""
 
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# The content sniffer keeps files out of the index which only have a source extension: binary files, generated files
+# like minified scripts and files which are too large to be useful search results. A few of them take a large share
+# of the indexing time and of the keywords. The sniffer looks at the size of a file and at the start of its content.
+# The reason why a file was skipped or indexed partially is recorded per document.
+
+import json
+import unittest
+from enum import IntEnum
+from typing import Optional
+from tools.FileTools import detectBom
+
+__all__ = ['ContentSniffer', 'SkipReason', 'sampleSize', 'binaryNulRatio']
+
+# Number of bytes at the start of a file which are checked for binary and generated content
+sampleSize = 64 * 1024
+
+# A sample with more NUL bytes than this ratio is binary. Text files with a UTF16 byte order mark are never binary.
+binaryNulRatio = 0.01
+
+class SkipReason(IntEnum):
+    """Why a file was not indexed completely. Stored in the documents table, NULL means the file is indexed completely."""
+    Binary = 1      # skipped, the file contains NUL bytes
+    Generated = 2   # skipped, the lines are too long for source code
+    TooLarge = 3    # skipped, the file exceeds the size limit
+    Truncated = 4   # only the start of the file up to the size limit is indexed
+
+class ContentSniffer:
+    """'maxFileSize' is the size limit in KB, 0 means no limit. Larger files are skipped or, if 'indexPartially' is set,
+       indexed up to the limit. Files whose average line length exceeds 'maxLineLength' are treated as generated."""
+    def __init__(self, maxFileSize: int = 0, indexPartially: bool = False, skipBinary: bool = False, maxLineLength: int = 0) -> None:
+        self.maxFileSize = maxFileSize
+        self.indexPartially = indexPartially
+        self.skipBinary = skipBinary
+        self.maxLineLength = maxLineLength
+
+    def isActive(self) -> bool:
+        return self.maxFileSize > 0 or self.skipBinary or self.maxLineLength > 0
+
+    def sizeLimit(self) -> int:
+        """Returns the size limit in bytes, 0 means no limit."""
+        return max(self.maxFileSize, 0) * 1024
+
+    def classifySize(self, size: int) -> Optional[SkipReason]:
+        """Returns TooLarge or Truncated if the file is larger than the limit, otherwise None."""
+        if self.sizeLimit() == 0 or size <= self.sizeLimit():
+            return None
+        return SkipReason.Truncated if self.indexPartially else SkipReason.TooLarge
+
+    def classifyContent(self, data: bytes) -> Optional[SkipReason]:
+        """Returns Binary or Generated if the file should be skipped because of its content, otherwise None. Only the start
+           of 'data' is checked."""
+        sample = data[:sampleSize]
+        if not sample:
+            return None
+        codec, _ = detectBom(sample[:3])
+        if self.skipBinary and codec not in ("utf_16_le", "utf_16_be") and sample.count(b"\0") > len(sample) * binaryNulRatio:
+            return SkipReason.Binary
+        if self.maxLineLength > 0:
+            # The last line of the sample may be cut but the average only matters for files with few and long lines
+            chars = len(sample) // 2 if codec in ("utf_16_le", "utf_16_be") else len(sample)
+            if chars / max(sample.count(b"\n"), 1) > self.maxLineLength:
+                return SkipReason.Generated
+        return None
+
+    def toJson(self) -> str:
+        return json.dumps(self.__dict__, sort_keys=True)
+
+    @staticmethod
+    def fromJson(text: str) -> Optional['ContentSniffer']:
+        """Returns the sniffer stored by toJson or None if the text is empty or invalid."""
+        try:
+            values = json.loads(text)
+            return ContentSniffer(int(values["maxFileSize"]), bool(values["indexPartially"]), bool(values["skipBinary"]),
+                                  int(values["maxLineLength"]))
+        except (ValueError, KeyError, TypeError):
+            return None
+
+class TestContentSniffer(unittest.TestCase):
+    def test_size(self) -> None:
+        self.assertFalse(ContentSniffer().isActive())
+        self.assertIsNone(ContentSniffer().classifySize(1 << 30))
+        self.assertIsNone(ContentSniffer(maxFileSize=1).classifySize(1024))
+        self.assertEqual(ContentSniffer(maxFileSize=1).classifySize(1025), SkipReason.TooLarge)
+        self.assertEqual(ContentSniffer(maxFileSize=1, indexPartially=True).classifySize(1025), SkipReason.Truncated)
+
+    def test_content(self) -> None:
+        sniffer = ContentSniffer(skipBinary=True, maxLineLength=100)
+        self.assertIsNone(sniffer.classifyContent(b""))
+        self.assertIsNone(sniffer.classifyContent(b"int main() {\n    return 0;\n}\n"))
+        self.assertEqual(sniffer.classifyContent(b"MZ\x90\0\x03\0\0\0\x04\0"), SkipReason.Binary)
+        self.assertIsNone(sniffer.classifyContent("int main();\n".encode("utf_16")))
+        self.assertEqual(sniffer.classifyContent(b"var a=1;" * 100 + b"\n"), SkipReason.Generated)
+        self.assertIsNone(ContentSniffer().classifyContent(b"\0" * 100))
+
+    def test_json(self) -> None:
+        sniffer = ContentSniffer(512, True, True, 250)
+        restored = ContentSniffer.fromJson(sniffer.toJson())
+        assert restored
+        self.assertEqual(restored.toJson(), sniffer.toJson())
+        self.assertIsNone(ContentSniffer.fromJson(""))
+        self.assertIsNone(ContentSniffer.fromJson("{}"))
+
+if __name__ == "__main__":
+    unittest.main()
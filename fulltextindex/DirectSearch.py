@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Searches locations which are not indexed. Walking a directory tree is dominated by the latency of listing the
+# directories, therefore the directories are listed by a pool of threads. The found files are passed on to the
+# verification as soon as they are listed. The verification reads and checks the files in parallel, see Verification.
+#
+# File name searches use a cached listing of the location instead. The listing remembers the modification time of
+# every directory. A refresh only lists the directories whose modification time changed, which is the case if files
+# were added, removed or renamed in them. The others are only checked with a stat call.
+
+import os
+import time
+import queue
+import threading
+from fnmatch import fnmatch
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Set, Dict, Tuple, FrozenSet
+from .Query import ContentQuery
+from .Verification import verifyFiles, MatchesFunction, SkippedFiles
+from .KeywordCaching import LruCache
+
+__all__ = ['findFiles', 'searchContentDirect', 'walkThreads', 'DirectoryListing', 'listFiles', 'prefetchFileListing',
+           'cachedFileListing', 'clearFileListings', 'maxCachedListings', 'Listing']
+
+# Number of threads which list directories
+walkThreads = 8
+
+# Number of locations whose file listing is kept in memory
+maxCachedListings = 4
+
+# A directory modified less than this number of seconds before it was listed is listed again by the next refresh.
+# Changes in the same tick of the file system clock don't change the modification time.
+_racyInterval = 2.0
+
+class DirectoryListing:
+    """The files of a directory which have one of the wanted extensions and its subdirectories."""
+    __slots__ = ('mtime', 'files', 'subdirs')
+
+    def __init__(self, mtime: Optional[int], files: List[str], subdirs: List[str]) -> None:
+        # None if the directory must be listed again
+        self.mtime = mtime
+        self.files = files
+        self.subdirs = subdirs
+
+# Maps the full path of a directory to its listing
+Listing = Dict[str, DirectoryListing]
+
+def _isExcluded(path: str, dirExcludes: List[str]) -> bool:
+    pathLower = path.lower()
+    for exclude in dirExcludes:
+        if fnmatch(pathLower, exclude):
+            return True
+    return False
+
+class _ParallelWalk:
+    """Lists the directories of a tree in parallel. The files of each directory are put into a queue."""
+    def __init__(self, extensions: Set[str], dirExcludes: List[str], threads: int, cancelEvent: Optional[threading.Event],
+                 previous: Optional[Listing]=None) -> None:
+        self.extensions = extensions
+        self.dirExcludes = dirExcludes
+        self.cancelEvent = cancelEvent
+        self.executor = ThreadPoolExecutor(max(threads, 1), thread_name_prefix="DirectoryWalk")
+        self.results: queue.Queue[Optional[List[str]]] = queue.Queue()
+        self.lock = threading.Lock()
+        self.pending = 0
+        # If 'previous' is passed the walk records the listing of every directory in 'listing' and reuses
+        # the listings of 'previous' which are still up to date
+        self.previous = previous
+        self.listing: Optional[Listing] = {} if previous is not None else None
+
+    def start(self, directory: str) -> None:
+        with self.lock:
+            self.pending += 1
+        self.executor.submit(self.__scan, directory)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def __scan(self, directory: str) -> None:
+        try:
+            if self.cancelEvent and self.cancelEvent.is_set():
+                return
+            if self.listing is not None:
+                self.__scanCached(directory)
+                return
+            files: List[str] = []
+            for name, isDir in self.__list(directory):
+                path = os.path.join(directory, name)
+                if isDir:
+                    self.start(path)
+                else:
+                    files.append(path)
+            if files:
+                self.results.put(files)
+        finally:
+            with self.lock:
+                self.pending -= 1
+                done = self.pending == 0
+            if done:
+                self.results.put(None)
+
+    def __list(self, directory: str) -> Iterator[Tuple[str, bool]]:
+        """Yields the subdirectories and the wanted files of the directory as (name, isDirectory)."""
+        # Like os.walk the files of excluded directories are skipped but their subdirectories are still visited
+        excluded = bool(self.dirExcludes) and _isExcluded(directory, self.dirExcludes)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        isDir = entry.is_dir()
+                    except OSError:
+                        isDir = False
+                    if isDir:
+                        # Symbolic links to directories are not followed, like os.walk does by default
+                        if not entry.is_symlink():
+                            yield entry.name, True
+                    elif not excluded:
+                        if os.path.splitext(entry.name)[1].lower() in self.extensions:
+                            yield entry.name, False
+        except OSError:
+            pass
+
+    def __scanCached(self, directory: str) -> None:
+        assert self.listing is not None and self.previous is not None
+        try:
+            mtime: Optional[int] = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        dirListing = self.previous.get(directory)
+        if dirListing is None or dirListing.mtime is None or dirListing.mtime != mtime:
+            listed = time.time_ns()
+            files: List[str] = []
+            subdirs: List[str] = []
+            for name, isDir in self.__list(directory):
+                (subdirs if isDir else files).append(name)
+            if mtime is not None and listed - mtime < _racyInterval * 1e9:
+                mtime = None
+            dirListing = DirectoryListing(mtime, files, subdirs)
+        # Each directory is visited by exactly one thread
+        self.listing[directory] = dirListing
+        for subdir in dirListing.subdirs:
+            self.start(os.path.join(directory, subdir))
+
+def _fixExtensions(extensions: Iterable[str]) -> Set[str]:
+    # An extension of "." matches files without extension
+    return {ext if ext != "." else "" for ext in extensions}
+
+def _walk(walk: _ParallelWalk, directory: str, cancelEvent: Optional[threading.Event]) -> Iterator[str]:
+    """Yields the files found by the walk. Stops if the walk is canceled."""
+    try:
+        walk.start(directory)
+        while True:
+            try:
+                files = walk.results.get(timeout=0.1)
+            except queue.Empty:
+                if cancelEvent and cancelEvent.is_set():
+                    return
+                continue
+            if files is None:
+                break
+            yield from files
+            if cancelEvent and cancelEvent.is_set():
+                return
+    finally:
+        walk.close()
+
+def findFiles(extensions: Iterable[str], directories: Iterable[str], dirExcludes: Optional[List[str]]=None,
+              cancelEvent: Optional[threading.Event]=None, threads: int = walkThreads) -> Iterator[str]:
+    """Yields the full path of all files below the directories which have one of the extensions. Finds the same files
+       as IndexUpdater.genFind but lists the directories in parallel, the order of the files is undefined."""
+    extensionSet = _fixExtensions(extensions)
+    excludes = [exclude.lower() for exclude in dirExcludes or []]
+    for directory in directories:
+        yield from _walk(_ParallelWalk(extensionSet, excludes, threads, cancelEvent), directory, cancelEvent)
+
+ListingKey = Tuple[Tuple[str, ...], FrozenSet[str], Tuple[str, ...]]
+
+class _CachedListing:
+    def __init__(self) -> None:
+        self.listing: Optional[Listing] = None
+        # Only one thread refreshes the listing, the others wait for the result
+        self.lock = threading.Lock()
+
+_listings: LruCache[ListingKey, _CachedListing] = LruCache(maxCachedListings, lambda _: 1)
+_listingsLock = threading.Lock()
+
+def _cachedListing(key: ListingKey) -> _CachedListing:
+    with _listingsLock:
+        cached = _listings.get(key)
+        if cached is None:
+            cached = _CachedListing()
+            _listings.put(key, cached)
+        return cached
+
+def listFiles(extensions: Iterable[str], directories: Iterable[str], dirExcludes: Optional[List[str]]=None,
+              cancelEvent: Optional[threading.Event]=None, threads: int = walkThreads) -> Optional[Listing]:
+    """Returns the listing of all directories below the directories. Contains the same files as IndexUpdater.genFind.
+       The listing is cached and refreshed incrementally by the next call. Returns None if the call was canceled.
+       The returned listing must not be modified."""
+    directories = tuple(directories)
+    excludes = tuple(exclude.lower() for exclude in dirExcludes or [])
+    extensionSet = _fixExtensions(extensions)
+    cached = _cachedListing((directories, frozenset(extensionSet), excludes))
+    with cached.lock:
+        previous = cached.listing or {}
+        listing: Listing = {}
+        for directory in directories:
+            walk = _ParallelWalk(extensionSet, list(excludes), threads, cancelEvent, previous)
+            for _ in _walk(walk, directory, cancelEvent):
+                pass
+            if cancelEvent and cancelEvent.is_set():
+                # The listing is incomplete, keep the previous one
+                return None
+            assert walk.listing is not None
+            listing.update(walk.listing)
+        cached.listing = listing
+        return listing
+
+def cachedFileListing(extensions: Iterable[str], directories: Iterable[str], dirExcludes: Optional[List[str]]=None) -> Optional[Listing]:
+    """Returns the cached listing without refreshing it or None if there is none."""
+    directories = tuple(directories)
+    excludes = tuple(exclude.lower() for exclude in dirExcludes or [])
+    return _cachedListing((directories, frozenset(_fixExtensions(extensions)), excludes)).listing
+
+def prefetchFileListing(extensions: Iterable[str], directories: Iterable[str], dirExcludes: Optional[List[str]]=None) -> None:
+    """Builds the listing in a background thread if it is not cached yet."""
+    directories = tuple(directories)
+    excludes = tuple(exclude.lower() for exclude in dirExcludes or [])
+    cached = _cachedListing((directories, frozenset(_fixExtensions(extensions)), excludes))
+    if cached.listing is None and not cached.lock.locked():
+        threading.Thread(target=listFiles, args=(extensions, directories, dirExcludes), name="FileListing", daemon=True).start()
+
+def clearFileListings() -> None:
+    _listings.removeIf(lambda _: True)
+
+def searchContentDirect(query: ContentQuery, extensions: Iterable[str], directories: Iterable[str], dirExcludes: Optional[List[str]]=None,
+                        cancelEvent: Optional[threading.Event]=None, reportMatches: Optional[MatchesFunction]=None,
+                        skippedFiles: Optional[SkippedFiles]=None) -> Optional[List[str]]:
+    """Returns the unsorted files below the directories which match the query or None if the search was canceled.
+       'reportMatches' receives the matches while the search is running."""
+    candidates = (name for name in findFiles(extensions, directories, dirExcludes, cancelEvent)
+                  if query.matchFolderAndExtensionFilter(name) and query.matchModifiedTime(name))
+    return verifyFiles(query, candidates, cancelEvent, reportMatches=reportMatches, skippedFiles=skippedFiles)
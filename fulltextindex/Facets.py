@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Facets tell where the matches of a search are: the number of matches per top level directory, per directory
+# and per extension. They are computed by the search thread together with the result. The result is sorted,
+# consecutive matches mostly share their directory which is therefore split only once.
+
+import os
+import unittest
+from typing import Dict, Iterable, List, Optional, Tuple
+
+__all__ = ['Facets', 'FacetCounts', 'computeFacets', 'mostCommon', 'folderFilterFor', 'extensionFilterFor']
+
+FacetCounts = Dict[str, int]
+
+class Facets:
+    """Directories are relative to the directory of the search location which contains them. The extension
+       of files without extension is the empty string."""
+    def __init__(self) -> None:
+        self.topLevel: FacetCounts = {}
+        self.directories: FacetCounts = {}
+        self.extensions: FacetCounts = {}
+
+    def isEmpty(self) -> bool:
+        return not self.extensions
+
+def mostCommon(counts: FacetCounts, limit: int) -> List[Tuple[str, int]]:
+    """Returns the entries with the highest counts, ties are sorted by name."""
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+def _relativeDirectory(directory: str, roots: List[str]) -> str:
+    for root in roots:
+        if directory.startswith(root) and (len(directory) == len(root) or directory[len(root)] == os.sep or root.endswith(os.sep)):
+            return directory[len(root):].strip(os.sep)
+    return directory
+
+def computeFacets(matches: Iterable[str], roots: Iterable[str]) -> Facets:
+    """Counts the matches per top level directory, directory and extension. 'roots' are the directories of the search location."""
+    facets = Facets()
+    topLevel, directories, extensions = facets.topLevel, facets.directories, facets.extensions
+    # Longer roots first, nested locations are attributed to the innermost root
+    rootList = sorted((os.path.normpath(root) for root in roots), key=len, reverse=True)
+    lastDirectory: Optional[str] = None
+    relative = top = ""
+    for match in matches:
+        directory, name = os.path.split(match)
+        if directory != lastDirectory:
+            lastDirectory = directory
+            relative = _relativeDirectory(directory, rootList)
+            # Matches outside of the roots keep their absolute directory
+            top = relative if os.path.isabs(relative) else relative.split(os.sep, 1)[0]
+        topLevel[top] = topLevel.get(top, 0) + 1
+        directories[relative] = directories.get(relative, 0) + 1
+        ext = os.path.splitext(name)[1].lower()
+        extensions[ext] = extensions.get(ext, 0) + 1
+    return facets
+
+def folderFilterFor(relativeDirectory: str) -> str:
+    """Returns a folder filter which matches the files below the relative directory. The filter can't contain
+       path separators, they are replaced by the single character wildcard."""
+    return ("?" + relativeDirectory + "?").replace(os.sep, "?")
+
+def extensionFilterFor(extension: str) -> str:
+    return extension or "."
+
+class TestFacets(unittest.TestCase):
+    def test(self) -> None:
+        root = os.path.join(os.sep + "code", "proj")
+        matches = sorted(os.path.join(root, *parts) for parts in [("src", "net", "socket.c"), ("src", "net", "socket.h"),
+                                                                  ("src", "ui", "main.c"), ("README",), ("test", "t.c")])
+        matches.append(os.path.join(os.sep + "other", "x.c"))
+        facets = computeFacets(matches, [root + os.sep, os.path.join(root, "src", "net")])
+        self.assertEqual(facets.topLevel, {"": 3, "src": 1, "test": 1, os.path.join(os.sep + "other"): 1})
+        self.assertEqual(facets.directories, {"": 3, "src" + os.sep + "ui": 1, "test": 1, os.sep + "other": 1})
+        self.assertEqual(facets.extensions, {".c": 4, ".h": 1, "": 1})
+        self.assertEqual(mostCommon(facets.extensions, 2), [(".c", 4), ("", 1)])
+
+    def test_filters(self) -> None:
+        self.assertEqual(folderFilterFor("src" + os.sep + "net"), "?src?net?")
+        self.assertEqual(extensionFilterFor(""), ".")
+        self.assertEqual(extensionFilterFor(".h"), ".h")
+
+if __name__ == "__main__":
+    unittest.main()
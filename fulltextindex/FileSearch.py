@@ -19,17 +19,80 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import re
 import os
 import sqlite3
-from .Query import FileQuery, PerformanceReport, SearchResult, safeLen, hasFileNameWildcard, createPathMatchPattern
-from typing import Optional
+from .Query import Query, FileQuery, PerformanceReport, SearchResult, safeLen, hasFileNameWildcard, createPathMatchPattern
+from .KeywordDictionary import KeywordDictionary
+from typing import Optional, List, Dict, Union, Any, Tuple
 
 emptyPattern = re.compile("") # make mypy happy
 
+# Number of file name IDs which are passed to the database in one statement
+nameBatchSize = 10000
+
 def escapeFileName(name: str) -> str:
     name = name.replace("_", "!_")
     name = name.replace("?", "_") # one char wild card
     return name.replace("*", "%") # any number char wild card
 
-def searchFile(q: sqlite3.Cursor, query: FileQuery, perfReport: Optional[PerformanceReport]=None) -> SearchResult:
+def likePattern(pattern: str, substring: bool) -> str:
+    """Translates a pattern with the wildcards '*' and '?' into a LIKE pattern with the escape character '!'."""
+    pattern = pattern.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+    pattern = pattern.replace("?", "_").replace("*", "%")
+    if substring:
+        return "%" + pattern + "%"
+    return pattern
+
+# LIKE ignores the case of ASCII characters only. Paths with other characters are left to the filter in Python.
+_nonAsciiGlob = "*[^\x01-\x7f]*"
+
+def documentFilter(query: Query) -> Optional[Tuple[str, List[Union[str, float]]]]:
+    """Returns a condition on 'fullpath' of the documents table and its parameters which keeps at least all documents
+       passing the folder and extension filter of the query. Returns None if the filters can't be expressed.
+       The condition may keep more documents, the result must still be checked by 'matchFolderAndExtensionFilter'.
+       The time filter is checked exactly against the modification time recorded by the index."""
+    conditions: List[str] = []
+    params: List[Union[str, float]] = []
+
+    def anyOf(patterns: List[str]) -> str:
+        params.extend(patterns)
+        return "(" + " OR ".join("fullpath LIKE ? ESCAPE '!'" for _ in patterns) + ")"
+
+    def pushable(part: str) -> bool:
+        return bool(part) and part.isascii()
+
+    folderFilter = query.getFolderFilterExpression()
+    if folderFilter.includeParts and all(pushable(part) for part in folderFilter.includeParts):
+        condition = anyOf([likePattern(part, True) for part in folderFilter.includeParts])
+        params.append(_nonAsciiGlob)
+        conditions.append("(%s OR fullpath GLOB ?)" % (condition,))
+    # Every excluded part is exact on its own, parts which can't be expressed are left out
+    excludeParts = [likePattern(part, True) for part in folderFilter.excludeParts if pushable(part)]
+    if excludeParts:
+        conditions.append("NOT " + anyOf(excludeParts))
+
+    # An extension is the end of the path. Excluded extensions are not pushed down because a LIKE on the path
+    # can't tell the extension '.h' from a file named '.h'.
+    extensionFilter = query.getExtensionFilterExpression()
+    if extensionFilter.includeParts and all(pushable(part) for part in extensionFilter.includeParts):
+        condition = anyOf(["%" + likePattern(part, False) for part in extensionFilter.includeParts])
+        params.append(_nonAsciiGlob)
+        conditions.append("(%s OR fullpath GLOB ?)" % (condition,))
+
+    # The timestamp column is indexed, a recent time range selects only a few documents
+    if query.modifiedSince is not None:
+        conditions.append("timestamp >= ?")
+        params.append(query.modifiedSince)
+    if query.modifiedBefore is not None:
+        conditions.append("timestamp < ?")
+        params.append(query.modifiedBefore)
+
+    if not conditions:
+        return None
+    return " AND ".join(conditions), params
+
+def searchFile(q: sqlite3.Cursor, query: FileQuery, perfReport: Optional[PerformanceReport]=None,
+               dictionary: Optional[KeywordDictionary]=None) -> SearchResult:
+    """Returns the sorted files whose name matches the query. Wildcard names are resolved by the file name
+       dictionary if one is passed, otherwise the database has to scan all names."""
     if not isinstance(query, FileQuery):
         raise RuntimeError("query must be a FileQuery derived object")
 
@@ -39,13 +102,22 @@ def searchFile(q: sqlite3.Cursor, query: FileQuery, perfReport: Optional[Perform
     positiveExtFilter = query.getExtensionFilterExpression().includeParts
     negativeExtFilter = query.getExtensionFilterExpression().excludeParts
 
-    params = {}
+    params: Dict[str, Union[str, int, float]] = {}
 
     queryStmt = "SELECT DISTINCT fullpath FROM fileName fn,fileName2doc fn2d,documents d WHERE fn2d.docID=d.id AND fn2d.fileNameID=fn.id AND "
+    # The condition on the name is inserted in front of the filters
+    filterStmt = ""
 
     fileNameHasWildcards = hasFileNameWildcard(search)
 
-    if fileNameHasWildcards:
+    nameIDs: Optional[List[int]] = None
+    if fileNameHasWildcards and dictionary:
+        with perfReport.newAction("Resolving file names") as action:
+            nameIDs = [nameID for nameID, _ in dictionary.lookup(search, True)]
+            action.addData("%u file names", len(nameIDs))
+        if not nameIDs:
+            return []
+    elif fileNameHasWildcards:
         queryStmt += "fn.name LIKE :searchTerm ESCAPE '!'"
         params["searchTerm"] = escapeFileName(search)
     else:
@@ -75,25 +147,45 @@ def searchFile(q: sqlite3.Cursor, query: FileQuery, perfReport: Optional[Perform
         # If no wildcard is used the in list approach is more efficient. For wildcards we need 'like'. Both are shown here
         # fn.ext in ('.h','.cpp') and not (fn.ext like '.a%' or fn.ext like '.b')) 
         if positiveExtFilter:
-            queryStmt += " AND "
+            filterStmt += " AND "
             if not positiveWildcard:
-                queryStmt += "fn.ext IN ({})".format(",".join(positiveParams)) # IN (p1,p2,p3)
+                filterStmt += "fn.ext IN ({})".format(",".join(positiveParams)) # IN (p1,p2,p3)
             else:
-                queryStmt += "("
-                queryStmt += " OR ".join((f"fn.ext LIKE {p}" for p in positiveParams))
-                queryStmt += ")"
+                filterStmt += "("
+                filterStmt += " OR ".join((f"fn.ext LIKE {p}" for p in positiveParams))
+                filterStmt += ")"
         if negativeExtFilter:
-            queryStmt += " AND NOT "
+            filterStmt += " AND NOT "
             if not negatedWildcard:
-                queryStmt += "fn.ext IN ({})".format(",".join(negativeParams)) # IN (n1,n2,n3)
+                filterStmt += "fn.ext IN ({})".format(",".join(negativeParams)) # IN (n1,n2,n3)
             else:
-                queryStmt += "("
-                queryStmt += " OR ".join((f"fn.ext LIKE {p}" for p in negativeParams))
-                queryStmt += ")"
+                filterStmt += "("
+                filterStmt += " OR ".join((f"fn.ext LIKE {p}" for p in negativeParams))
+                filterStmt += ")"
+
+    if query.modifiedSince is not None:
+        filterStmt += " AND d.timestamp >= :modifiedSince"
+        params["modifiedSince"] = query.modifiedSince
+    if query.modifiedBefore is not None:
+        filterStmt += " AND d.timestamp < :modifiedBefore"
+        params["modifiedBefore"] = query.modifiedBefore
 
     with perfReport.newAction("Finding documents") as action:
-        q.execute(queryStmt + " ORDER BY d.fullpath", params)
-        result = q.fetchall()
+        result: List[Any]
+        if nameIDs is None:
+            q.execute(queryStmt + filterStmt + " ORDER BY d.fullpath", params)
+            result = q.fetchall()
+        else:
+            result = []
+            for i in range(0, len(nameIDs), nameBatchSize):
+                batch = nameIDs[i:i+nameBatchSize]
+                batchParams = dict(params)
+                batchParams.update((f"id{j}", nameID) for j, nameID in enumerate(batch))
+                idParams = ",".join(f":id{j}" for j in range(len(batch)))
+                q.execute(queryStmt + f"fn.id IN ({idParams})" + filterStmt + " ORDER BY d.fullpath", batchParams)
+                result.extend(q.fetchall())
+            if len(nameIDs) > nameBatchSize:
+                result = sorted(set(result))
 
 
     if query.folderFilter:
@@ -18,17 +18,38 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import sqlite3
 import threading
-from typing import List, Tuple, Iterable, Any, Dict, Callable, Optional
-from tools.FileTools import fopen, freadall
-from .IndexDatabase import IndexDatabase
-from .FileSearch import searchFile
-from .Query import Query, ContentQuery, FileQuery, PerformanceReport, ReportAction, safeLen, SearchResult
-from .KeywordCaching import Keyword, getCachedKeywords, setCachedKeywords, checkAndInvalidateKeywordsCache
-
-__all__ = ['ContentQuery', 'FileQuery', 'Query', 'PerformanceReport', 'SearchResult', 'Keyword', 'buildMapFromCommonKeywordFile', 'FullTextIndex']
+from array import array
+from typing import List, Tuple, Iterable, Any, Dict, Callable, Optional, Collection
+from tools.FileTools import fopen, Encoding
+from .IndexDatabase import IndexDatabase, IndexGeneration
+from .FileSearch import searchFile, documentFilter
+from .FuzzyFinder import findFilesFuzzy, isFileNameIndexLoaded
+from .Query import Query, ContentQuery, FileQuery, PerformanceReport, ReportAction, safeLen, SearchResult, hasFileNameWildcard
+from .KeywordCaching import Keyword, checkGeneration, getCachedKeywords, setCachedKeywords, getCachedPostings, setCachedPostings, \
+                            getCachedFilter, setCachedFilter, keywordCacheStatistics, postingCacheStatistics
+from .KeywordDictionary import KeywordDictionary, openKeywordDictionary, openFileNameDictionary
+from .ContentSniffer import SkipReason
+from .Verification import verifyFiles, verificationThreads, verificationProcesses, isGuarded, MatchesFunction, VerificationPager, EncodingHints, SkippedFiles
+
+__all__ = ['ContentQuery', 'FileQuery', 'Query', 'PerformanceReport', 'SearchResult', 'Keyword', 'buildMapFromCommonKeywordFile', 'FullTextIndex', 'MatchesFunction', 'EncodingHints',
+           'SkippedFiles', 'SkipReasons', 'FullScanRequired']
 
 ProgressFunction = Callable[[int], None]
 
+# Maps the full path of a document to the reason why the index update didn't index it completely
+SkipReasons = Dict[str, SkipReason]
+
+# Limits the number of skipped files which are listed in the performance report
+maxReportedSkippedFiles = 20
+
+class FullScanRequired(RuntimeError):
+    """Raised by a query which doesn't allow a full scan if all 'fileCount' indexed files would have to be read. The token
+       filter of the index may have removed all 'hiddenParts' of the query."""
+    def __init__(self, hiddenParts: List[str], fileCount: int) -> None:
+        super().__init__("'%s' may not be in the index, all %u files would have to be read" % ("', '".join(hiddenParts), fileCount))
+        self.hiddenParts = hiddenParts
+        self.fileCount = fileCount
+
 def intersectSortedLists(l1: List[str], l2: List[str]) -> List[str]:
     l = 0
     r = 0
@@ -53,8 +74,17 @@ def intersectSortedLists(l1: List[str], l2: List[str]) -> List[str]:
         pass
     return l3
 
+class KeywordMatches(List[Keyword]):
+    """The keywords which match a search keyword. The search keyword might contain wildcards."""
+    def __init__(self, searchKeyword: str, keywords: Iterable[Keyword]) -> None:
+        super().__init__(keywords)
+        self.searchKeyword = searchKeyword
+
 KeywordList = List[List[Keyword]]
 
+# Number of document IDs which are resolved to paths with one statement
+resolveBatchSize = 500
+
 CommonKeywordMap = Dict[str,int]
 
 def buildMapFromCommonKeywordFile(name:str) -> CommonKeywordMap:
@@ -83,15 +113,49 @@ class FullTextIndex (IndexDatabase):
 
     def __searchFile(self, query: FileQuery, perfReport: Optional[PerformanceReport]=None) -> SearchResult:
         q = self.conn.cursor()
-        return searchFile(q, query, perfReport)
+        dictionary = None
+        if hasFileNameWildcard(query.search):
+            # The database can't use its index on the names for wildcards
+            dictionary = openFileNameDictionary(self.strDbLocation, self.indexGeneration())
+        return searchFile(q, query, perfReport, dictionary)
+
+    def findFilesFuzzy(self, pattern: str, limit: int) -> SearchResult:
+        """Returns the files whose names match the abbreviation best, e.g. 'fbctl' finds 'FooBarController.cpp'. The best match comes first."""
+        return findFilesFuzzy(self.conn, self.strDbLocation, pattern, limit)
+
+    def isFuzzyFinderLoaded(self) -> bool:
+        return isFileNameIndexLoaded(self.conn, self.strDbLocation)
+
+    def completeKeyword(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Returns the keywords starting with the prefix as (keyword, document count), the most common keyword first.
+           Without keyword dictionary the keywords are taken from the database in alphabetical order and the count is unknown (0)."""
+        prefix = prefix.lower()
+        dictionary = openKeywordDictionary(self.strDbLocation, self.indexGeneration())
+        if dictionary:
+            return dictionary.complete(prefix, limit)
+        q = self.conn.cursor()
+        q.execute("SELECT keyword FROM keywords WHERE keyword>=? AND keyword<? ORDER BY keyword LIMIT ?", (prefix, prefix + "\U0010ffff", limit))
+        return [(keyword, 0) for keyword, in q.fetchall()]
 
     # commonKeywordMap maps  keywords to numbers. A lower number means a worse keyword. Bad keywords are very common like "h" in cpp files.
     def searchContent(self, query: ContentQuery, perfReport: Optional[PerformanceReport]=None, commonKeywordMap: Optional[CommonKeywordMap]=None,
-                      cancelEvent: Optional[threading.Event]=None, reportProgress: Optional[ProgressFunction]=None) -> SearchResult:
-        return cancelableSearch(self.__searchContent, query, perfReport, commonKeywordMap, cancelEvent, reportProgress)
+                      cancelEvent: Optional[threading.Event]=None, reportProgress: Optional[ProgressFunction]=None,
+                      reportMatches: Optional[MatchesFunction]=None, pager: Optional[VerificationPager]=None,
+                      encodingHints: Optional[EncodingHints]=None, skippedFiles: Optional[SkippedFiles]=None,
+                      scope: Optional[Collection[str]]=None) -> SearchResult:
+        """Returns the sorted list of matching files. If the files need to be read to verify the matches, 'reportMatches'
+           receives the verified matches in batches before the search is finished and 'pager' may pause the verification.
+           'encodingHints' is filled with the encodings of the found documents as far as the index knows them.
+           'skippedFiles' receives the files which were not verified because the query exceeded its time budget.
+           If 'scope' is passed only these files are searched, e.g. the locked result of a previous search."""
+        return cancelableSearch(self.__searchContent, query, perfReport, commonKeywordMap, cancelEvent, reportProgress, reportMatches, pager,
+                                encodingHints, skippedFiles, scope)
 
     def __searchContent(self, query: ContentQuery, perfReport: Optional[PerformanceReport]=None, commonKeywordMap: Optional[CommonKeywordMap]=None, 
-                        cancelEvent: Optional[threading.Event]=None, reportProgress: Optional[ProgressFunction]=None) -> SearchResult:
+                        cancelEvent: Optional[threading.Event]=None, reportProgress: Optional[ProgressFunction]=None,
+                        reportMatches: Optional[MatchesFunction]=None, pager: Optional[VerificationPager]=None,
+                        encodingHints: Optional[EncodingHints]=None, skippedFiles: Optional[SkippedFiles]=None,
+                        scope: Optional[Collection[str]]=None) -> SearchResult:
         if not isinstance(query, ContentQuery):
             raise RuntimeError("query must be a ContentQuery derived object")
 
@@ -101,91 +165,229 @@ class FullTextIndex (IndexDatabase):
 
         q = self.conn.cursor()
 
+        # Cached keywords and postings are only valid for the generation they were read from
+        generation = self.indexGeneration()
+        if generation is None:
+            return []
+        checkGeneration(self.strDbLocation, generation)
+
+        # Keywords which the token filter of the index may have removed don't restrict the documents, the files are read instead
+        indexedParts = list(query.indexedPartsLower())
+        tokenFilter = self.tokenFilter()
+        hiddenParts = [part for part in indexedParts if tokenFilter and tokenFilter.mayHideMatches(part.lstrip("^"))]
+
         # The result is a list of lists of Keyword objects
         kwList: KeywordList = []
         with perfReport.newAction("Finding keywords") as action:
-            kwList = self.__getKeywords(q, query.indexedPartsLower(), reportAction=action)
-            if not kwList:
-                return []
+            for part in hiddenParts:
+                action.addData("String '%s' may be removed by the token filter of the index", part)
+            searchedParts = [part for part in indexedParts if part not in hiddenParts]
+            if searchedParts:
+                kwList = self.__getKeywords(q, searchedParts, reportAction=action, generation=generation)
+                action.addData("Keyword cache: %s", keywordCacheStatistics())
+                if not kwList:
+                    return []
 
         goodKeywords, badKeywords = self.__qualifyKeywords(kwList, commonKeywordMap)
 
+        filteredDocs = None
+        if scope is not None:
+            with perfReport.newAction("Applying scope") as action:
+                filteredDocs = self.__findDocsByPaths(q, scope)
+                action.addData("%u of %u files in scope are indexed", len(filteredDocs), len(scope))
+                if not filteredDocs:
+                    return []
+        if query.hasFilters() or query.hasTimeFilter():
+            with perfReport.newAction("Applying filters") as action:
+                docsByFilter = self.__findDocsByFilter(q, query, generation)
+                if docsByFilter is not None:
+                    action.addData("%u documents pass the filters", len(docsByFilter))
+                    if filteredDocs is None:
+                        filteredDocs = docsByFilter
+                    else:
+                        filteredDocs = array("q", sorted(set(filteredDocs).intersection(docsByFilter)))
+                    if not filteredDocs:
+                        return []
+
         with perfReport.newAction("Finding documents") as action:
-            result = self.__findDocsByKeywordsManualIntersect(q, goodKeywords, badKeywords, action)
-            action.addData("%u matches", safeLen(result))
-            if not result:
+            if kwList:
+                docIDs = self.__findDocsByKeywordsManualIntersect(q, goodKeywords, badKeywords, action, generation, filteredDocs)
+            elif filteredDocs is not None:
+                docIDs = filteredDocs.tolist()
+            else:
+                if not query.bAllowFullScan:
+                    q.execute("SELECT COUNT(*) FROM documents")
+                    raise FullScanRequired(hiddenParts, q.fetchone()[0])
+                action.addData("No keyword can be searched in the index, all documents are checked")
+                q.execute("SELECT id FROM documents ORDER BY id")
+                docIDs = [r[0] for r in q.fetchall()]
+            action.addData("%u matches", safeLen(docIDs))
+            action.addData("Posting cache: %s", postingCacheStatistics())
+            if not docIDs:
                 return []
+            if encodingHints is None:
+                encodingHints = {}
+            result = self.__resolveDocuments(q, docIDs, encodingHints)
 
-        if query.requiresReadingFile():
+        if query.requiresReadingFile() or hiddenParts:
             with perfReport.newAction("Filtering results") as action:
-                return self.__filterDocsBySearchPhrase(action, (r[0] for r in result), query, cancelEvent, reportProgress, len(result))
+                return self.__filterDocsBySearchPhrase(action, result, query, cancelEvent, reportProgress, len(result), reportMatches, pager,
+                                                       encodingHints, skippedFiles)
         else:
             with perfReport.newAction("Returning results"):
                 if not query.folderFilter and not query.extensionFilter:
-                    return [r[0] for r in result]
-                return [r[0] for r in result if query.matchFolderAndExtensionFilter(r[0])]
+                    return result
+                return [r for r in result if query.matchFolderAndExtensionFilter(r)]
         return []
 
-    def __findDocsByKeywordsManualIntersect(self, q: sqlite3.Cursor, goodKeywords: KeywordList, badKeywords: KeywordList, reportAction: ReportAction) -> SearchResult:
+    def documentTimestamps(self, paths: Collection[str]) -> Dict[str, float]:
+        """Returns the modification times of the files recorded by the last index update. Files which are not indexed are left out."""
+        q = self.conn.cursor()
+        timestamps: Dict[str, float] = {}
+        pathList = list(paths)
+        for i in range(0, len(pathList), resolveBatchSize):
+            batch = pathList[i:i+resolveBatchSize]
+            placeholders = ",".join("?" * len(batch))
+            q.execute(f"SELECT fullpath,timestamp FROM documents WHERE fullpath IN ({placeholders})", batch)
+            timestamps.update((fullpath, float(timestamp)) for fullpath, timestamp in q.fetchall() if timestamp is not None)
+        return timestamps
+
+    def skipReasons(self, paths: Collection[str]) -> SkipReasons:
+        """Returns the reasons why the files were skipped or indexed partially. Files which are indexed completely are left out."""
+        if not self.hasSkipReason():
+            return {}
+        q = self.conn.cursor()
+        # Only a few documents have a reason, it's faster to filter them than to look up all paths
+        q.execute("SELECT fullpath,skipReason FROM documents WHERE skipReason IS NOT NULL")
+        rows = q.fetchall()
+        if not rows:
+            return {}
+        pathSet = paths if isinstance(paths, (set, frozenset)) else set(paths)
+        return {fullpath: SkipReason(reason) for fullpath, reason in rows if fullpath in pathSet}
+
+    # Returns the sorted full paths of the documents and adds their encodings to 'encodingHints'
+    def __resolveDocuments(self, q: sqlite3.Cursor, docIDs: List[int], encodingHints: EncodingHints) -> SearchResult:
         result: SearchResult = []
+        hasEncoding = self.hasDocumentEncoding()
+        for i in range(0, len(docIDs), resolveBatchSize):
+            batch = docIDs[i:i+resolveBatchSize]
+            placeholders = ",".join("?" * len(batch))
+            if not hasEncoding:
+                q.execute(f"SELECT fullpath FROM documents WHERE id IN ({placeholders})", batch)
+                result.extend(r[0] for r in q.fetchall())
+                continue
+            q.execute(f"SELECT fullpath,encoding FROM documents WHERE id IN ({placeholders})", batch)
+            for fullpath, encoding in q.fetchall():
+                result.append(fullpath)
+                if encoding is not None:
+                    encodingHints[fullpath] = Encoding(encoding)
+        result.sort()
+        return result
+
+    # Returns the sorted IDs of the documents with the given paths. Paths which are not indexed are ignored.
+    def __findDocsByPaths(self, q: sqlite3.Cursor, paths: Collection[str]) -> "array[int]":
+        docIDs: List[int] = []
+        pathList = list(paths)
+        for i in range(0, len(pathList), resolveBatchSize):
+            batch = pathList[i:i+resolveBatchSize]
+            placeholders = ",".join("?" * len(batch))
+            q.execute(f"SELECT id FROM documents WHERE fullpath IN ({placeholders})", batch)
+            docIDs.extend(r[0] for r in q.fetchall())
+        docIDs.sort()
+        return array("q", docIDs)
+
+    # Returns the sorted IDs of the documents which may pass the folder, extension and time filter of the query or None
+    # if the filters can't be checked by the database. The result is cached like the postings of a keyword.
+    def __findDocsByFilter(self, q: sqlite3.Cursor, query: Query, generation: IndexGeneration) -> Optional["array[int]"]:
+        condition = documentFilter(query)
+        if condition is None:
+            return None
+        stmt, params = condition
+        cacheKey = stmt + repr(params)
+        docIDs = getCachedFilter(self.strDbLocation, generation, cacheKey)
+        if docIDs is None:
+            q.execute(f"SELECT id FROM documents WHERE {stmt} ORDER BY id", params)
+            docIDs = array("q", (r[0] for r in q.fetchall()))
+            setCachedFilter(self.strDbLocation, generation, cacheKey, docIDs)
+        return docIDs
+
+    # Returns the sorted IDs of all documents which contain all keywords. If 'filteredDocs' is passed only these documents
+    # are considered.
+    def __findDocsByKeywordsManualIntersect(self, q: sqlite3.Cursor, goodKeywords: KeywordList, badKeywords: KeywordList, reportAction: ReportAction,
+                                            generation: Optional[IndexGeneration]=None, filteredDocs: Optional["array[int]"]=None) -> List[int]:
+        result: List[int] = []
         allKeywords = [(True, keywords) for keywords in goodKeywords] + [(False, keywords) for keywords in badKeywords]
+        first = True
         for isGood, keywords in allKeywords:
             # Stop if all good keywords have been used and the result is stripped down to less than 100 files
             if not isGood:
                 kwNames = ",".join((keyword.name for keyword in keywords))
-                if result and len(result) < 100:
+                if not first and len(result) < 100:
                     reportAction.addData("Search stopped with common keyword '%s'", kwNames)
                     break
                 else:
-                    if result:
+                    if not first:
                         reportAction.addData("Common keyword '%s' used because %u matches are too much", kwNames, len(result))
                     else:
                         reportAction.addData("Common keyword '%s' used as first keyword", kwNames)
-            keywordIds = [keyword.id for keyword in keywords]
-            placeholders = ",".join("?" * len(keywordIds))
-            stmt = f"SELECT DISTINCT fullpath FROM kw2doc,documents WHERE docID=id AND kwID IN ({placeholders}) ORDER BY fullpath"
-            q.execute(stmt, keywordIds)
-            kwMatches = q.fetchall()
-            if not result:
-                result = kwMatches
+            kwMatches = self.__getPostings(q, keywords, generation)
+            if first:
+                first = False
+                if filteredDocs is None:
+                    result = kwMatches.tolist()
+                elif len(filteredDocs) < len(kwMatches):
+                    result = sorted(set(filteredDocs).intersection(kwMatches))
+                else:
+                    result = sorted(set(kwMatches).intersection(filteredDocs))
             else:
-                result = intersectSortedLists(result, kwMatches)
+                result = sorted(set(result).intersection(kwMatches))
             if not result:
                 return []
         return result
 
+    # Returns the sorted IDs of all documents which contain one of the keywords
+    def __getPostings(self, q: sqlite3.Cursor, keywords: List[Keyword], generation: Optional[IndexGeneration]) -> "array[int]":
+        searchKeyword = keywords.searchKeyword if isinstance(keywords, KeywordMatches) else None
+        if searchKeyword is not None and generation is not None:
+            postings = getCachedPostings(self.strDbLocation, generation, searchKeyword)
+            if postings is not None:
+                return postings
+
+        keywordIds = [keyword.id for keyword in keywords]
+        placeholders = ",".join("?" * len(keywordIds))
+        stmt = f"SELECT DISTINCT docID FROM kw2doc WHERE kwID IN ({placeholders}) ORDER BY docID"
+        q.execute(stmt, keywordIds)
+        postings = array("q", (r[0] for r in q.fetchall()))
+
+        if searchKeyword is not None and generation is not None:
+            setCachedPostings(self.strDbLocation, generation, searchKeyword, postings)
+        return postings
+
     def __filterDocsBySearchPhrase(self, action: ReportAction, results: Iterable[str], query: ContentQuery,
                                    cancelEvent: Optional[threading.Event]=None,
-                                   reportProgress: Optional[ProgressFunction]=None, lenResults: int = 0) -> SearchResult:
-        finalResults = []
+                                   reportProgress: Optional[ProgressFunction]=None, lenResults: int = 0,
+                                   reportMatches: Optional[MatchesFunction]=None, pager: Optional[VerificationPager]=None,
+                                   encodingHints: Optional[EncodingHints]=None, skippedFiles: Optional[SkippedFiles]=None) -> SearchResult:
         reExpr = query.regExForMatches()
         action.addData("RegEx: %s", reExpr.pattern)
-        bHasFilters = query.folderFilter or query.extensionFilter
-        lastProgress = None
-        idx = 1
-        for fullpath in results:
-            if bHasFilters:
-                if not query.matchFolderAndExtensionFilter(fullpath):
-                    continue
-            try:
-                # Use query.matches() to support comment filtering
-                fileContent = freadall(fullpath)
-                for _ in query.matches(fileContent, fullpath):
-                    finalResults.append(fullpath)
-                    break
-            except:
-                pass
-
-            if cancelEvent and cancelEvent.is_set():
-                return []
-            
-            if reportProgress:
-                progress = (int((idx*100)/lenResults))
-                idx += 1
-                if lastProgress != progress:
-                    lastProgress = progress
-                    reportProgress(progress)
-
+        if query.folderFilter or query.extensionFilter:
+            results = [fullpath for fullpath in results if query.matchFolderAndExtensionFilter(fullpath)]
+            lenResults = len(results)
+        if verificationProcesses():
+            action.addData("Verified by %u processes", verificationProcesses())
+        elif verificationThreads() > 1:
+            action.addData("Verified by %u threads", verificationThreads())
+        if isGuarded(query):
+            action.addData("Verified by guarded processes")
+        if skippedFiles is None:
+            skippedFiles = {}
+        finalResults = verifyFiles(query, results, cancelEvent, reportProgress, lenResults, reportMatches, pager, encodingHints, skippedFiles)
+        if skippedFiles:
+            action.addData("Skipped %u files which exceeded the time budget", len(skippedFiles))
+            for fullpath in sorted(skippedFiles)[:maxReportedSkippedFiles]:
+                action.addData("%s (%s)", fullpath, skippedFiles[fullpath])
+        if finalResults is None:
+            return []
         return finalResults
 
     # Receives a list of lists of Keywords and returns as two lists.
@@ -215,31 +417,51 @@ class FullTextIndex (IndexDatabase):
 
     # Receives a list of keywords which might contain wildcards. For every passed keyword a list of Keyword objects
     # is returned. If a keyword is not found an empty list is returned.
-    def __getKeywords(self, q: sqlite3.Cursor, keywordList: Iterable[str], reportAction: Optional[ReportAction]=None) -> KeywordList:
-        # Check if database has been modified and invalidate cache if needed
-        checkAndInvalidateKeywordsCache(self.strDbLocation)
+    def __getKeywords(self, q: sqlite3.Cursor, keywordList: Iterable[str], reportAction: Optional[ReportAction]=None,
+                      generation: Optional[IndexGeneration]=None) -> KeywordList:
+        dictionary: Optional[KeywordDictionary] = None
+        dictionaryChecked = False
 
-        keys = []
+        keys: KeywordList = []
         for originalKw in keywordList:
             keywordMatches: Optional[List[Keyword]] = None
 
             # Check cache first
-            cachedResult = getCachedKeywords(self.strDbLocation, originalKw)
-            if cachedResult is not None:
-                keywordMatches = cachedResult
+            if generation is not None:
+                keywordMatches = getCachedKeywords(self.strDbLocation, generation, originalKw)
 
             if keywordMatches is None:
                 # Not in cache - query database
                 kw = originalKw
-                query = "SELECT id,keyword FROM keywords WHERE"
-                if kw.find("*") != -1:
-                    query += " keyword LIKE ? ESCAPE '!'"
-                    kw = kw.replace("_", "!_")
-                    kw = kw.replace("*", "%")
+                isSubToken = kw.startswith("^")
+                if isSubToken:
+                    kw = kw[1:]
+                    if not self.hasSubTokens():
+                        # Every keyword which contains the part is a candidate, the verification checks the boundaries of the part
+                        kw = "*" + kw + "*"
+                        isSubToken = False
+                hasWildcard = kw.find("*") != -1
+                if hasWildcard and not dictionaryChecked:
+                    dictionaryChecked = True
+                    dictionary = openKeywordDictionary(self.strDbLocation, generation)
+                if isSubToken:
+                    # The keyword which is the part itself and the identifiers linked to the part
+                    q.execute("SELECT id,keyword FROM keywords WHERE keyword=? UNION "
+                              "SELECT id,keyword FROM keywords WHERE id IN (SELECT kwID FROM subTokens WHERE subToken=?)", (kw, kw))
+                    result = q.fetchall()
+                elif hasWildcard and dictionary:
+                    # Wildcards can't use the keyword index of the database, the dictionary resolves them much faster
+                    result = dictionary.lookup(kw)
                 else:
-                    query += " keyword=?"
-                q.execute(query, (kw, ))
-                result = q.fetchall()
+                    query = "SELECT id,keyword FROM keywords WHERE"
+                    if hasWildcard:
+                        query += " keyword LIKE ? ESCAPE '!'"
+                        kw = kw.replace("_", "!_")
+                        kw = kw.replace("*", "%")
+                    else:
+                        query += " keyword=?"
+                    q.execute(query, (kw, ))
+                    result = q.fetchall()
                 if not result:
                     if reportAction:
                         reportAction.addData("String '%s' was not found", originalKw)
@@ -247,9 +469,10 @@ class FullTextIndex (IndexDatabase):
                 keywordMatches = [Keyword(r[0], r[1]) for r in result]
 
                 # Add to cache
-                setCachedKeywords(self.strDbLocation, originalKw, keywordMatches)
+                if generation is not None:
+                    setCachedKeywords(self.strDbLocation, generation, originalKw, keywordMatches)
 
             if reportAction:
                 reportAction.addData("String '%s' results in %u keyword matches", originalKw, len(keywordMatches))
-            keys.append(keywordMatches)
+            keys.append(KeywordMatches(originalKw, keywordMatches))
         return keys
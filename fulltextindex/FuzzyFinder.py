@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Finds files by an abbreviation of their name, e.g. 'fbctl' finds 'FooBarController.cpp'. The characters of the
+# pattern must appear in the name in the same order. Matches at the start of words and camel case humps and runs of
+# consecutive characters rank higher.
+#
+# The names are held in memory as one string. For every character there is a bit set of the names which contain it.
+# The bit sets of the characters of the pattern are intersected to find the candidates, only these are checked for
+# the order of the characters. The names are ordered by length, if there are too many candidates the shortest ones
+# are ranked.
+#
+# The names of indexed locations are read from the fileName table, the spelling of the names is taken from the
+# documents because the table stores them in lower case.
+
+import os
+import sqlite3
+import threading
+import unittest
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+from .IndexDatabase import IndexGeneration
+from .DirectSearch import Listing
+
+__all__ = ['FileNameIndex', 'FuzzyMatch', 'maxScoredCandidates', 'score', 'loadFileNameIndex', 'openFileNameIndex', 'isFileNameIndexLoaded',
+           'prefetchFileNameIndex', 'findFilesFuzzy', 'listingFileNameIndex']
+
+# (name, ID) of a found name
+FuzzyMatch = Tuple[str, int]
+
+# Number of candidates which are ranked, the others are dropped
+maxScoredCandidates = 2000
+
+# Characters outside of ASCII share a few bit sets, there may be thousands of them
+_sharedBitSets = 61
+
+_binaryDigits = bytes.maketrans(b"\x00\x01", b"01")
+
+def _bitSetKey(c: str) -> str:
+    return c if c.isascii() else chr(0x100 + ord(c) % _sharedBitSets)
+
+def _isWordStart(name: str, pos: int) -> bool:
+    if pos == 0:
+        return True
+    prev, cur = name[pos-1], name[pos]
+    if not prev.isalnum():
+        return True
+    if cur.isupper() and not prev.isupper():
+        return True
+    return cur.isdigit() != prev.isdigit()
+
+def _matchPositions(name: str, lower: str, pattern: str, preferWordStarts: bool) -> Optional[List[int]]:
+    """Returns the positions of the pattern characters in the name. Without 'preferWordStarts' each character
+       is matched as early as possible. Otherwise a character continues a run of matched characters or is matched
+       at the next word start if there is one."""
+    positions: List[int] = []
+    pos = 0
+    for c in pattern:
+        found = lower.find(c, pos)
+        if found == -1:
+            return None
+        if preferWordStarts and not (positions and found == pos):
+            wordStart = found
+            while wordStart != -1 and not _isWordStart(name, wordStart):
+                wordStart = lower.find(c, wordStart + 1)
+            if wordStart != -1:
+                found = wordStart
+        positions.append(found)
+        pos = found + 1
+    return positions
+
+def _rank(name: str, positions: List[int]) -> int:
+    score = 0
+    for i, pos in enumerate(positions):
+        if _isWordStart(name, pos):
+            score += 8
+        if i and pos == positions[i-1] + 1:
+            score += 4
+    if positions[0] == 0:
+        score += 6
+    # Characters skipped between the first and the last match
+    score -= positions[-1] - positions[0] + 1 - len(positions)
+    return score - len(name) // 4
+
+def score(name: str, pattern: str) -> Optional[int]:
+    """Returns the rank of the name for the lower case pattern or None if the name doesn't match."""
+    lower = name.lower()
+    best = None
+    for preferWordStarts in (True, False):
+        positions = _matchPositions(name, lower, pattern, preferWordStarts)
+        if positions is None:
+            return None
+        rank = _rank(name, positions)
+        if best is None or rank > best:
+            best = rank
+    return best
+
+def _setBits(bits: int, limit: int) -> List[int]:
+    """Returns the positions of the lowest 'limit' bits which are set."""
+    digits = bin(bits)[:1:-1] # least significant bit first
+    positions: List[int] = []
+    pos = digits.find("1")
+    while pos != -1 and len(positions) < limit:
+        positions.append(pos)
+        pos = digits.find("1", pos + 1)
+    return positions
+
+class FileNameIndex:
+    """Holds the names of the files with an ID each, e.g. the ID of the name in the fileName table."""
+    def __init__(self, entries: Iterable[FuzzyMatch]) -> None:
+        # Shorter names first, they are ranked if there are too many candidates
+        ordered = sorted(entries, key=lambda entry: (len(entry[0]), entry[0].lower()))
+        if any("\n" in name for name, _ in ordered):
+            raise RuntimeError("File names containing line breaks can't be stored in a file name index")
+        self.__blob = "\n".join(name for name, _ in ordered)
+        self.__offsets = array("I", [0])
+        for name, _ in ordered:
+            self.__offsets.append(self.__offsets[-1] + len(name) + 1)
+        self.__ids = array("q", (nameID for _, nameID in ordered))
+        self.__bits: Dict[str, int] = {}
+        self.__all = (1 << len(ordered)) - 1
+        lowerNames = [name.lower() for name, _ in ordered]
+        del ordered
+        # The bit set of an ASCII character is built from a string of '0' and '1', one digit per name
+        for c in set(self.__blob.lower()):
+            if c.isascii() and c != "\n":
+                digits = bytes([c in name for name in lowerNames]).translate(_binaryDigits)
+                self.__bits[c] = int(digits[::-1], 2)
+        nbytes = (len(lowerNames) + 7) // 8
+        masks: Dict[str, bytearray] = {}
+        for i, name in enumerate(lowerNames):
+            if name.isascii():
+                continue
+            byte, bit = i >> 3, 1 << (i & 7)
+            for c in set(name):
+                if not c.isascii():
+                    key = _bitSetKey(c)
+                    mask = masks.get(key)
+                    if mask is None:
+                        mask = masks[key] = bytearray(nbytes)
+                    mask[byte] |= bit
+        self.__bits.update((key, int.from_bytes(mask, "little")) for key, mask in masks.items())
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def name(self, i: int) -> str:
+        return self.__blob[self.__offsets[i]:self.__offsets[i+1]-1]
+
+    def find(self, pattern: str, limit: int) -> List[FuzzyMatch]:
+        """Returns the best matching names for the pattern, the best first. Spaces in the pattern are ignored."""
+        pattern = "".join(pattern.lower().split())
+        if not pattern:
+            return []
+        bits = self.__all
+        for c in set(pattern):
+            bits &= self.__bits.get(_bitSetKey(c), 0)
+            if not bits:
+                return []
+        ranked: List[Tuple[int, int]] = []
+        for i in _setBits(bits, maxScoredCandidates):
+            rank = score(self.name(i), pattern)
+            if rank is not None:
+                ranked.append((-rank, i))
+        ranked.sort()
+        return [(self.name(i), self.__ids[i]) for _, i in ranked[:limit]]
+
+def loadFileNameIndex(conn: sqlite3.Connection) -> FileNameIndex:
+    """Reads the names of the fileName table. Each name is spelled like one of its documents."""
+    q = conn.cursor()
+    q.execute("SELECT fn2d.fileNameID,d.fullpath FROM fileName2doc fn2d,documents d WHERE d.id=fn2d.docID")
+    names: Dict[int, str] = {}
+    for fileNameID, fullpath in q:
+        if fileNameID not in names:
+            names[fileNameID] = os.path.basename(fullpath)
+    return FileNameIndex((name, fileNameID) for fileNameID, name in names.items())
+
+_indexes: Dict[str, Tuple[IndexGeneration, FileNameIndex]] = {}
+_indexesLock = threading.Lock()
+# Only one thread builds an index at a time, the others wait for it
+_buildLock = threading.Lock()
+
+def _generation(conn: sqlite3.Connection) -> Optional[IndexGeneration]:
+    q = conn.cursor()
+    q.execute("SELECT id,timestamp FROM indexInfo ORDER BY id DESC LIMIT 1")
+    row = q.fetchone()
+    return (int(row[0]), float(row[1])) if row else None
+
+def openFileNameIndex(conn: sqlite3.Connection, dbLocation: str) -> Optional[FileNameIndex]:
+    """Returns the name index of the database, it is built once per index generation. Returns None if the database was never updated."""
+    generation = _generation(conn)
+    if generation is None:
+        return None
+    with _buildLock:
+        with _indexesLock:
+            cached = _indexes.get(dbLocation)
+        if cached and cached[0] == generation:
+            return cached[1]
+        index = loadFileNameIndex(conn)
+        with _indexesLock:
+            _indexes[dbLocation] = (generation, index)
+        return index
+
+def isFileNameIndexLoaded(conn: sqlite3.Connection, dbLocation: str) -> bool:
+    with _indexesLock:
+        cached = _indexes.get(dbLocation)
+    return cached is not None and cached[0] == _generation(conn)
+
+def prefetchFileNameIndex(dbLocation: str) -> None:
+    """Builds the name index of the database in a background thread."""
+    def build() -> None:
+        conn = sqlite3.connect(dbLocation)
+        try:
+            openFileNameIndex(conn, dbLocation)
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    threading.Thread(target=build, name="FileNameIndex", daemon=True).start()
+
+def findFilesFuzzy(conn: sqlite3.Connection, dbLocation: str, pattern: str, limit: int) -> List[str]:
+    """Returns the files whose names match the pattern best. The files with the best matching name come first."""
+    index = openFileNameIndex(conn, dbLocation)
+    if index is None:
+        return []
+    q = conn.cursor()
+    result: List[str] = []
+    for _, fileNameID in index.find(pattern, limit):
+        q.execute("SELECT d.fullpath FROM fileName2doc fn2d,documents d WHERE fn2d.fileNameID=? AND d.id=fn2d.docID ORDER BY d.fullpath",
+                  (fileNameID,))
+        result.extend(r[0] for r in q.fetchall())
+        if len(result) >= limit:
+            break
+    return result[:limit]
+
+# The name index of the last file listing of a location without index and the paths of its files
+_listingIndex: Optional[Tuple[Listing, FileNameIndex, List[str]]] = None
+
+def listingFileNameIndex(listing: Listing) -> Tuple[FileNameIndex, List[str]]:
+    """Returns the name index of the files of a listing of DirectSearch. The ID of a name is the index of its path.
+       The index is kept until another listing is passed."""
+    global _listingIndex
+    with _buildLock:
+        cached = _listingIndex
+        if cached and cached[0] is listing:
+            return cached[1], cached[2]
+        # Sorted paths give files with the same name in the order of their paths
+        paths = sorted(os.path.join(dirName, fileName) for dirName, dirListing in listing.items() for fileName in dirListing.files)
+        index = FileNameIndex((os.path.basename(path), i) for i, path in enumerate(paths))
+        _listingIndex = (listing, index, paths)
+        return index, paths
+
+class TestFuzzyFinder(unittest.TestCase):
+    def test_score(self) -> None:
+        self.assertIsNotNone(score("FooBarController.cpp", "fbctl"))
+        self.assertIsNone(score("FooBarController.cpp", "fbx"))
+        self.assertIsNone(score("FooBarController.cpp", "lf"))
+        # Word starts rank higher than characters inside of words
+        self.assertGreater(score("FooBarController.cpp", "fbc") or 0, score("fabric.cpp", "fbc") or 0)
+        self.assertGreater(score("my_file_list.py", "mfl") or 0, score("mufflers.py", "mfl") or 0)
+
+    def test_find(self) -> None:
+        names = ["FooBarController.cpp", "FooBarController.h", "fabric.cpp", "BarFoo.cpp", "Controller.cpp", "Grüße.txt"]
+        index = FileNameIndex((name, i) for i, name in enumerate(names))
+        self.assertEqual(len(index), len(names))
+        found = index.find("fbctl", 10)
+        self.assertEqual([name for name, _ in found], ["FooBarController.h", "FooBarController.cpp"])
+        self.assertEqual(found[0][1], 1)
+        self.assertEqual(index.find("ctl", 1), [("Controller.cpp", 4)])
+        self.assertEqual(index.find("B F", 10), [("BarFoo.cpp", 3)])
+        self.assertEqual(index.find("grü", 10), [("Grüße.txt", 5)])
+        self.assertEqual(index.find("xyz", 10), [])
+        self.assertEqual(index.find("", 10), [])
+
+    def test_database(self) -> None:
+        conn = sqlite3.connect(":memory:")
+        conn.executescript("""
+            CREATE TABLE documents (id INTEGER PRIMARY KEY, fullpath TEXT);
+            CREATE TABLE fileName (id INTEGER PRIMARY KEY, name TEXT, ext TEXT);
+            CREATE TABLE fileName2doc (fileNameID INTEGER, docID INTEGER);
+            CREATE TABLE indexInfo (id INTEGER PRIMARY KEY, timestamp INTEGER);
+            INSERT INTO indexInfo VALUES (1, 10);
+            INSERT INTO documents VALUES (1, '/b/FooBarController.cpp'), (2, '/a/FooBarController.cpp'), (3, '/a/Other.cpp');
+            INSERT INTO fileName VALUES (1, 'foobarcontroller', '.cpp'), (2, 'other', '.cpp');
+            INSERT INTO fileName2doc VALUES (1, 1), (1, 2), (2, 3);
+        """)
+        self.assertEqual(findFilesFuzzy(conn, "test.db", "fbc", 10), ["/a/FooBarController.cpp", "/b/FooBarController.cpp"])
+        self.assertTrue(isFileNameIndexLoaded(conn, "test.db"))
+        conn.execute("INSERT INTO indexInfo VALUES (2, 20)")
+        self.assertFalse(isFileNameIndexLoaded(conn, "test.db"))
+        self.assertEqual(findFilesFuzzy(conn, "test.db", "oth", 10), ["/a/Other.cpp"])
+        conn.close()
+        with _indexesLock:
+            del _indexes["test.db"]
+
+if __name__ == "__main__":
+    unittest.main()
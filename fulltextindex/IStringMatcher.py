@@ -18,9 +18,13 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from abc import ABC,abstractmethod
 from typing import Iterable, List, Iterator
+from array import array
 import bisect
+import unittest
 
 class MatchPosition:
+    __slots__ = ("index", "length")
+
     def __init__(self, index: int, length: int=0) -> None:
         self.index = index
         self.length = length
@@ -33,8 +37,52 @@ class MatchPosition:
         yield self.index
         yield self.length
 
+class MatchList:
+    """Matches sorted by position and stored as two arrays of positions and lengths. Indexing returns MatchPosition objects.
+       Documents with many matches are kept without an object per match."""
+    def __init__(self, matches: Iterable[MatchPosition] = ()) -> None:
+        self.indexes = array("q")
+        self.lengths = array("q")
+        for index, length in matches:
+            self.append(index, length)
+
+    def append(self, index: int, length: int) -> None:
+        self.indexes.append(index)
+        self.lengths.append(length)
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def __getitem__(self, i: int) -> MatchPosition:
+        return MatchPosition(self.indexes[i], self.lengths[i])
+
+    def __iter__(self) -> Iterator[MatchPosition]:
+        for index, length in zip(self.indexes, self.lengths):
+            yield MatchPosition(index, length)
+
+    def indexAt(self, position: int) -> int:
+        """Returns the index of the first match which starts at or behind the position."""
+        return bisect.bisect_left(self.indexes, position)
+
 class IStringMatcher(ABC):
     # Yields all matches in data. Each match is returned as the touple (position,length)
     @abstractmethod
     def matches(self, data: str, filename: str = "") -> Iterable[MatchPosition]:
         pass
+
+    def matchList(self, data: str, filename: str = "") -> MatchList:
+        """Returns all matches in data as a MatchList."""
+        return MatchList(self.matches(data, filename))
+
+class TestMatchList(unittest.TestCase):
+    def test(self) -> None:
+        matches = MatchList([MatchPosition(3, 2), MatchPosition(10, 4)])
+        matches.append(20, 1)
+        self.assertEqual(len(matches), 3)
+        self.assertEqual(tuple(matches[1]), (10, 4))
+        self.assertEqual([tuple(m) for m in matches], [(3, 2), (10, 4), (20, 1)])
+        self.assertEqual(matches.indexAt(0), 0)
+        self.assertEqual(matches.indexAt(10), 1)
+        self.assertEqual(matches.indexAt(11), 2)
+        self.assertEqual(matches.indexAt(21), 3)
+        self.assertFalse(MatchList())
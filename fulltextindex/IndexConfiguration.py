@@ -18,9 +18,11 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
 from enum import IntEnum
-from typing import Set,List,cast
+from typing import Set,List,Optional,cast
 from tools import Config
 from tools.FileTools import correctPath
+from .TokenFilter import TokenFilter
+from .ContentSniffer import ContentSniffer
 
 class IndexMode(IntEnum):
     # No index wanted
@@ -49,16 +51,33 @@ def indexTypeToString(indexType: IndexType) -> str:
         return "file name"
     return "Unknown"
 
+# Returns the extension in lower case with a leading dot, e.g. '*.CPP' becomes '.cpp'
+def makeExtension(ext:str) -> str:
+    ext = ext.strip()
+    if ext:
+        if ext.startswith("*."):
+            ext = ext[2:]
+        elif not ext.startswith("."):
+            ext = "." + ext
+    return ext.lower()
+
 class IndexConfiguration:
     def __init__(self, indexName:str="", extensions:str="", directories:str="", dirExcludes:str="", indexdb:str="", 
-                 indexUpdateMode:IndexMode=IndexMode.ManualIndexUpdate, indexType:IndexType=IndexType.FileContentAndName) -> None:
+                 indexUpdateMode:IndexMode=IndexMode.ManualIndexUpdate, indexType:IndexType=IndexType.FileContentAndName, indexSubTokens:bool=False,
+                 tokenFilter:Optional[TokenFilter]=None, contentSniffer:Optional[ContentSniffer]=None) -> None:
         self.indexName = indexName
         self.indexUpdateMode = IndexMode(indexUpdateMode)
         self.indexType = IndexType(indexType)
+        # Also index the camel case and snake case parts of identifiers
+        self.indexSubTokens = indexSubTokens
+        # Keeps numbers, hex blobs and tokens of unusual length out of the index
+        self.tokenFilter = tokenFilter or TokenFilter()
+        # Skips binary, generated and large files
+        self.contentSniffer = contentSniffer or ContentSniffer()
         self.indexdb = correctPath(indexdb)
         # Add the extensions into a set. This makes the lookup if an extension matches faster.
         self.extensions: Set[str] = set()
-        for ext in (self.__makeExt(e) for e in extensions.split(",") if len(e) > 0):
+        for ext in (makeExtension(e) for e in extensions.split(",") if len(e) > 0):
             self.extensions.add(ext)
         # These list comprehensions split a string into a list making sure that an empty string returns an empty list
         self.directories = [correctPath(d) for d in (d.strip() for d in directories.split(",")) if len(d) > 0]
@@ -91,19 +110,13 @@ class IndexConfiguration:
         filename = os.path.split(self.indexdb)[1]
         return os.path.splitext(filename)[0]
 
-    def __makeExt(self, ext:str) -> str:
-        ext = ext.strip()
-        if ext:
-            if ext.startswith("*."):
-                ext = ext[2:]
-            elif not ext.startswith("."):
-                ext = "." + ext
-        return ext.lower()
-
     def __str__(self) -> str:
         result = "Name       : " + self.indexName + "\n"
         result += "Index mode : " + self.indexUpdateMode.name + "\n"
         result += "Index type: " + self.indexType.name + "\n"
+        result += "Sub tokens : " + str(self.indexSubTokens) + "\n"
+        result += "Tokens     : " + self.tokenFilter.toJson() + "\n"
+        result += "Sniffing   : " + self.contentSniffer.toJson() + "\n"
         result += "IndexDB    : " + self.indexdb + "\n"
         result += "Directories: " + str(self.directories) + "\n"
         result += "Excludes   : " + str(self.dirExcludes) + "\n"
@@ -117,6 +130,9 @@ class IndexConfiguration:
         return self.indexName == other.indexName and \
                self.indexUpdateMode == other.indexUpdateMode and \
                self.indexType == other.indexType and \
+               self.indexSubTokens == other.indexSubTokens and \
+               self.tokenFilter.toJson() == other.tokenFilter.toJson() and \
+               self.contentSniffer.toJson() == other.contentSniffer.toJson() and \
                self.indexdb == other.indexdb and \
                self.directories == other.directories and \
                self.dirExcludes == other.dirExcludes and \
@@ -129,6 +145,16 @@ def indexTypeInfo(config: Config.Config) -> None:
     config.setType("indexUpdateMode", Config.typeDefaultInt(IndexMode.TriggeredIndexUpdate))
     config.setType("indexType", Config.typeDefaultInt(IndexType.FileContent))
     config.setType("dirExcludes", Config.typeDefaultString(""))
+    config.setType("indexSubTokens", Config.typeDefaultBool(False))
+    config.setType("minTokenLength", Config.typeDefaultInt(0))
+    config.setType("maxTokenLength", Config.typeDefaultInt(0))
+    config.setType("skipNumbers", Config.typeDefaultBool(False))
+    config.setType("skipHexBlobs", Config.typeDefaultBool(False))
+    config.setType("unfilteredExtensions", Config.typeDefaultString(""))
+    config.setType("maxFileSize", Config.typeDefaultInt(0))
+    config.setType("indexLargeFilesPartially", Config.typeDefaultBool(False))
+    config.setType("skipBinaryFiles", Config.typeDefaultBool(False))
+    config.setType("maxLineLength", Config.typeDefaultInt(0))
 
 # Returns a list of Index objects from the config
 def readConfig(conf: Config.Config) -> List[IndexConfiguration]:
@@ -157,5 +183,10 @@ def readConfig(conf: Config.Config) -> List[IndexConfiguration]:
         except AttributeError:
             directories = indexConf.directory
         dirExceptions = indexConf.dirExcludes
-        result.append(IndexConfiguration(indexName, extensions, directories, dirExceptions, indexdb, indexUpdateMode, indexType))
+        tokenFilter = TokenFilter(indexConf.minTokenLength, indexConf.maxTokenLength, indexConf.skipNumbers, indexConf.skipHexBlobs,
+                                  (makeExtension(e) for e in indexConf.unfilteredExtensions.split(",") if e.strip()))
+        contentSniffer = ContentSniffer(indexConf.maxFileSize, indexConf.indexLargeFilesPartially, indexConf.skipBinaryFiles,
+                                        indexConf.maxLineLength)
+        result.append(IndexConfiguration(indexName, extensions, directories, dirExceptions, indexdb, indexUpdateMode, indexType,
+                                         indexConf.indexSubTokens, tokenFilter, contentSniffer))
     return result
\ No newline at end of file
@@ -17,7 +17,9 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import sqlite3
-from typing import Tuple
+from typing import Tuple, Optional
+from .TokenFilter import TokenFilter
+from .ContentSniffer import ContentSniffer
 
 strSetup = """
 CREATE TABLE IF NOT EXISTS keywords(
@@ -29,7 +31,9 @@ CREATE INDEX IF NOT EXISTS i_keywords_keyword ON keywords (keyword);
 CREATE TABLE IF NOT EXISTS documents(
     id INTEGER PRIMARY KEY,
     timestamp INTEGER,
-    fullpath TEXT UNIQUE
+    fullpath TEXT UNIQUE,
+    encoding INTEGER,
+    skipReason INTEGER
 );
 
 CREATE TABLE IF NOT EXISTS documentInIndex(
@@ -81,6 +85,23 @@ CREATE INDEX IF NOT EXISTS i_excludedExtensions_indexID ON excludedExtensions (i
 CREATE INDEX IF NOT EXISTS i_excludedExtensions_extension ON excludedExtensions (extension);
 """
 
+# Links the camel case and snake case parts of identifiers to the keywords of the identifiers. The table only exists
+# if the location is configured with 'indexSubTokens'.
+strSubTokensTable = [
+    "CREATE TABLE IF NOT EXISTS subTokens(subToken TEXT, kwID INTEGER, UNIQUE(subToken, kwID))",
+    "CREATE INDEX IF NOT EXISTS i_subTokens_kwID ON subTokens (kwID)"
+]
+
+# Finds the documents modified in a time range. Created by the index update, opening the database for a search
+# must not write to it.
+strDocumentsTimestampIndex = "CREATE INDEX IF NOT EXISTS i_documents_timestamp ON documents (timestamp)"
+
+# The settings the index was built with, e.g. the token filter. Created by the index update.
+strIndexSettingsTable = "CREATE TABLE IF NOT EXISTS indexSettings(name TEXT PRIMARY KEY, value TEXT)"
+
+# Identifies the state of an index: the ID of the latest index run and its timestamp. The timestamp tells apart
+# databases which were recreated and therefore start with the same ID again.
+IndexGeneration = Tuple[int, float]
 
 class IndexDatabase:
     def __init__(self, strDbLocation: str) -> None:
@@ -117,6 +138,63 @@ class IndexDatabase:
         print("Associations: " + str(associations))
         return (documents, documentsInIndex, keywords, associations)
 
+    def indexGeneration(self) -> Optional[IndexGeneration]:
+        """Returns ID and timestamp of the latest index run. Both change with every update of the index."""
+        q = self.conn.cursor()
+        q.execute("SELECT id,timestamp FROM indexInfo ORDER BY id DESC LIMIT 1")
+        row = q.fetchone()
+        if not row:
+            return None
+        return (int(row[0]), float(row[1]))
+
+    def hasDocumentEncoding(self) -> bool:
+        """Databases created by older versions have no encoding column in the documents table. The index update adds it."""
+        q = self.conn.cursor()
+        q.execute("PRAGMA table_info(documents)")
+        return any(row[1] == "encoding" for row in q.fetchall())
+
+    def hasSkipReason(self) -> bool:
+        """Databases created by older versions don't record why a document was skipped. The index update adds the column."""
+        q = self.conn.cursor()
+        q.execute("PRAGMA table_info(documents)")
+        return any(row[1] == "skipReason" for row in q.fetchall())
+
+    def hasSubTokens(self) -> bool:
+        """True if the parts of identifiers are indexed."""
+        q = self.conn.cursor()
+        q.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='subTokens'")
+        return q.fetchone() is not None
+
+    def __indexSetting(self, name: str) -> Optional[str]:
+        """Returns the stored setting or None if it is not stored. Indexes written by older versions have no settings."""
+        q = self.conn.cursor()
+        q.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='indexSettings'")
+        if q.fetchone() is None:
+            return None
+        q.execute("SELECT value FROM indexSettings WHERE name=?", (name,))
+        row = q.fetchone()
+        return row[0] if row else None
+
+    def tokenFilter(self) -> Optional[TokenFilter]:
+        """Returns the token filter the index was built with or None if all tokens are indexed."""
+        value = self.__indexSetting("tokenFilter")
+        if value is None:
+            return None
+        tokenFilter = TokenFilter.fromJson(value)
+        if not tokenFilter or not tokenFilter.isActive():
+            return None
+        return tokenFilter
+
+    def contentSniffer(self) -> Optional[ContentSniffer]:
+        """Returns the content sniffer the index was built with or None if all files are indexed completely."""
+        value = self.__indexSetting("contentSniffer")
+        if value is None:
+            return None
+        sniffer = ContentSniffer.fromJson(value)
+        if not sniffer or not sniffer.isActive():
+            return None
+        return sniffer
+
     def interrupt(self) -> None:
         self.conn.interrupt()
 
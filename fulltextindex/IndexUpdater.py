@@ -23,12 +23,20 @@ import time
 import logging
 import sqlite3
 from fnmatch import fnmatch
-from typing import List, Iterator, Set, cast, Tuple, Optional, Dict
-from tools.FileTools import freadall
-from .IndexDatabase import IndexDatabase
+from typing import List, Iterator, Iterable, Set, cast, Tuple, Optional, Dict
+from tools.FileTools import freadallEx, decodeChunks
+from .IndexDatabase import IndexDatabase, strSubTokensTable, strDocumentsTimestampIndex, strIndexSettingsTable
+from .Query import splitSubTokens
+from .TokenFilter import TokenFilter
+from .ContentSniffer import ContentSniffer, SkipReason, sampleSize
 from .IndexConfiguration import IndexConfiguration, IndexType, indexTypeToString
+from .KeywordDictionary import writeKeywordDictionary, writeFileNameDictionary, removeOutdatedDictionaries
 
 reTokenize = re.compile(r"[\w#]+")
+reTokenChar = re.compile(r"[\w#]")
+
+# Files are decoded and tokenized in chunks of this many bytes. This bounds the memory needed for large files.
+tokenizeChunkSize = 1024 * 1024
 
 def __fixExtension(ext: str) -> str:
     if ext != ".":
@@ -60,9 +68,23 @@ def genFind(filepat: Set[str], strRootDir: str, dirExcludes: Optional[List[str]]
             elif ignoredExts is not None:
                 ignoredExts[ext] = ignoredExts.get(ext, 0) + 1
 
-def genTokens(text: str) -> Iterator[str]:
-    for token in reTokenize.findall(text):
-        yield token
+def genTokens(chunks: Iterable[str], maxTokenLength: int = tokenizeChunkSize) -> Iterator[str]:
+    """Yields the tokens of a text which is passed in chunks. A token at the end of a chunk may continue in the next chunk.
+       Tokens longer than 'maxTokenLength' are split to bound the memory for files without separators."""
+    rest = ""
+    for chunk in chunks:
+        text = rest + chunk if rest else chunk
+        tokens = reTokenize.findall(text)
+        rest = ""
+        if tokens and reTokenChar.match(text, len(text) - 1):
+            # The last token touches the end of the chunk
+            rest = tokens.pop()
+            if len(rest) >= maxTokenLength:
+                tokens.append(rest)
+                rest = ""
+        yield from tokens
+    if rest:
+        yield rest
 
 class UpdateStatistics:
     def __init__(self) -> None:
@@ -86,24 +108,43 @@ class UpdateStatistics:
 class IndexUpdater (IndexDatabase):
     def updateIndex(self, config: IndexConfiguration, statistics: Optional[UpdateStatistics]=None) -> None:
         kwCache: dict[str, int] = {}
+        # The tokens whose parts were linked to their keyword by this update
+        subTokenCache: Optional[Set[str]] = set() if config.indexSubTokens else None
         directories = config.directories
         extensions = config.extensions
         dirExcludes = config.dirExcludes or []
         indexType = config.indexType
+        tokenFilter = config.tokenFilter if indexType != IndexType.FileName else TokenFilter()
+        sniffer = config.contentSniffer if indexType != IndexType.FileName else ContentSniffer()
 
         c = self.conn.cursor()
         q = self.conn.cursor()
 
         with self.conn:
+            if not self.hasDocumentEncoding():
+                c.execute("ALTER TABLE documents ADD COLUMN encoding INTEGER")
+            if not self.hasSkipReason():
+                c.execute("ALTER TABLE documents ADD COLUMN skipReason INTEGER")
+            c.execute(strDocumentsTimestampIndex)
+            c.execute(strIndexSettingsTable)
+
             # Generate the next index ID, old documents still have a lower number
             nextIndexID = self.__getNextIndexRun(c)
 
+            # The parts of the identifiers in unchanged files are only known by reading them again
+            reindexAll = self.__setupSubTokens(c, config.indexSubTokens and indexType != IndexType.FileName)
+            if self.__setupTokenFilter(c, tokenFilter):
+                reindexAll = True
+            if self.__setupContentSniffer(c, sniffer):
+                reindexAll = True
+
             for strRootDir in directories:
                 logging.info("Updating index in %s. Indexing %s", strRootDir, indexTypeToString(indexType))
                 ignoredExtCount: Dict[str, int] = {}
                 for dirName, fileName in genFind(extensions, strRootDir, dirExcludes, ignoredExtCount):
                     strFullPath = os.path.join(dirName, fileName)
-                    mTime = os.stat(strFullPath).st_mtime
+                    stat = os.stat(strFullPath)
+                    mTime = stat.st_mtime
 
                     newFile = False
                     c.execute("INSERT OR IGNORE INTO documents (id,timestamp,fullpath) VALUES (NULL,?,?)", (mTime, strFullPath))
@@ -114,22 +155,33 @@ class IndexUpdater (IndexDatabase):
                         if docID is None:
                             raise RuntimeError("No document ID for new document returned")
                         timestamp = 0
+                        encoding = None
+                        skipReason = None
                         newFile = True
                     else:
-                        q.execute("SELECT id,timestamp FROM documents WHERE fullpath=:fp", {"fp":strFullPath})
-                        docID, timestamp = q.fetchone()
+                        q.execute("SELECT id,timestamp,encoding,skipReason FROM documents WHERE fullpath=:fp", {"fp":strFullPath})
+                        docID, timestamp, encoding, skipReason = q.fetchone()
 
                     if indexType != IndexType.FileContent:
                         self.__addFileName(c, q, docID, fileName)
 
                     try:
                         if indexType != IndexType.FileName:
-                            if timestamp != mTime:
-                                self.__updateFile(c, q, docID, strFullPath, kwCache)
-                                c.execute("UPDATE documents SET timestamp=:ts WHERE id=:id", {"ts":mTime, "id":docID})
+                            if timestamp != mTime or reindexAll:
+                                fileFilter = tokenFilter if tokenFilter.appliesTo(os.path.splitext(fileName)[1].lower()) else None
+                                encoding, skipReason = self.__updateFile(c, q, docID, strFullPath, kwCache, subTokenCache, fileFilter,
+                                                                         sniffer, stat.st_size)
+                                if skipReason is not None:
+                                    logging.info("File '%s' is not indexed completely: %s", strFullPath, skipReason.name)
+                                c.execute("UPDATE documents SET timestamp=:ts,encoding=:enc,skipReason=:reason WHERE id=:id",
+                                          {"ts":mTime, "enc":encoding, "reason":skipReason, "id":docID})
                                 if statistics and timestamp != 0:
                                     statistics.incUpdated()
                             else:
+                                if encoding is None and skipReason is None:
+                                    # Indexed by an older version which didn't record the encoding
+                                    encoding = freadallEx(strFullPath)[1]
+                                    c.execute("UPDATE documents SET encoding=:enc WHERE id=:id", {"enc":int(encoding), "id":docID})
                                 if statistics:
                                     statistics.incUnchanged()
                     except Exception as e:
@@ -147,8 +199,68 @@ class IndexUpdater (IndexDatabase):
                     self.__saveExcludedExtensions(c, nextIndexID, ignoredExtCount)
                     logging.info("Saved %d excluded extension types", len(ignoredExtCount))
             self.__cleanup(c, nextIndexID)
+        self.__writeDictionaries(indexType)
         logging.info("Done")
 
+    def __setupSubTokens(self, c: sqlite3.Cursor, indexSubTokens: bool) -> bool:
+        """Creates or drops the table of identifier parts. Returns True if the table was created and all files need to be indexed again."""
+        hasSubTokens = self.hasSubTokens()
+        if indexSubTokens and not hasSubTokens:
+            logging.info("Indexing identifier parts, all files are read again")
+            for stmt in strSubTokensTable:
+                c.execute(stmt)
+            return True
+        if not indexSubTokens and hasSubTokens:
+            c.execute("DROP TABLE subTokens")
+        return False
+
+    def __setupTokenFilter(self, c: sqlite3.Cursor, tokenFilter: TokenFilter) -> bool:
+        """Stores the token filter for the search. Returns True if it changed and all files need to be indexed again."""
+        stored = self.tokenFilter()
+        previous = stored.toJson() if stored else ""
+        current = tokenFilter.toJson() if tokenFilter.isActive() else ""
+        if previous == current:
+            return False
+        logging.info("The token filter changed, all files are read again")
+        if current:
+            c.execute("INSERT OR REPLACE INTO indexSettings (name,value) VALUES ('tokenFilter',?)", (current,))
+        else:
+            c.execute("DELETE FROM indexSettings WHERE name='tokenFilter'")
+        return True
+
+    def __setupContentSniffer(self, c: sqlite3.Cursor, sniffer: ContentSniffer) -> bool:
+        """Stores the settings of the content sniffer. Returns True if they changed and all files need to be checked again."""
+        stored = self.contentSniffer()
+        previous = stored.toJson() if stored else ""
+        current = sniffer.toJson() if sniffer.isActive() else ""
+        if previous == current:
+            return False
+        logging.info("The content sniffing changed, all files are read again")
+        if current:
+            c.execute("INSERT OR REPLACE INTO indexSettings (name,value) VALUES ('contentSniffer',?)", (current,))
+        else:
+            c.execute("DELETE FROM indexSettings WHERE name='contentSniffer'")
+        return True
+
+    def __writeDictionaries(self, indexType: IndexType) -> None:
+        # The dictionaries are optional, the search falls back to the database if they are missing or outdated
+        generation = self.indexGeneration()
+        written: List[str] = []
+        if generation:
+            if indexType != IndexType.FileName:
+                logging.info("Writing keyword dictionary")
+                try:
+                    written.append(writeKeywordDictionary(self.conn, self.strDbLocation, generation))
+                except Exception as e:
+                    logging.warning("Failed to write keyword dictionary: %s", str(e))
+            if indexType != IndexType.FileContent:
+                logging.info("Writing file name dictionary")
+                try:
+                    written.append(writeFileNameDictionary(self.conn, self.strDbLocation, generation))
+                except Exception as e:
+                    logging.warning("Failed to write file name dictionary: %s", str(e))
+        removeOutdatedDictionaries(self.strDbLocation, written)
+
     def __saveExcludedExtensions(self, c: sqlite3.Cursor, indexID: int, extCounts: Dict[str, int]) -> None:
         """Save excluded extension statistics to database."""
         for ext, count in extCounts.items():
@@ -164,6 +276,9 @@ class IndexUpdater (IndexDatabase):
         c.execute("DELETE FROM documentInIndex WHERE indexID < :index", {"index":nextIndexID})
         logging.info("Removing orphaned keywords")
         c.execute("DELETE FROM keywords WHERE id NOT IN (SELECT kwID FROM kw2doc)")
+        if self.hasSubTokens():
+            logging.info("Removing orphaned identifier parts")
+            c.execute("DELETE FROM subTokens WHERE kwID NOT IN (SELECT id FROM keywords)")
         logging.info("Cleaning file name associations")
         c.execute("DELETE FROM fileName2doc WHERE docID NOT IN (SELECT id FROM documents)")
         logging.info("Cleaning file names")
@@ -173,26 +288,67 @@ class IndexUpdater (IndexDatabase):
         logging.info("Cleaning excluded extensions")
         c.execute("DELETE FROM excludedExtensions WHERE indexID < :index", {"index":nextIndexID})
 
-    def __updateFile(self, c: sqlite3.Cursor, q: sqlite3.Cursor, docID: int, strFullPath: str, kwCache: dict[str, int]) -> None:
+    # Returns the encoding of the file and the reason why it was not indexed completely. If 'subTokenCache' is passed the parts
+    # of the identifiers are linked to their keyword. Tokens removed by 'tokenFilter' are not indexed. Files rejected by 'sniffer'
+    # have no keywords and no encoding.
+    def __updateFile(self, c: sqlite3.Cursor, q: sqlite3.Cursor, docID: int, strFullPath: str, kwCache: dict[str, int],
+                     subTokenCache: Optional[Set[str]]=None, tokenFilter: Optional[TokenFilter]=None,
+                     sniffer: Optional[ContentSniffer]=None, size: int=0) -> Tuple[Optional[int], Optional[SkipReason]]:
         # Delete old associations
         c.execute("DELETE FROM kw2doc WHERE docID=?", (docID,))
-        # Associate document with all tokens
+        sniffer = sniffer or ContentSniffer()
+        skipReason = sniffer.classifySize(size)
+        if skipReason == SkipReason.TooLarge:
+            return None, skipReason
+        with open(strFullPath, "rb") as file:
+            contentReason = sniffer.classifyContent(file.read(sampleSize))
+            if contentReason is not None:
+                return None, contentReason
+            attempts = 0
+            def addTokens(chunks: Iterator[str]) -> None:
+                nonlocal attempts
+                attempts += 1
+                if attempts > 1:
+                    # The file is decoded again with another encoding
+                    c.execute("DELETE FROM kw2doc WHERE docID=?", (docID,))
+                self.__addTokens(c, q, docID, genTokens(chunks), kwCache, subTokenCache, tokenFilter)
+            limit = sniffer.sizeLimit() if skipReason == SkipReason.Truncated else -1
+            encoding = decodeChunks(file, addTokens, tokenizeChunkSize, limit=limit)
+        return int(encoding), skipReason
+
+    # Associates the document with the tokens. Each keyword is looked up once per document.
+    def __addTokens(self, c: sqlite3.Cursor, q: sqlite3.Cursor, docID: int, tokens: Iterator[str], kwCache: dict[str, int],
+                    subTokenCache: Optional[Set[str]], tokenFilter: Optional[TokenFilter]) -> None:
         lower = str.lower
-        for token in genTokens(freadall(strFullPath)):
+        # The IDs of the keywords of the document, 0 for keywords removed by the filter
+        docKeywords: Dict[str, int] = {}
+        for token in tokens:
             keyword = lower(token)
-
-            if keyword in kwCache:
-                kwID = kwCache[keyword]
-            else:
-                c.execute("INSERT OR IGNORE INTO keywords (id,keyword) VALUES (NULL,?)", (keyword,))
-                if c.rowcount == 1 and c.lastrowid != 0 and c.lastrowid != None:
-                    kwID = c.lastrowid
+            kwID = docKeywords.get(keyword)
+            if kwID is None:
+                if tokenFilter and tokenFilter.isFiltered(keyword):
+                    kwID = 0
+                elif keyword in kwCache:
+                    kwID = kwCache[keyword]
                 else:
-                    q.execute("SELECT id FROM keywords WHERE keyword=:kw", {"kw":keyword})
-                    kwID = q.fetchone()[0]
-                kwCache[keyword] = kwID
+                    c.execute("INSERT OR IGNORE INTO keywords (id,keyword) VALUES (NULL,?)", (keyword,))
+                    if c.rowcount == 1 and c.lastrowid != 0 and c.lastrowid != None:
+                        kwID = c.lastrowid
+                    else:
+                        q.execute("SELECT id FROM keywords WHERE keyword=:kw", {"kw":keyword})
+                        kwID = q.fetchone()[0]
+                    kwCache[keyword] = kwID
+                docKeywords[keyword] = kwID
+                if kwID:
+                    c.execute("INSERT OR IGNORE INTO kw2doc (kwID,docID) values (?,?)", (kwID, docID))
+            if not kwID:
+                continue
 
-            c.execute("INSERT OR IGNORE INTO kw2doc (kwID,docID) values (?,?)", (kwID, docID))
+            # The parts are split from the token because the keyword lost the case of the camel case boundaries
+            if subTokenCache is not None and token not in subTokenCache:
+                subTokenCache.add(token)
+                for part in splitSubTokens(token):
+                    c.execute("INSERT OR IGNORE INTO subTokens (subToken,kwID) VALUES (?,?)", (lower(part), kwID))
 
     def __addFileName(self, c: sqlite3.Cursor, q: sqlite3.Cursor, docID: int, fileName: str) -> None:
         name,ext = os.path.splitext(fileName.lower())
@@ -207,7 +363,8 @@ class IndexUpdater (IndexDatabase):
         c.execute("INSERT OR IGNORE INTO fileName2doc (fileNameID, docID) VALUES (?,?)", (fileID, docID))
 
     def __getNextIndexRun(self, c: sqlite3.Cursor) -> int:
-        c.execute("INSERT INTO indexInfo (id,timestamp) VALUES (NULL,?)", (int(time.time()),))
+        # The fraction of a second is kept to distinguish generations of recreated databases
+        c.execute("INSERT INTO indexInfo (id,timestamp) VALUES (NULL,?)", (time.time(),))
         return cast(int,c.lastrowid)
 
     def getExcludedExtensions(self) -> List[Tuple[str, int]]:
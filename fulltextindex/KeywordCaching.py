@@ -16,9 +16,12 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import sys
 import threading
-import os
-from typing import Dict, Tuple, List, Optional, cast
+from array import array
+from collections import OrderedDict
+from typing import Tuple, List, Optional, Callable, Generic, TypeVar
+from .IndexDatabase import IndexGeneration
 
 class Keyword:
     def __init__(self, identifier: int, name: str) -> None:
@@ -34,35 +37,153 @@ class Keyword:
 
         return self.id == other.id and self.name == other.name
 
-# Module-level cache for keyword lookups, shared across all FullTextIndex instances
-# Cache key: (database_location, keyword) -> List[Keyword]
-_keywordCache: Dict[Tuple[str, str], List[Keyword]] = {}
-# Track database modification times for cache invalidation
-_dbModTimes: Dict[str, float] = {}
-_keywordCacheLock = threading.Lock()
-
-def checkAndInvalidateKeywordsCache(dbLocation: str) -> None:
-    """Check if database has been modified and invalidate cache if needed."""
-    try:
-        currentModTime = os.path.getmtime(dbLocation)
-        with _keywordCacheLock:
-            lastModTime = _dbModTimes.get(dbLocation)
-            if lastModTime is None or currentModTime > lastModTime:
-                # Database modified or first access - clear cache entries for this database
-                keysToRemove = [key for key in _keywordCache.keys() if key[0] == dbLocation]
-                for key in keysToRemove:
-                    del _keywordCache[key]
-                _dbModTimes[dbLocation] = currentModTime
-    except OSError:
-        # Database file doesn't exist or can't be accessed - ignore
-        pass
-
-def getCachedKeywords(dbLocation: str, keyword: str) -> Optional[List[Keyword]]:
+K = TypeVar("K")
+V = TypeVar("V")
+
+class CacheStatistics:
+    def __init__(self, hits: int, misses: int, entries: int, size: int, maxSize: int) -> None:
+        self.hits = hits
+        self.misses = misses
+        self.entries = entries
+        self.size = size
+        self.maxSize = maxSize
+
+    def __str__(self) -> str:
+        return "%u hits, %u misses, %u entries, %u of %u KB used" % (self.hits, self.misses, self.entries, self.size // 1024, self.maxSize // 1024)
+
+class LruCache(Generic[K, V]):
+    """A thread safe least recently used cache. The size of the entries is limited by a byte budget."""
+    def __init__(self, maxSize: int, sizeOf: Callable[[V], int]) -> None:
+        self.maxSize = maxSize
+        self.sizeOf = sizeOf
+        self.hits = 0
+        self.misses = 0
+        self.__size = 0
+        self.__entries: OrderedDict[K, Tuple[V, int]] = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: K) -> Optional[V]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        size = self.sizeOf(value)
+        with self.__lock:
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__size -= old[1]
+            if size > self.maxSize:
+                # Would evict everything else
+                return
+            self.__entries[key] = (value, size)
+            self.__size += size
+            self.__shrink(self.maxSize)
+
+    def removeIf(self, predicate: Callable[[K], bool]) -> None:
+        with self.__lock:
+            for key in [key for key in self.__entries if predicate(key)]:
+                self.__size -= self.__entries.pop(key)[1]
+
+    def resize(self, maxSize: int) -> None:
+        with self.__lock:
+            self.maxSize = maxSize
+            self.__shrink(maxSize)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+            self.__size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def statistics(self) -> CacheStatistics:
+        with self.__lock:
+            return CacheStatistics(self.hits, self.misses, len(self.__entries), self.__size, self.maxSize)
+
+    def __shrink(self, maxSize: int) -> None:
+        while self.__size > maxSize and self.__entries:
+            _, (_, size) = self.__entries.popitem(last=False)
+            self.__size -= size
+
+# The cache key is (database location, index generation, keyword). Every update of an index creates a new
+# generation, cached data of older generations is never used again.
+CacheKey = Tuple[str, IndexGeneration, str]
+
+def _keywordsSize(keywords: List[Keyword]) -> int:
+    # Rough size of the list and the Keyword objects including their dict and name
+    return 64 + sum(200 + len(keyword.name) for keyword in keywords)
+
+def _postingsSize(postings: "array[int]") -> int:
+    return sys.getsizeof(postings)
+
+defaultCacheSize = 64 * 1024 * 1024
+
+# Module-level caches shared across all FullTextIndex instances. The keyword cache maps a search keyword which
+# might contain wildcards to the matching keywords. The posting cache maps it to the sorted IDs of all documents
+# which contain one of these keywords.
+_keywordCache: LruCache[CacheKey, List[Keyword]] = LruCache(defaultCacheSize // 8, _keywordsSize)
+_postingCache: LruCache[CacheKey, "array[int]"] = LruCache(defaultCacheSize - defaultCacheSize // 8, _postingsSize)
+
+_generations: dict[str, IndexGeneration] = {}
+_generationsLock = threading.Lock()
+
+def setCacheSize(size: int) -> None:
+    """Sets the byte budget of the keyword and posting cache."""
+    _keywordCache.resize(size // 8)
+    _postingCache.resize(size - size // 8)
+
+def clearCaches() -> None:
+    _keywordCache.clear()
+    _postingCache.clear()
+
+def checkGeneration(dbLocation: str, generation: IndexGeneration) -> None:
+    """Drops all entries of older generations of the database once a new generation is seen."""
+    with _generationsLock:
+        last = _generations.get(dbLocation)
+        if last == generation:
+            return
+        _generations[dbLocation] = generation
+    if last is not None:
+        outdated: Callable[[CacheKey], bool] = lambda key: key[0] == dbLocation and key[1] != generation
+        _keywordCache.removeIf(outdated)
+        _postingCache.removeIf(outdated)
+
+def getCachedKeywords(dbLocation: str, generation: IndexGeneration, keyword: str) -> Optional[List[Keyword]]:
     """Get cached keywords for a given database and keyword string."""
-    with _keywordCacheLock:
-        return _keywordCache.get((dbLocation, keyword))
+    return _keywordCache.get((dbLocation, generation, keyword))
 
-def setCachedKeywords(dbLocation: str, keyword: str, keywords: List[Keyword]) -> None:
+def setCachedKeywords(dbLocation: str, generation: IndexGeneration, keyword: str, keywords: List[Keyword]) -> None:
     """Cache keywords for a given database and keyword string."""
-    with _keywordCacheLock:
-        _keywordCache[(dbLocation, keyword)] = keywords
+    _keywordCache.put((dbLocation, generation, keyword), keywords)
+
+def getCachedPostings(dbLocation: str, generation: IndexGeneration, keyword: str) -> Optional["array[int]"]:
+    """Get the cached document IDs for a given database and keyword string."""
+    return _postingCache.get((dbLocation, generation, keyword))
+
+def setCachedPostings(dbLocation: str, generation: IndexGeneration, keyword: str, postings: "array[int]") -> None:
+    """Cache the sorted document IDs for a given database and keyword string."""
+    _postingCache.put((dbLocation, generation, keyword), postings)
+
+def getCachedFilter(dbLocation: str, generation: IndexGeneration, filterCondition: str) -> Optional["array[int]"]:
+    """Get the cached IDs of the documents which pass a folder and extension filter."""
+    return _postingCache.get((dbLocation, generation, _filterKey(filterCondition)))
+
+def setCachedFilter(dbLocation: str, generation: IndexGeneration, filterCondition: str, docIDs: "array[int]") -> None:
+    """Cache the sorted IDs of the documents which pass a folder and extension filter."""
+    _postingCache.put((dbLocation, generation, _filterKey(filterCondition)), docIDs)
+
+def _filterKey(filterCondition: str) -> str:
+    # Filters share the posting cache, the prefix can't be part of a keyword
+    return "\0filter:" + filterCondition
+
+def keywordCacheStatistics() -> CacheStatistics:
+    return _keywordCache.statistics()
+
+def postingCacheStatistics() -> CacheStatistics:
+    return _postingCache.statistics()
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# The keyword dictionary is a sorted copy of the keywords table which is written by the index updater
+# next to the index database. It is memory mapped by the search and used to expand wildcard keywords
+# like 'foo*', '*foo' or '*foo*'. SQLite cannot use the keyword index for these patterns and ends up
+# scanning the whole table. The file name dictionary has the same layout and resolves wildcard file names
+# like '*controller*' which would otherwise scan the whole fileName table.
+#
+# File layout (all numbers in native byte order, every section starts 8 byte aligned):
+#   header           : magic, version, index generation, generation timestamp, keyword count, blob sizes
+#   forward offsets  : count+1 uint32, start of keyword i in the forward blob
+#   keyword IDs      : count int64, keyword ID of keyword i
+#   reverse offsets  : count+1 uint32, start of reversed keyword j in the reverse blob
+#   reverse to index : count uint32, maps reversed keyword j to keyword i
+#   frequencies      : count uint32, number of documents which contain keyword i
+#   forward blob     : utf-8 encoded keywords in byte order, each terminated by '\n'
+#   reverse blob     : utf-8 encoded reversed keywords in byte order, each terminated by '\n'
+
+import os
+import re
+import glob
+import heapq
+import mmap
+import struct
+import logging
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import List, Tuple, Optional, Dict, Iterable, Literal, Callable
+from .IndexDatabase import IndexGeneration
+
+__all__ = ['KeywordDictionary', 'dictionaryName', 'fileNameDictionaryName', 'writeKeywordDictionary', 'writeFileNameDictionary',
+           'removeOutdatedDictionaries', 'openKeywordDictionary', 'openFileNameDictionary']
+
+KeywordMatch = Tuple[int, str]
+
+_magic = b"CBKD"
+_version = 2
+_header = struct.Struct("=4sIqdQQQ")
+# A value larger than any byte of an utf-8 sequence. Appending it to a prefix gives the upper bound of all words with this prefix.
+_maxByte = b"\xff"
+# Matches one utf-8 encoded character
+_anyChar = rb"(?:[\x00-\x7f]|[\xc0-\xff][\x80-\xbf]*)"
+_suffixes = ("kwdict", "fndict")
+
+def dictionaryName(dbLocation: str, generation: IndexGeneration) -> str:
+    return "%s.%u.kwdict" % (dbLocation, generation[0])
+
+def fileNameDictionaryName(dbLocation: str, generation: IndexGeneration) -> str:
+    return "%s.%u.fndict" % (dbLocation, generation[0])
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+def _sortedBlob(words: List[bytes]) -> Tuple[bytes, "array[int]"]:
+    offsets = array("I")
+    pos = 0
+    for word in words:
+        offsets.append(pos)
+        pos += len(word) + 1
+    offsets.append(pos)
+    if words:
+        blob = b"\n".join(words) + b"\n"
+    else:
+        blob = b""
+    return blob, offsets
+
+def writeKeywordDictionary(conn: sqlite3.Connection, dbLocation: str, generation: IndexGeneration) -> str:
+    """Writes the keyword dictionary for the given generation and returns its name."""
+    q = conn.cursor()
+    q.execute("SELECT kwID,COUNT(*) FROM kw2doc GROUP BY kwID")
+    frequencies = dict(q.fetchall())
+    q.execute("SELECT id,keyword FROM keywords")
+    entries = sorted((keyword.encode("utf-8"), kwID, frequencies.get(kwID, 0)) for kwID, keyword in q.fetchall())
+    name = dictionaryName(dbLocation, generation)
+    _writeDictionary(entries, name, generation)
+    return name
+
+def writeFileNameDictionary(conn: sqlite3.Connection, dbLocation: str, generation: IndexGeneration) -> str:
+    """Writes the dictionary of the names in the fileName table for the given generation and returns its name.
+       The same name appears once for every extension it is used with."""
+    q = conn.cursor()
+    q.execute("SELECT fileNameID,COUNT(*) FROM fileName2doc GROUP BY fileNameID")
+    frequencies = dict(q.fetchall())
+    q.execute("SELECT id,name FROM fileName")
+    entries = sorted((fileName.encode("utf-8"), fileNameID, frequencies.get(fileNameID, 0)) for fileNameID, fileName in q.fetchall())
+    if any(b"\n" in fileName for fileName, _, _ in entries):
+        raise RuntimeError("File names containing line breaks can't be stored in a dictionary")
+    name = fileNameDictionaryName(dbLocation, generation)
+    _writeDictionary(entries, name, generation)
+    return name
+
+def _writeDictionary(entries: List[Tuple[bytes, int, int]], name: str, generation: IndexGeneration) -> None:
+    """Writes the sorted (word, ID, document frequency) entries."""
+    count = len(entries)
+
+    words = [word for word, _, _ in entries]
+    ids = array("q", (kwID for _, kwID, _ in entries))
+    frequencies = array("I", (min(frequency, 0xFFFFFFFF) for _, _, frequency in entries))
+    del entries
+    forwardBlob, forwardOffsets = _sortedBlob(words)
+
+    reversedWords = [word[::-1] for word in words]
+    del words
+    reverseToIndex = array("I", sorted(range(count), key=reversedWords.__getitem__))
+    reverseBlob, reverseOffsets = _sortedBlob([reversedWords[i] for i in reverseToIndex])
+    del reversedWords
+
+    if len(forwardBlob) > 0xFFFFFFFF:
+        raise RuntimeError("Too many words for dictionary '%s'" % (name,))
+
+    tempName = name + ".tmp"
+    with open(tempName, "wb") as output:
+        header = _header.pack(_magic, _version, generation[0], generation[1], count, len(forwardBlob), len(reverseBlob))
+        output.write(header)
+        for section in (forwardOffsets.tobytes(), ids.tobytes(), reverseOffsets.tobytes(), reverseToIndex.tobytes(), frequencies.tobytes(),
+                        forwardBlob, reverseBlob):
+            output.write(b"\0" * (_align(output.tell()) - output.tell()))
+            output.write(section)
+    os.replace(tempName, name)
+
+def removeOutdatedDictionaries(dbLocation: str, keep: Iterable[str]=()) -> None:
+    """Removes all keyword and file name dictionaries of the database except the ones named in 'keep'.
+       A dictionary which is still mapped by a running search cannot be removed on Windows, it is removed next time."""
+    keepNames = set(keep)
+    for suffix in _suffixes:
+        for name in glob.glob(glob.escape(dbLocation) + ".*." + suffix + "*"):
+            if name not in keepNames:
+                try:
+                    os.unlink(name)
+                except OSError:
+                    pass
+
+class _SortedWords:
+    """Presents a blob of '\n' terminated words as a sequence which can be bisected."""
+    def __init__(self, blob: mmap.mmap, blobStart: int, offsets: memoryview) -> None:
+        self.blob = blob
+        self.blobStart = blobStart
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> bytes:
+        start = self.blobStart + self.offsets[i]
+        return self.blob[start:self.blobStart+self.offsets[i+1]-1]
+
+    def prefixRange(self, prefix: bytes) -> Tuple[int, int]:
+        return bisect_left(self, prefix), bisect_left(self, prefix + _maxByte)
+
+class KeywordDictionary:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.__views: List[memoryview] = []
+        with open(name, "rb") as file:
+            self.__map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self.__parse()
+        except:
+            self.close()
+            raise
+
+    def __parse(self) -> None:
+        if len(self.__map) < _header.size:
+            raise RuntimeError("Dictionary '%s' is truncated" % (self.name,))
+        magic, version, generation, timestamp, count, forwardSize, reverseSize = _header.unpack_from(self.__map, 0)
+        if magic != _magic or version != _version:
+            raise RuntimeError("Dictionary '%s' has an unknown format" % (self.name,))
+        self.generation: IndexGeneration = (generation, timestamp)
+        self.count: int = count
+
+        view = memoryview(self.__map)
+        self.__views.append(view)
+        pos = _header.size
+        def section(size: int, typecode: Literal['I', 'q']) -> memoryview:
+            nonlocal pos
+            pos = _align(pos)
+            if pos + size > len(self.__map):
+                raise RuntimeError("Dictionary '%s' is truncated" % (self.name,))
+            sectionView = view[pos:pos+size].cast(typecode)
+            self.__views.append(sectionView)
+            pos += size
+            return sectionView
+
+        forwardOffsets = section((count+1)*4, "I")
+        self.__ids = section(count*8, "q")
+        reverseOffsets = section((count+1)*4, "I")
+        self.__reverseToIndex = section(count*4, "I")
+        self.__frequencies = section(count*4, "I")
+        self.__forwardStart = _align(pos)
+        self.__reverseStart = _align(self.__forwardStart + forwardSize)
+        if self.__reverseStart + reverseSize > len(self.__map):
+            raise RuntimeError("Dictionary '%s' is truncated" % (self.name,))
+        self.__forwardOffsets = forwardOffsets
+        self.__forwardSize = forwardSize
+        self.__forward = _SortedWords(self.__map, self.__forwardStart, forwardOffsets)
+        self.__reverse = _SortedWords(self.__map, self.__reverseStart, reverseOffsets)
+
+    def close(self) -> None:
+        # All exported views must be released before the map can be closed
+        for view in reversed(self.__views):
+            view.release()
+        self.__views = []
+        self.__map.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def lookup(self, pattern: str, singleWildcard: bool = False) -> List[KeywordMatch]:
+        """Returns (ID, keyword) tuples of all keywords matching the pattern. '*' matches any number of characters.
+           If 'singleWildcard' is set '?' matches exactly one character."""
+        pieces = re.split(rb"([*?])" if singleWildcard else rb"(\*)", pattern.encode("utf-8"))
+        # The literal parts and the wildcards between them
+        parts, wildcards = pieces[0::2], pieces[1::2]
+        if not wildcards:
+            begin, end = self.__forward.prefixRange(parts[0])
+            return self.__matches(i for i in range(begin, end) if self.__forward[i] == parts[0])
+
+        prefix, suffix = parts[0], parts[-1]
+        if wildcards == [b"*"] and (not prefix or not suffix):
+            # 'foo*' or '*foo' are resolved by the binary search alone
+            regEx = None
+        else:
+            expr = re.escape(parts[0])
+            for wildcard, part in zip(wildcards, parts[1:]):
+                expr += (b".*" if wildcard == b"*" else _anyChar) + re.escape(part)
+            regEx = re.compile(expr, re.DOTALL)
+
+        if prefix:
+            begin, end = self.__forward.prefixRange(prefix)
+            candidates: Iterable[int] = range(begin, end)
+        elif suffix:
+            begin, end = self.__reverse.prefixRange(suffix[::-1])
+            candidates = (self.__reverseToIndex[j] for j in range(begin, end))
+        else:
+            infix = max(parts, key=len)
+            if not infix:
+                candidates = range(self.count)
+            else:
+                candidates = self.__find(infix)
+
+        if regEx is not None:
+            match = regEx.fullmatch
+            forward = self.__forward
+            candidates = (i for i in candidates if match(forward[i]))
+        return self.__matches(candidates)
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        """Returns the words starting with the prefix which are contained in the most documents as (word, document count)."""
+        begin, end = self.__forward.prefixRange(prefix.encode("utf-8"))
+        frequencies = self.__frequencies
+        best = heapq.nlargest(limit, range(begin, end), key=frequencies.__getitem__)
+        forward = self.__forward
+        return [(forward[i].decode("utf-8"), frequencies[i]) for i in best]
+
+    def __find(self, infix: bytes) -> Iterable[int]:
+        """Scans the forward blob for the infix and yields the index of every keyword containing it."""
+        blob = self.__map
+        start = self.__forwardStart
+        stop = start + self.__forwardSize
+        offsets = self.__forwardOffsets
+        pos = blob.find(infix, start, stop)
+        while pos != -1:
+            i = bisect_right(offsets, pos - start) - 1
+            yield i
+            # Continue behind the keyword, every keyword is reported only once
+            pos = blob.find(infix, start + offsets[i+1], stop)
+
+    def __matches(self, indexes: Iterable[int]) -> List[KeywordMatch]:
+        ids = self.__ids
+        forward = self.__forward
+        return [(ids[i], forward[i].decode("utf-8")) for i in indexes]
+
+# Dictionaries opened by the search, shared by all FullTextIndex instances. The key is the database and the dictionary suffix.
+_openDictionaries: Dict[Tuple[str, str], KeywordDictionary] = {}
+_openDictionariesLock = threading.Lock()
+
+def openKeywordDictionary(dbLocation: str, generation: Optional[IndexGeneration]) -> Optional[KeywordDictionary]:
+    """Returns the keyword dictionary for the generation of the database or None if there is no up to date dictionary."""
+    return _openDictionary(dbLocation, generation, "kwdict", dictionaryName)
+
+def openFileNameDictionary(dbLocation: str, generation: Optional[IndexGeneration]) -> Optional[KeywordDictionary]:
+    """Returns the file name dictionary for the generation of the database or None if there is no up to date dictionary."""
+    return _openDictionary(dbLocation, generation, "fndict", fileNameDictionaryName)
+
+def _openDictionary(dbLocation: str, generation: Optional[IndexGeneration], suffix: str,
+                    nameOf: Callable[[str, IndexGeneration], str]) -> Optional[KeywordDictionary]:
+    if not generation:
+        return None
+    key = (dbLocation, suffix)
+    with _openDictionariesLock:
+        dictionary = _openDictionaries.get(key)
+        if dictionary and dictionary.generation == generation:
+            return dictionary
+        if dictionary:
+            # Not closed explicitly because a search running in another thread might still use it
+            del _openDictionaries[key]
+        name = nameOf(dbLocation, generation)
+        if not os.path.isfile(name):
+            return None
+        try:
+            dictionary = KeywordDictionary(name)
+        except Exception as e:
+            logging.warning("Failed to open dictionary '%s': %s", name, str(e))
+            return None
+        if dictionary.generation != generation:
+            # Left over from an older database which had the same generation
+            dictionary.close()
+            return None
+        _openDictionaries[key] = dictionary
+        return dictionary
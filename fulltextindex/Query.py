@@ -19,16 +19,18 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import time
 import re
+import mmap
 import unittest
 from enum import Enum
 from .IStringMatcher import IStringMatcher, MatchPosition
-from typing import List, Tuple, Iterator, Iterable, Pattern, Any, Sized, Optional, Literal, Dict, Callable
+from typing import List, Tuple, Iterator, Iterable, Pattern, Any, Sized, Optional, Literal, Dict, Callable, Union
 from .CommentRule import CommentRule
-from .CommentDetection import isInsideTextSpan, analyzeText
+from .CommentDetection import CommentLexer
 
-__all__ = ['Query', 'ContentQuery', 'FileQuery', 'QueryParams', 'PerformanceReport', 'SearchResult', 'hasFileNameWildcard', 'createPathMatchPattern']
+__all__ = ['Query', 'ContentQuery', 'CompiledMatcher', 'FileQuery', 'QueryParams', 'PerformanceReport', 'SearchResult', 'hasFileNameWildcard', 'createPathMatchPattern',
+           'splitSubTokens', 'modifiedWithin']
 
-reQueryToken = re.compile(r"[\w#*]+|<!.*?!>")
+reQueryToken = re.compile(r"<\^[^\W_]+\^>|[\w#*]+|<!.*?!>")
 reMatchWords = re.compile(r"(\*\*)([0-9]+)")
 reMatchRegEx = re.compile(r"<!(.*)!>")
 
@@ -50,6 +52,20 @@ def getTokens(text: str) -> List[Tuple[int,int]]:
             break
     return parts
 
+# The parts of an identifier are separated by underscores and by a change from a lower case letter or a digit to an upper
+# case letter ('tcpSocket'). Inside a run of upper case letters the last one starts the next part ('HTTPServer').
+# The boundaries are ASCII only, other letters don't separate parts.
+_camelCaseBoundary = r"(?<=[a-z0-9])(?=[A-Z])|(?<=[A-Z])(?=[A-Z][a-z])"
+reSubTokenSplit = re.compile(r"[_#]+|" + _camelCaseBoundary)
+
+def splitSubTokens(token: str) -> List[str]:
+    """Returns the camel case and snake case parts of an indexed token, e.g. 'createTcpSocket' consists of 'create', 'Tcp'
+       and 'Socket'. Returns an empty list if the token is its only part."""
+    parts = [part for part in reSubTokenSplit.split(token) if part]
+    if parts == [token]:
+        return []
+    return parts
+
 def trimScanPart(s: str) -> str:
     return s.replace(" ", "")
 
@@ -58,6 +74,9 @@ class TokenType (Enum):
     ScanPart = 2
     MatchWordsPart = 3
     RegExPart = 4
+    # '<^part^>' matches identifiers which contain 'part' as a camel case or snake case part. A single '^' is the
+    # XOR operator of the source code.
+    SubTokenPart = 5
 
 SearchPartList = List[Tuple[TokenType,str]]
 
@@ -74,6 +93,8 @@ def splitSearchParts(strSearch: str) -> SearchPartList:
         if result and int(result.group(2)) > 0:
             matchWordsPart = (TokenType.MatchWordsPart, result.group(2))
             parts.append(matchWordsPart)
+        elif token.startswith("<^"):
+            parts.append((TokenType.SubTokenPart, token[2:-2]))
         elif token.startswith("<!"):
             r =  reMatchRegEx.match(token)
             if r:
@@ -102,6 +123,44 @@ class TestSearchParts(unittest.TestCase):
         self.assertEqual(splitSearchParts("a **2"), [(TokenType.IndexPart, "a"), (TokenType.ScanPart, ""), (TokenType.MatchWordsPart, "2")])
         self.assertEqual(splitSearchParts("a ***"), [(TokenType.IndexPart, "a"), (TokenType.ScanPart, "***")])
         self.assertEqual(splitSearchParts("a <!abc!>"), [(TokenType.IndexPart, "a"), (TokenType.ScanPart, ""), (TokenType.RegExPart, "abc")])
+        self.assertEqual(splitSearchParts("<^Socket^>("), [(TokenType.SubTokenPart, "Socket"), (TokenType.ScanPart, "(")])
+        self.assertEqual(splitSearchParts("a <^b^>_c"), [(TokenType.IndexPart, "a"), (TokenType.ScanPart, ""), (TokenType.SubTokenPart, "b"), (TokenType.IndexPart, "_c")])
+        self.assertEqual(splitSearchParts("<^b_c^>"), [(TokenType.ScanPart, "<^"), (TokenType.IndexPart, "b_c"), (TokenType.ScanPart, "^>")])
+        # The XOR operator
+        self.assertEqual(splitSearchParts("a^b"), [(TokenType.IndexPart, "a"), (TokenType.ScanPart, "^"), (TokenType.IndexPart, "b")])
+        self.assertEqual(splitSearchParts("x ^y"), [(TokenType.IndexPart, "x"), (TokenType.ScanPart, "^"), (TokenType.IndexPart, "y")])
+
+class TestSubTokens(unittest.TestCase):
+    def test(self) -> None:
+        self.assertEqual(splitSubTokens("createTcpSocketHandler"), ["create", "Tcp", "Socket", "Handler"])
+        self.assertEqual(splitSubTokens("HTTPServerError"), ["HTTP", "Server", "Error"])
+        self.assertEqual(splitSubTokens("HTTP2Server"), ["HTTP2", "Server"])
+        self.assertEqual(splitSubTokens("MAX_BUFFER__SIZE"), ["MAX", "BUFFER", "SIZE"])
+        self.assertEqual(splitSubTokens("__init__"), ["init"])
+        self.assertEqual(splitSubTokens("#define"), ["define"])
+        self.assertEqual(splitSubTokens("socket"), [])
+        self.assertEqual(splitSubTokens("Socket"), [])
+
+    def test_matches(self) -> None:
+        """The expression finds a part exactly where splitSubTokens splits the identifier."""
+        text = "createTcpSocketHandler tcp_socket websocket HTTPServer SOCKET socket sockets x_Socket2 #socket"
+        query = ContentQuery(QueryParams("<^socket^>"))
+        self.assertEqual([text[m.index:m.index+m.length] for m in query.matches(text)], ["Socket", "socket", "SOCKET", "socket", "socket"])
+        query = ContentQuery(QueryParams("<^Socket^>", bCaseSensitive=True))
+        self.assertEqual(len(list(query.matches(text))), 1)
+        query = ContentQuery(QueryParams("<^server^>"))
+        self.assertEqual([m.index for m in query.matches(text)], [text.index("Server")])
+        for identifier in text.split():
+            for part in splitSubTokens(identifier) or [identifier]:
+                if part.isalnum():
+                    self.assertTrue(list(ContentQuery(QueryParams("<^" + part + "^>")).matches(identifier)), identifier + " " + part)
+
+    def test_xor(self) -> None:
+        """A '^' in front of a keyword is the XOR operator."""
+        text = "h = a^b; hash ^seed; x ^ y"
+        for search, found in [("a^b", "a^b"), ("hash ^seed", "hash ^seed"), ("x ^y", "x ^ y")]:
+            query = ContentQuery(QueryParams(search))
+            self.assertEqual([text[m.index:m.index+m.length] for m in query.matches(text)], [found])
 
 def hasFileNameWildcard(name: str) -> bool:
     if name.find("*") != -1:
@@ -217,13 +276,26 @@ class QueryError(RuntimeError):
 CommentRuleFetcher = Callable[[str], Optional[CommentRule]]
 
 class QueryParams:
-    def __init__(self, strSearch: str, strFolderFilter: str = "", strExtensionFilter: str = "", bCaseSensitive: bool = False, bExcludeComments: bool = False, commentRuleFetcher: Optional[CommentRuleFetcher] = None) -> None:
+    def __init__(self, strSearch: str, strFolderFilter: str = "", strExtensionFilter: str = "", bCaseSensitive: bool = False, bExcludeComments: bool = False, commentRuleFetcher: Optional[CommentRuleFetcher] = None,
+                 modifiedSince: Optional[float] = None, modifiedBefore: Optional[float] = None, bAllowFullScan: bool = True) -> None:
         self.strSearch = strSearch
         self.strFolderFilter = strFolderFilter
         self.strExtensionFilter = strExtensionFilter
         self.bCaseSensitive = bCaseSensitive
         self.bExcludeComments = bExcludeComments
         self.commentRuleFetcher = commentRuleFetcher
+        # Restrict the search to files modified in [modifiedSince, modifiedBefore), seconds since the epoch like os.stat
+        self.modifiedSince = modifiedSince
+        self.modifiedBefore = modifiedBefore
+        # If no keyword can be searched in the index all indexed files are read. Otherwise FullScanRequired is raised.
+        self.bAllowFullScan = bAllowFullScan
+
+def modifiedWithin(days: int, now: Optional[float] = None) -> float:
+    """Returns the start of the time range for files modified within the last 'days'. The bound is rounded down to the
+       full hour, repeated searches then have the same cache keys and find the cached results."""
+    if now is None:
+        now = time.time()
+    return (now // 3600) * 3600 - days * 24 * 3600
 
 class Query (IStringMatcher):
     def __init__(self, params: QueryParams) -> None:
@@ -241,6 +313,37 @@ class Query (IStringMatcher):
         self.bCaseSensitive = params.bCaseSensitive
         self.bExcludeComments = params.bExcludeComments
         self.commentRuleFetcher = params.commentRuleFetcher
+        self.modifiedSince = params.modifiedSince
+        self.modifiedBefore = params.modifiedBefore
+        self.bAllowFullScan = params.bAllowFullScan
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The comment rule fetcher usually is a method of a widget which can't be passed to another process.
+        # Callers which verify matches in another process pass the comment rule explicitly.
+        state = self.__dict__.copy()
+        state["commentRuleFetcher"] = None
+        return state
+
+    def commentRuleFor(self, filename: str) -> Optional[CommentRule]:
+        """Returns the comment rule which is needed to match the file or None if comments are not excluded."""
+        if not self.bExcludeComments or not self.commentRuleFetcher or not filename:
+            return None
+        return self.commentRuleFetcher(filename)
+
+    def hasFilters(self) -> bool:
+        return self.__hasFilters
+
+    def resultKey(self) -> Tuple[Any, ...]:
+        """Identifies the result of the query without folder and extension filter. Queries with equal keys
+           find the same documents."""
+        search = self.search if self.bCaseSensitive else self.search.lower()
+        return (type(self).__name__, search, self.bCaseSensitive, self.bExcludeComments)
+
+    def hasTimeFilter(self) -> bool:
+        return self.modifiedSince is not None or self.modifiedBefore is not None
+
+    def filterKey(self) -> Tuple[Any, ...]:
+        return (tuple(self.folderFilter), tuple(self.extensionFilter), self.modifiedSince, self.modifiedBefore)
 
     def getFolderFilterExpression(self) -> IncludeExcludePattern:
         return self.__folderFilterExpression
@@ -263,6 +366,78 @@ class Query (IStringMatcher):
 
         return True
 
+    def matchModifiedTime(self, strFileName: str, mtime: Optional[float]=None) -> bool:
+        """Checks the modification time of the file against the time filter. The file is only asked for its
+           modification time if the query has a time filter and 'mtime' is not passed."""
+        if self.modifiedSince is None and self.modifiedBefore is None:
+            return True
+        if mtime is None:
+            try:
+                mtime = os.stat(strFileName).st_mtime
+            except OSError:
+                return False
+        if self.modifiedSince is not None and mtime < self.modifiedSince:
+            return False
+        if self.modifiedBefore is not None and mtime >= self.modifiedBefore:
+            return False
+        return True
+
+class CompiledMatcher:
+    """The compiled expressions of a content query. Before the expression is run over a text the required literals
+       are searched, most texts don't contain all of them. The literals are searched longest first because
+       long literals are the least likely to occur."""
+    def __init__(self, pattern: str, flags: int, literals: List[str]) -> None:
+        self.regEx = re.compile(pattern, flags)
+        self.bytesRegEx: Optional[Pattern[bytes]] = None
+        if pattern.isascii():
+            try:
+                self.bytesRegEx = re.compile(pattern.encode("ascii"), flags)
+            except re.error:
+                # E.g. '\u' escapes are only supported in str patterns
+                pass
+        self.literals = sorted(set(literals), key=len, reverse=True)
+        self.caseSensitive = not flags & re.IGNORECASE
+        # Without case sensitivity the literals are searched by expressions because the case folding of 'lower()'
+        # differs from the one of the regular expression for some characters.
+        self.__literalRegExes: List[Pattern[str]] = []
+        self.__bytesLiterals: List[bytes] = []
+        self.__bytesLiteralRegExes: List[Pattern[bytes]] = []
+        if not self.caseSensitive:
+            self.__literalRegExes = [re.compile(re.escape(literal), flags) for literal in self.literals]
+        if self.bytesRegEx is not None:
+            self.__bytesLiterals = [literal.encode("ascii") for literal in self.literals]
+            if not self.caseSensitive:
+                self.__bytesLiteralRegExes = [re.compile(re.escape(literal), flags) for literal in self.__bytesLiterals]
+
+    def mayMatch(self, text: str) -> bool:
+        """False if the text misses one of the required literals and the expression can't match."""
+        if self.caseSensitive:
+            for literal in self.literals:
+                if literal not in text:
+                    return False
+        else:
+            for regEx in self.__literalRegExes:
+                if not regEx.search(text):
+                    return False
+        return True
+
+    def mayMatchBytes(self, data: Union[bytes, mmap.mmap], start: int = 0) -> bool:
+        """Like mayMatch for ASCII data searched with bytesRegEx."""
+        if self.caseSensitive:
+            for literal in self.__bytesLiterals:
+                if data.find(literal, start) == -1:
+                    return False
+        else:
+            for regEx in self.__bytesLiteralRegExes:
+                if not regEx.search(data, start):
+                    return False
+        return True
+
+# Returns the regular expression which matches a part of an identifier. The case of the camel case boundaries matters
+# even if the search is not case sensitive.
+def subTokenExpr(part: str) -> str:
+    return r"(?:\b|(?<=[_#])|(?-i:" + _camelCaseBoundary + "))" + re.escape(part) + r"(?:\b|(?=[_#])|(?-i:" + _camelCaseBoundary + "))"
+
 # Returns the regular expression which matches a keyword
 def kwExpr(kw: str) -> str:
     # If the keyword starts with '#' it is not matched if we search for word boundaries (\\b)
@@ -279,15 +454,40 @@ class ContentQuery(Query):
             self.reFlags = re.IGNORECASE
         self.parts = splitSearchParts(self.search)
         # Check that the search contains at least one indexed part.
-        if not self.hasPartTypeEqualTo(TokenType.IndexPart):
+        if not self.hasPartTypeEqualTo(TokenType.IndexPart) and not self.hasPartTypeEqualTo(TokenType.SubTokenPart):
             raise QueryError("Sorry, you can't search for that.")
+        self.__matcher: Optional[CompiledMatcher] = None
+
+    def matcher(self) -> 'CompiledMatcher':
+        """Returns the compiled expressions of the query. They are built once and shared by all files and text blocks."""
+        if self.__matcher is None:
+            self.__matcher = CompiledMatcher(self.__buildRegEx(), self.reFlags, self.requiredLiterals())
+        return self.__matcher
+
+    def requiredLiterals(self) -> List[str]:
+        """Returns the literal fragments which are part of every match."""
+        literals: List[str] = []
+        for t, s in self.parts:
+            if TokenType.IndexPart == t:
+                literals.extend(fragment for fragment in s.split("*") if fragment)
+            elif TokenType.SubTokenPart == t:
+                literals.append(s)
+            elif TokenType.ScanPart == t:
+                # The expression allows whitespace between the characters of a scan part, e.g. '->' matches '- >'
+                literals.extend(c for c in s if not c.isspace())
+        return literals
 
     # Returns a list of regular expressions which match all found occurances in a document
     def regExForMatches(self) -> Pattern[str]:
+        return self.matcher().regEx
+
+    def __buildRegEx(self) -> str:
         regParts = []
         for t, s in self.parts:
             if TokenType.IndexPart == t:
                 regParts.append(kwExpr(s))
+            elif TokenType.SubTokenPart == t:
+                regParts.append(subTokenExpr(s))
             elif TokenType.ScanPart == t:
                 # Regex special characters [\^$.|?*+()
                 for c in s:
@@ -304,24 +504,28 @@ class ContentQuery(Query):
                     regParts.append(part)
             elif TokenType.RegExPart == t:
                 regParts.append("(?:"+s+")")
-        reExpr = re.compile(r"\s*".join(regParts), self.reFlags)
-        return reExpr
+        return r"\s*".join(regParts)
+
+    def bytesRegExForMatches(self) -> Optional[Pattern[bytes]]:
+        """Returns the expression of regExForMatches compiled for bytes or None if this is not possible. On pure ASCII
+           text both expressions find the same matches."""
+        return self.matcher().bytesRegEx
 
     # Yields all matches in str. Each match is returned as the touple (position,length)
     def matches(self, data: str, filename: str = "") -> Iterable[MatchPosition]:
-        reExpr = self.regExForMatches()
-        if not reExpr:
+        return self.matchesWithCommentRule(data, self.commentRuleFor(filename))
+
+    # Like matches but the comment rule is passed by the caller. Matches inside comments are skipped if a rule is passed.
+    def matchesWithCommentRule(self, data: str, commentRule: Optional[CommentRule]) -> Iterable[MatchPosition]:
+        matcher = self.matcher()
+        if not matcher.mayMatch(data):
             return
+        reExpr = matcher.regEx
 
-        # Determine if we should filter comments
-        commentRule: Optional[CommentRule] = None
-        if self.commentRuleFetcher:
-            commentRule = self.commentRuleFetcher(filename)
-        
-        commentRanges = None
-        if self.bExcludeComments and commentRule is not None and filename:
-            # Find all comments in the data
-            _, commentRanges = analyzeText(data,
+        lexer = None
+        if self.bExcludeComments and commentRule is not None:
+            # The comments are only lexed up to the match which is checked
+            lexer = CommentLexer(data,
                 commentRule.lineComment,
                 commentRule.multiCommentStart,
                 commentRule.multiCommentStop,
@@ -333,9 +537,9 @@ class ContentQuery(Query):
             if result:
                 startPos, endPos = result.span()
                 # Check if match is inside a comment
-                if commentRanges:
+                if lexer:
                     # Check if the start of the match is inside a comment
-                    if not isInsideTextSpan(startPos, commentRanges):
+                    if not lexer.isInsideComment(startPos):
                         yield MatchPosition(startPos, endPos-startPos)
                 else:
                     yield MatchPosition(startPos, endPos-startPos)
@@ -344,9 +548,19 @@ class ContentQuery(Query):
             else:
                 return
 
-    # All indexed parts
+    def resultKey(self) -> Tuple[Any, ...]:
+        # Only the keywords are normalized, the case of a regular expression might be significant even if the search is not case sensitive
+        lower = not self.bCaseSensitive
+        parts = tuple((t.value, s.lower() if lower and t in (TokenType.IndexPart, TokenType.SubTokenPart) else s) for t, s in self.parts)
+        return (type(self).__name__, parts, self.bCaseSensitive, self.bExcludeComments)
+
+    # All indexed parts, parts of identifiers keep their '^' prefix
     def indexedPartsLower(self) -> Iterator[str]:
-        return (part[1].lower() for part in self.parts if part[0] == TokenType.IndexPart)
+        for t, s in self.parts:
+            if t == TokenType.IndexPart:
+                yield s.lower()
+            elif t == TokenType.SubTokenPart:
+                yield "^" + s.lower()
 
     def requiresReadingFile(self) -> bool:
         """True if the query relies on a regex. That is e.g. true if you search for more than one keyword or case sensitive."""
@@ -354,6 +568,9 @@ class ContentQuery(Query):
             return True
         if self.bCaseSensitive or self.bExcludeComments:
             return True
+        # The index only knows the lower case identifiers which contain the part
+        if self.hasPartTypeEqualTo(TokenType.SubTokenPart):
+            return True
         return False
 
     def hasPartTypeEqualTo(self, partType: TokenType) -> bool:
@@ -385,6 +602,38 @@ class TestQuery(unittest.TestCase):
         self.assertEqual(s5.regExForMatches().pattern, r"\bunknown\b\s*\S+(?:\s+\S+){0,3}")
         s6 = ContentQuery(QueryParams("regex <!abc!>"))
         self.assertEqual(s6.regExForMatches().pattern, r"\bregex\b\s*(?:abc)")
+        bytesRegEx = s6.bytesRegExForMatches()
+        self.assertIsNotNone(bytesRegEx)
+        self.assertEqual(bytesRegEx.pattern if bytesRegEx else None, rb"\bregex\b\s*(?:abc)")
+        self.assertIsNone(ContentQuery(QueryParams("regex <!\\u00e4!>")).bytesRegExForMatches())
+        self.assertIsNone(ContentQuery(QueryParams("stra\u00dfe")).bytesRegExForMatches())
+
+    def test_matcher(self) -> None:
+        query = ContentQuery(QueryParams("create* ( CComVariant **2"))
+        self.assertEqual(query.requiredLiterals(), ["create", "(", "CComVariant"])
+        matcher = query.matcher()
+        self.assertIs(matcher, query.matcher())
+        self.assertIs(matcher.regEx, query.regExForMatches())
+        self.assertEqual(matcher.literals, ["CComVariant", "create", "("])
+        self.assertTrue(matcher.mayMatch("createNode(ccomvariant x"))
+        self.assertFalse(matcher.mayMatch("createNode(x)"))
+        self.assertTrue(matcher.mayMatchBytes(b"  createNode(ccomvariant x", 2))
+        self.assertFalse(matcher.mayMatchBytes(b"createNode(ccomvariant", 12))
+        self.assertEqual([tuple(m) for m in query.matches("a = createNode(CComVariant a b c)")], [(4, 26)])
+        self.assertEqual(list(query.matches("a = createNode(CComVariants a b c)")), [])
+        # Case folding of the expression, 'lower()' doesn't map the long s to 's'
+        query = ContentQuery(QueryParams("stop"))
+        self.assertTrue(query.matcher().mayMatch("\u017ftop"))
+        self.assertEqual([tuple(m) for m in query.matches("\u017ftop")], [(0, 4)])
+        query = ContentQuery(QueryParams("Stop", bCaseSensitive=True))
+        self.assertFalse(query.matcher().mayMatch("stop"))
+        self.assertFalse(query.matcher().mayMatchBytes(b"stop"))
+        self.assertTrue(query.matcher().mayMatchBytes(b"Stop"))
+        # Operators are found with whitespace between their characters
+        query = ContentQuery(QueryParams("a -> b"))
+        self.assertEqual(query.requiredLiterals(), ["a", "-", ">", "b"])
+        self.assertEqual([tuple(m) for m in query.matches("x = a - > b")], [(4, 7)])
+        self.assertTrue(query.matcher().mayMatchBytes(b"x = a - > b"))
 
 class FileQuery(Query):
     def __init__(self, params: QueryParams) -> None:
@@ -394,7 +643,8 @@ class FileQuery(Query):
             search, extensionFilter = os.path.splitext(params.strSearch)
             if extensionFilter == ".*":
                 extensionFilter = ""
-            params = QueryParams(search, params.strFolderFilter, extensionFilter, params.bCaseSensitive)
+            params = QueryParams(search, params.strFolderFilter, extensionFilter, params.bCaseSensitive,
+                                 modifiedSince=params.modifiedSince, modifiedBefore=params.modifiedBefore)
         super().__init__(params)
 
     def matches(self, data: str, filename: str = "") -> Iterable[MatchPosition]:
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Some regular expressions need exponential time on some texts, e.g. '(a+)+b' on a long run of 'a'. Python can't
+# interrupt a running expression, neither by an event nor by a timeout. The only way out is to run the expression
+# in another process and to kill the process if it takes too long.
+
+import time
+import importlib
+import threading
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Optional, Tuple, List
+import unittest
+
+__all__ = ['backtrackingRisk', 'GuardedWorker']
+
+# The parser of the re module. It was renamed in Python 3.11, the old name is deprecated.
+try:
+    _parser = importlib.import_module("re._parser")
+except ImportError:
+    _parser = importlib.import_module("sre_parse")
+
+# Interval in seconds in which a waiting caller checks if the call was canceled
+_pollInterval = 0.1
+
+def _isRepeated(op: Any, av: Any) -> bool:
+    """True for quantifiers which repeat their item more than once."""
+    return op in (_parser.MAX_REPEAT, _parser.MIN_REPEAT) and av[1] > 1
+
+def _findNestedRepeat(subpattern: Any, insideRepeat: bool) -> bool:
+    for op, av in subpattern:
+        if _isRepeated(op, av):
+            if insideRepeat:
+                return True
+            if _findNestedRepeat(av[2], True):
+                return True
+        elif op in (_parser.MAX_REPEAT, _parser.MIN_REPEAT):
+            if _findNestedRepeat(av[2], insideRepeat):
+                return True
+        elif op == _parser.SUBPATTERN:
+            if _findNestedRepeat(av[-1], insideRepeat):
+                return True
+        elif op == _parser.BRANCH:
+            for branch in av[1]:
+                if _findNestedRepeat(branch, insideRepeat):
+                    return True
+        elif op in (_parser.ASSERT, _parser.ASSERT_NOT):
+            if _findNestedRepeat(av[1], insideRepeat):
+                return True
+        # Atomic groups and possessive quantifiers never backtrack into their content
+    return False
+
+def backtrackingRisk(pattern: str) -> Optional[str]:
+    """Returns a warning if the expression is likely to backtrack catastrophically or None. Invalid expressions are not rated."""
+    try:
+        parsed = _parser.parse(pattern)
+    except Exception:
+        return None
+    if _findNestedRepeat(parsed, False):
+        return "Nested quantifiers like '(a+)+' may take exponential time on some texts"
+    return None
+
+def _workerMain(conn: Connection, function: Callable[..., Any]) -> None:
+    context = None
+    while True:
+        try:
+            kind, data = conn.recv()
+        except (EOFError, OSError):
+            return
+        if kind == "context":
+            context = data
+            continue
+        try:
+            conn.send((True, function(context, *data)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+class GuardedWorker:
+    """Calls a function in a worker process which is killed if a call exceeds its time budget. The process is started
+       on demand and restarted after it was killed. The first argument of the function is a context, e.g. a query, which
+       is passed to the process only if it differs from the context of the previous call.
+       A worker must only be used by one thread at a time."""
+    def __init__(self, function: Callable[..., Any]) -> None:
+        self.function = function
+        self.__process: Optional[BaseProcess] = None
+        self.__conn: Optional[Connection] = None
+        self.__context: Any = None
+
+    def call(self, context: Any, args: Tuple[Any, ...], timeout: float, cancelEvent: Optional[threading.Event]=None) -> Tuple[bool, Any]:
+        """Returns (True, result) or (False, None) if the call exceeded the timeout or was canceled.
+           Exceptions raised by the function are raised as RuntimeError."""
+        conn = self.__start()
+        if self.__context is not context:
+            conn.send(("context", context))
+            self.__context = context
+        conn.send(("call", args))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (cancelEvent and cancelEvent.is_set()):
+                self.close()
+                return False, None
+            if conn.poll(min(remaining, _pollInterval)):
+                break
+        try:
+            success, result = conn.recv()
+        except (EOFError, OSError) as e:
+            # The process died, e.g. because it ran out of memory
+            self.close()
+            raise RuntimeError("Worker process terminated: %s" % (str(e),))
+        if not success:
+            raise RuntimeError(result)
+        return True, result
+
+    def close(self) -> None:
+        if self.__process:
+            self.__process.kill()
+            self.__process.join()
+            self.__process = None
+        if self.__conn:
+            self.__conn.close()
+            self.__conn = None
+        self.__context = None
+
+    def __start(self) -> Connection:
+        if self.__conn and self.__process and self.__process.is_alive():
+            return self.__conn
+        self.close()
+        conn, childConn = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_workerMain, args=(childConn, self.function), daemon=True)
+        process.start()
+        childConn.close()
+        self.__process = process
+        self.__conn = conn
+        return conn
+
+def _search(pattern: str, text: str) -> bool:
+    import re
+    return re.search(pattern, text) is not None
+
+class TestRegExGuard(unittest.TestCase):
+    def test_risk(self) -> None:
+        self.assertIsNotNone(backtrackingRisk(r"(a+)+b"))
+        self.assertIsNotNone(backtrackingRisk(r"\bunknown\b\s*\S+(?:\s+\S+){0,3}"))
+        self.assertIsNotNone(backtrackingRisk(r"(?:x|(\w*\s)*)y"))
+        self.assertIsNotNone(backtrackingRisk(r"(?=(a*)*)"))
+        self.assertIsNone(backtrackingRisk(r"\bfoo\b\s*\(\s*\bbar\w*\b"))
+        self.assertIsNone(backtrackingRisk(r"(ab)+c?"))
+        self.assertIsNone(backtrackingRisk(r"(a?b)*"))
+        self.assertIsNone(backtrackingRisk(r"(unbalanced"))
+
+    def test_worker(self) -> None:
+        worker = GuardedWorker(_search)
+        try:
+            self.assertEqual(worker.call(r"a+b", ("xaab",), 30), (True, True))
+            self.assertEqual(worker.call(r"a+b", ("xaa",), 30), (True, False))
+            # The call is abandoned, the next one starts a new process
+            self.assertEqual(worker.call(r"(a+)+b", ("a"*40,), 0.5), (False, None))
+            self.assertEqual(worker.call(r"a+b", ("ab",), 30), (True, True))
+            cancelEvent = threading.Event()
+            cancelEvent.set()
+            self.assertEqual(worker.call(r"(a+)+b", ("a"*40,), 30, cancelEvent), (False, None))
+            self.assertRaises(RuntimeError, worker.call, r"(", ("a",), 30)
+        finally:
+            worker.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -19,20 +19,77 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import os
 import re
 import threading
-from typing import Optional, List, Pattern
-from tools.FileTools import freadall
+from typing import Optional, List, Pattern, Tuple, Any, Callable, Collection, Dict
 from  . import IndexConfiguration, IndexUpdater
-from .FullTextIndex import FullTextIndex, ContentQuery, FileQuery, SearchResult, PerformanceReport, CommonKeywordMap, ProgressFunction
+from .FullTextIndex import FullTextIndex, ContentQuery, FileQuery, SearchResult, PerformanceReport, CommonKeywordMap, ProgressFunction, MatchesFunction, EncodingHints, \
+                           SkippedFiles, SkipReasons
 from .Query import Query, hasFileNameWildcard, createPathMatchPattern
+from .IndexDatabase import IndexGeneration
+from .KeywordCaching import LruCache
+from .DirectSearch import searchContentDirect, listFiles, cachedFileListing, prefetchFileListing
+from .Verification import VerificationPager, verifyFiles
+from .Facets import Facets, computeFacets
+from .FuzzyFinder import listingFileNameIndex, prefetchFileNameIndex
 
 class ResultSet:
     def __init__(self, matches: Optional[SearchResult] = None, searchData: Optional[Query] = None,
-                 perfReport: Optional[PerformanceReport] = None, label: Optional[str] = None) -> None:
+                 perfReport: Optional[PerformanceReport] = None, label: Optional[str] = None,
+                 encodingHints: Optional[EncodingHints] = None, skipReasons: Optional[SkipReasons] = None) -> None:
 
         self.matches = matches or []
         self.perfReport = perfReport
         self.searchData = searchData
         self.label = label
+        # The encodings of the matches as far as they are known by the index
+        self.encodingHints = encodingHints or {}
+        # The matches which the index update skipped or indexed partially
+        self.skipReasons = skipReasons or {}
+        # Number of matches per directory and extension, None if they were not computed by the search
+        self.facets: Optional[Facets] = None
+
+# Key of a cached result: (index database, index generation, Query.resultKey, Query.filterKey or None)
+ResultCacheKey = Tuple[str, IndexGeneration, Tuple[Any, ...], Optional[Tuple[Any, ...]]]
+
+def _resultSize(result: SearchResult) -> int:
+    return 64 + sum(80 + len(match) for match in result)
+
+resultCacheSize = 16 * 1024 * 1024
+
+# Number of files returned by the fuzzy file name search
+maxFuzzyResults = 200
+
+# Number of keywords offered by the completion of the search text
+maxCompletions = 12
+
+# Results of indexed searches. They stay valid until the index is updated. The results of direct searches are not
+# cached as they depend on the current state of the file system.
+_resultCache: LruCache[ResultCacheKey, SearchResult] = LruCache(resultCacheSize, _resultSize)
+
+def getCachedResult(indexdb: str, generation: IndexGeneration, query: Query, perfReport: PerformanceReport) -> Optional[SearchResult]:
+    """Returns the cached result of the query. A filtered query is also served from the cached result of the unfiltered query."""
+    with perfReport.newAction("Result cache") as action:
+        # The time filter can't be checked without the timestamps of the index
+        superset = _resultCache.get((indexdb, generation, query.resultKey(), None)) if not query.hasTimeFilter() else None
+        if superset is not None:
+            if not query.hasFilters():
+                action.addData("%u cached matches", len(superset))
+                return list(superset)
+            action.addData("Filtered %u cached matches", len(superset))
+            return [match for match in superset if query.matchFolderAndExtensionFilter(match)]
+        if query.hasFilters() or query.hasTimeFilter():
+            result = _resultCache.get((indexdb, generation, query.resultKey(), query.filterKey()))
+            if result is not None:
+                action.addData("%u cached matches", len(result))
+                return list(result)
+        action.addData("Not cached")
+    return None
+
+def setCachedResult(indexdb: str, generation: IndexGeneration, query: Query, result: SearchResult) -> None:
+    filterKey = query.filterKey() if query.hasFilters() or query.hasTimeFilter() else None
+    _resultCache.put((indexdb, generation, query.resultKey(), filterKey), list(result))
+
+def clearResultCache() -> None:
+    _resultCache.clear()
 
 class SearchMethods:
     """
@@ -42,15 +99,21 @@ class SearchMethods:
     def __init__(self) -> None:
         self.fti: Optional[FullTextIndex] = None
         self.lock = threading.Lock()
+        self.cancelled = False
 
     def searchContent(self, searchData: ContentQuery, indexConf: IndexConfiguration.IndexConfiguration,
                       commonKeywordMap: CommonKeywordMap, cancelEvent: Optional[threading.Event]=None,
-                      reportProgress: Optional[ProgressFunction]=None) -> ResultSet:
-
+                      reportProgress: Optional[ProgressFunction]=None, reportMatches: Optional[MatchesFunction]=None,
+                      pager: Optional[VerificationPager]=None, scope: Optional[Collection[str]]=None) -> ResultSet:
+        """'reportMatches' receives verified matches in batches while the search is running. The final result contains all matches.
+           'pager' pauses the verification of large indexed results after each page of matches. If 'scope' is passed
+           only these files are searched."""
         try:
             if indexConf.isContentIndexed():
-                return self.__searchContentIndexed(searchData, indexConf, commonKeywordMap, cancelEvent, reportProgress)
-            return self.__searchContentDirect(searchData, indexConf, cancelEvent)
+                result = self.__searchContentIndexed(searchData, indexConf, commonKeywordMap, cancelEvent, reportProgress, reportMatches, pager, scope)
+            else:
+                result = self.__searchContentDirect(searchData, indexConf, cancelEvent, reportMatches, scope)
+            return addFacets(result, indexConf)
         finally:
             with self.lock:
                 del self.fti
@@ -58,37 +121,62 @@ class SearchMethods:
 
     def __searchContentIndexed(self, searchData: ContentQuery, indexConf: IndexConfiguration.IndexConfiguration,
                                commonKeywordMap: CommonKeywordMap, cancelEvent: Optional[threading.Event]=None,
-                               reportProgress: Optional[ProgressFunction]=None) -> ResultSet:
+                               reportProgress: Optional[ProgressFunction]=None, reportMatches: Optional[MatchesFunction]=None,
+                               pager: Optional[VerificationPager]=None, scope: Optional[Collection[str]]=None) -> ResultSet:
         perfReport = PerformanceReport()
         with perfReport.newAction("Init database"):
             with self.lock:
                 self.fti = FullTextIndex(indexConf.indexdb)
-            result = ResultSet(self.fti.searchContent(searchData, perfReport, commonKeywordMap, cancelEvent=cancelEvent, reportProgress=reportProgress), searchData, perfReport)
-        return result
+            fti = self.fti
+        encodingHints: EncodingHints = {}
+        skippedFiles: SkippedFiles = {}
+        return self.__cachedSearch(fti, searchData, indexConf, perfReport, cancelEvent,
+                                   lambda: fti.searchContent(searchData, perfReport, commonKeywordMap, cancelEvent=cancelEvent,
+                                                             reportProgress=reportProgress, reportMatches=reportMatches, pager=pager,
+                                                             encodingHints=encodingHints, skippedFiles=skippedFiles, scope=scope),
+                                   encodingHints, skippedFiles, scope)
+
+    def __cachedSearch(self, fti: FullTextIndex, searchData: Query, indexConf: IndexConfiguration.IndexConfiguration, perfReport: PerformanceReport,
+                       cancelEvent: Optional[threading.Event], search: Callable[[], SearchResult],
+                       encodingHints: Optional[EncodingHints] = None, skippedFiles: Optional[SkippedFiles] = None,
+                       scope: Optional[Collection[str]] = None) -> ResultSet:
+        generation = fti.indexGeneration()
+        if generation is not None:
+            cachedResult = getCachedResult(indexConf.indexdb, generation, searchData, perfReport)
+            if cachedResult is not None:
+                if scope is not None:
+                    scopeSet = set(scope)
+                    cachedResult = [match for match in cachedResult if match in scopeSet]
+                return ResultSet(cachedResult, searchData, perfReport, skipReasons=fti.skipReasons(cachedResult))
+        matches = search()
+        # The result of a canceled search or of a search which skipped files is incomplete. A scoped result is only
+        # a part of the result of the query.
+        if generation is not None and not self.cancelled and not (cancelEvent and cancelEvent.is_set()) and not skippedFiles and scope is None:
+            setCachedResult(indexConf.indexdb, generation, searchData, matches)
+        return ResultSet(matches, searchData, perfReport, encodingHints=encodingHints, skipReasons=fti.skipReasons(matches))
 
     def __searchContentDirect(self, searchData: ContentQuery, indexConf: IndexConfiguration.IndexConfiguration, 
-                              cancelEvent: Optional[threading.Event]=None) -> ResultSet:
-        matches: List[str] = []
-        for directory in indexConf.directories:
-            for dirName, fileName in IndexUpdater.genFind(indexConf.extensions, directory, indexConf.dirExcludes):
-                file = os.path.join(dirName, fileName)
-                if searchData.matchFolderAndExtensionFilter(file):
-                    try:
-                        for _ in searchData.matches(freadall(file), file):
-                            matches.append(file)
-                            break
-                    except:
-                        pass
-                if cancelEvent and cancelEvent.is_set():
-                    return ResultSet([], searchData)
+                              cancelEvent: Optional[threading.Event]=None, reportMatches: Optional[MatchesFunction]=None,
+                              scope: Optional[Collection[str]]=None) -> ResultSet:
+        if scope is not None:
+            # The files are known, there is nothing to walk
+            candidates = [name for name in scope if searchData.matchFolderAndExtensionFilter(name) and searchData.matchModifiedTime(name)]
+            matches = verifyFiles(searchData, candidates, cancelEvent, fileCount=len(candidates), reportMatches=reportMatches)
+        else:
+            matches = searchContentDirect(searchData, indexConf.extensions, indexConf.directories, indexConf.dirExcludes,
+                                          cancelEvent, reportMatches)
+        if matches is None or (cancelEvent and cancelEvent.is_set()):
+            return ResultSet([], searchData)
         matches = removeDupsAndSort(matches)
         return ResultSet(matches, searchData)
 
     def searchFileName(self, searchData: FileQuery, indexConf: IndexConfiguration.IndexConfiguration, cancelEvent: Optional[threading.Event]=None) -> ResultSet:
         try:
             if indexConf.isFileNameIndexed():
-                return self.__searchFileNameIndexed(searchData, indexConf, cancelEvent)
-            return self.__searchFileNameDirect(searchData, indexConf, cancelEvent)
+                result = self.__searchFileNameIndexed(searchData, indexConf, cancelEvent)
+            else:
+                result = self.__searchFileNameDirect(searchData, indexConf, cancelEvent)
+            return addFacets(result, indexConf)
         finally:
             with self.lock:
                 del self.fti
@@ -99,8 +187,9 @@ class SearchMethods:
         with perfReport.newAction("Init database"):
             with self.lock:
                 self.fti = FullTextIndex(indexConf.indexdb)
-            result = ResultSet(self.fti.searchFile(searchData, perfReport, cancelEvent=cancelEvent), searchData, perfReport)
-        return result
+            fti = self.fti
+        return self.__cachedSearch(fti, searchData, indexConf, perfReport, cancelEvent,
+                                   lambda: fti.searchFile(searchData, perfReport, cancelEvent=cancelEvent))
 
     def __searchFileNameDirect(self, searchData: FileQuery, indexConf: IndexConfiguration.IndexConfiguration, cancelEvent: Optional[threading.Event]=None) -> ResultSet:
         search = searchData.search
@@ -116,10 +205,13 @@ class SearchMethods:
                 reFlags = re.IGNORECASE
             searchPattern = re.compile(createPathMatchPattern(search, True), reFlags)
 
+        listing = listFiles(indexConf.extensions, indexConf.directories, indexConf.dirExcludes, cancelEvent)
+        if listing is None:
+            return ResultSet([], searchData)
+
         matches: List[str] = []
-        for directory in indexConf.directories:
-            for dirName, fileName in IndexUpdater.genFind(indexConf.extensions, directory, indexConf.dirExcludes):
-                fullPath = os.path.join(dirName, fileName)
+        for dirName, dirListing in listing.items():
+            for fileName in dirListing.files:
                 name, ext = os.path.splitext(fileName)
                 if not hasWildcards:
                     if bCaseSensitive:
@@ -130,18 +222,86 @@ class SearchMethods:
                             continue
                 elif not searchPattern.match(name):
                     continue
-                if searchData.matchFolderAndExtensionFilter(fullPath, ext=ext):
+                fullPath = os.path.join(dirName, fileName)
+                if searchData.matchFolderAndExtensionFilter(fullPath, ext=ext) and searchData.matchModifiedTime(fullPath):
                     matches.append(fullPath)
                 if cancelEvent and cancelEvent.is_set():
                     return ResultSet([], searchData)
         matches.sort()
         return ResultSet(matches, searchData)
 
+    def searchFileNameFuzzy(self, searchData: FileQuery, indexConf: IndexConfiguration.IndexConfiguration, limit: int = maxFuzzyResults,
+                            cancelEvent: Optional[threading.Event]=None) -> ResultSet:
+        """Finds files by an abbreviation of their name, the extension is matched by the extension filter like for
+           other name searches. The result is ordered by rank, not by name. Locations without file name index use the
+           cached file listing."""
+        pattern = searchData.search
+        if indexConf.isFileNameIndexed():
+            matches = FullTextIndex(indexConf.indexdb).findFilesFuzzy(pattern, limit)
+        else:
+            listing = cachedFileListing(indexConf.extensions, indexConf.directories, indexConf.dirExcludes)
+            if listing is None:
+                listing = listFiles(indexConf.extensions, indexConf.directories, indexConf.dirExcludes, cancelEvent)
+            if listing is None:
+                return ResultSet()
+            index, paths = listingFileNameIndex(listing)
+            matches = [paths[i] for _, i in index.find(pattern, limit)]
+        matches = [match for match in matches if searchData.matchFolderAndExtensionFilter(match) and searchData.matchModifiedTime(match)]
+        return ResultSet(matches, searchData)
+
     def cancel(self) -> None:
         with self.lock:
+            self.cancelled = True
             if self.fti:
                 self.fti.interrupt()
 
+def isFuzzyFinderLoaded(indexConf: IndexConfiguration.IndexConfiguration) -> bool:
+    """True if the fuzzy file name search answers without reading the names first."""
+    if indexConf.isFileNameIndexed():
+        return FullTextIndex(indexConf.indexdb).isFuzzyFinderLoaded()
+    listing = cachedFileListing(indexConf.extensions, indexConf.directories, indexConf.dirExcludes)
+    return listing is not None
+
+def prefetchFuzzyFinder(indexConf: IndexConfiguration.IndexConfiguration) -> None:
+    """Reads the names for the fuzzy file name search in the background."""
+    if indexConf.isFileNameIndexed():
+        prefetchFileNameIndex(indexConf.indexdb)
+    else:
+        prefetchFileListing(indexConf.extensions, indexConf.directories, indexConf.dirExcludes)
+
+def completeKeyword(prefix: str, indexConf: IndexConfiguration.IndexConfiguration, limit: int = maxCompletions) -> List[Tuple[str, int]]:
+    """Returns the keywords of the location which start with the prefix as (keyword, document count), the most common first.
+       Only locations with content index know their keywords."""
+    if not indexConf.isContentIndexed():
+        return []
+    return FullTextIndex(indexConf.indexdb).completeKeyword(prefix, limit)
+
+def addFacets(result: ResultSet, indexConf: IndexConfiguration.IndexConfiguration) -> ResultSet:
+    """Counts the matches of the result per directory and extension. This is done in the search thread, the UI only displays the counts."""
+    if result.perfReport:
+        with result.perfReport.newAction("Computing facets"):
+            result.facets = computeFacets(result.matches, indexConf.directories)
+    else:
+        result.facets = computeFacets(result.matches, indexConf.directories)
+    return result
+
+def orderByRecency(matches: SearchResult, indexConf: IndexConfiguration.IndexConfiguration, cancelEvent: Optional[threading.Event]=None) -> SearchResult:
+    """Returns the matches ordered by their modification time, the most recently modified first. The times are taken
+       from the index, only files which are not indexed are asked for their modification time. 'cancelEvent' is
+       deliberately unused, it is only accepted because AsynchronousTask passes it. The ordering can't be canceled."""
+    timestamps: Dict[str, float] = {}
+    if indexConf.isContentIndexed() or indexConf.isFileNameIndexed():
+        timestamps = FullTextIndex(indexConf.indexdb).documentTimestamps(matches)
+    def modified(name: str) -> float:
+        mtime = timestamps.get(name)
+        if mtime is None:
+            try:
+                mtime = os.stat(name).st_mtime
+            except OSError:
+                mtime = 0.0
+        return mtime
+    return sorted(matches, key=lambda name: (-modified(name), name))
+
 def removeDupsAndSort(matches: SearchResult) -> SearchResult:
     """Remove duplicates and sort"""
     uniqueMatches = set()
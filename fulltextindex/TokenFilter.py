@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# The token filter keeps tokens out of the index which are almost never searched but make up a large part of the
+# keywords: numbers, hex blobs like GUIDs or hashes and long runs of encoded data. Each of them is usually a keyword
+# with a single document. The filter the index was built with is stored in the database. A search for a keyword
+# which the filter may have removed can't use the index for it and reads the files instead.
+
+import re
+import json
+import unittest
+from typing import Iterable, Optional
+
+__all__ = ['TokenFilter', 'hexBlobLength']
+
+# Hex blobs are at least this long, shorter ones are too likely to be words or identifiers
+hexBlobLength = 8
+
+# Decimal and hexadecimal numbers
+reNumber = re.compile(r"[0-9]+|0x[0-9a-f]+")
+# Only hex digits and at least one decimal digit, e.g. '3f2504e0'. Words like 'deadbeef' are kept.
+reHexBlob = re.compile(r"(?=[a-f]*[0-9])[0-9a-f]{%u,}" % hexBlobLength)
+# The fixed characters of patterns which may match a number or a hex blob. Both contain a digit, patterns
+# without digit like 'def*' are resolved by the index.
+reNumberPart = re.compile(r"(?=.*[0-9])(?:[0-9]+|0?x[0-9a-f]*)")
+reHexBlobPart = re.compile(r"(?=.*[0-9])[0-9a-f]+")
+
+class TokenFilter:
+    """'minLength' and 'maxLength' limit the length of the indexed tokens, 0 means no limit. Files with one of the
+       'unfilteredExtensions' are indexed completely."""
+    def __init__(self, minLength: int = 0, maxLength: int = 0, skipNumbers: bool = False, skipHexBlobs: bool = False,
+                 unfilteredExtensions: Iterable[str] = ()) -> None:
+        self.minLength = minLength
+        self.maxLength = maxLength
+        self.skipNumbers = skipNumbers
+        self.skipHexBlobs = skipHexBlobs
+        self.unfilteredExtensions = sorted(set(unfilteredExtensions))
+
+    def isActive(self) -> bool:
+        return self.minLength > 1 or self.maxLength > 0 or self.skipNumbers or self.skipHexBlobs
+
+    def appliesTo(self, ext: str) -> bool:
+        """True if the tokens of files with the extension are filtered. 'ext' is lower case and includes the dot."""
+        return self.isActive() and ext not in self.unfilteredExtensions
+
+    def isFiltered(self, keyword: str) -> bool:
+        """True if the lower case keyword is not indexed."""
+        length = len(keyword)
+        if length < self.minLength or (self.maxLength and length > self.maxLength):
+            return True
+        if self.skipNumbers and reNumber.fullmatch(keyword):
+            return True
+        if self.skipHexBlobs and length >= hexBlobLength and reHexBlob.fullmatch(keyword):
+            return True
+        return False
+
+    def mayHideMatches(self, keyword: str) -> bool:
+        """True if the index may miss documents which contain the lower case keyword. Wildcard patterns may match
+           filtered keywords if their fixed characters are too short or look like a part of a number or a hex blob.
+           Tokens longer than 'maxLength' are not searched by patterns."""
+        if "*" not in keyword:
+            return self.isFiltered(keyword)
+        literal = keyword.replace("*", "")
+        if len(literal) < self.minLength:
+            return True
+        if self.skipNumbers and reNumberPart.fullmatch(literal):
+            return True
+        if self.skipHexBlobs and reHexBlobPart.fullmatch(literal):
+            return True
+        return False
+
+    def toJson(self) -> str:
+        return json.dumps(self.__dict__, sort_keys=True)
+
+    @staticmethod
+    def fromJson(text: str) -> Optional['TokenFilter']:
+        """Returns the filter stored by toJson or None if the text is empty or invalid."""
+        try:
+            values = json.loads(text)
+            return TokenFilter(int(values["minLength"]), int(values["maxLength"]), bool(values["skipNumbers"]),
+                               bool(values["skipHexBlobs"]), values["unfilteredExtensions"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+class TestTokenFilter(unittest.TestCase):
+    def test(self) -> None:
+        self.assertFalse(TokenFilter().isActive())
+        self.assertFalse(TokenFilter(minLength=1).isActive())
+        tokenFilter = TokenFilter(2, 20, True, True, [".json"])
+        self.assertTrue(tokenFilter.appliesTo(".c"))
+        self.assertFalse(tokenFilter.appliesTo(".json"))
+        for keyword in ["x", "a" * 21, "42", "0x1f", "3f2504e0", "0305e82c3301", "12345678"]:
+            self.assertTrue(tokenFilter.isFiltered(keyword), keyword)
+        for keyword in ["id", "a" * 20, "utf8", "4f89", "deadbeef", "x86", "0xzz", "base64"]:
+            self.assertFalse(tokenFilter.isFiltered(keyword), keyword)
+
+    def test_patterns(self) -> None:
+        tokenFilter = TokenFilter(2, 20, True, False)
+        for keyword in ["42", "a*", "12*", "*0x*", "*"]:
+            self.assertTrue(tokenFilter.mayHideMatches(keyword), keyword)
+        for keyword in ["foo", "foo*", "*bar", "get*value"]:
+            self.assertFalse(tokenFilter.mayHideMatches(keyword), keyword)
+        # Only patterns which look like a part of a number or a hex blob may match them
+        tokenFilter = TokenFilter(skipNumbers=True, skipHexBlobs=True)
+        for keyword in ["12*", "*0x*", "0x1f*", "3f25*", "*face1*"]:
+            self.assertTrue(tokenFilter.mayHideMatches(keyword), keyword)
+        for keyword in ["def*", "add*", "face*", "*cafe*", "get*"]:
+            self.assertFalse(tokenFilter.mayHideMatches(keyword), keyword)
+
+    def test_json(self) -> None:
+        tokenFilter = TokenFilter(2, 20, True, False, [".json", ".js"])
+        restored = TokenFilter.fromJson(tokenFilter.toJson())
+        assert restored
+        self.assertEqual(restored.toJson(), tokenFilter.toJson())
+        self.assertIsNone(TokenFilter.fromJson(""))
+        self.assertIsNone(TokenFilter.fromJson("{}"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2025 Oliver Tengler
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+# Verification reads candidate files and checks if the query really matches. The index only tells which files
+# contain the keywords of a query. Reading files from network shares is dominated by latency, therefore the
+# files are read by a pool of threads. Optionally a pool of processes is used which also runs the regular
+# expressions and the comment detection in parallel.
+#
+# Most candidates are plain ASCII files. For these the raw bytes are searched with a bytes expression which
+# gives the same answer as the str expression on the decoded text. The file is only decoded if it contains
+# other characters or if the matches need to be checked against comments. Every file is read only once.
+#
+# Regular expressions entered by the user and '**N' word gaps may backtrack for minutes on a single file. Queries
+# which contain them are verified by guarded worker processes. A file which exceeds the time budget is abandoned
+# and reported as skipped, the same happens to all remaining files once the budget of the search is exhausted.
+
+import os
+import re
+import sys
+import mmap
+import time
+import codecs
+import logging
+import functools
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor, BrokenExecutor
+from typing import Iterable, Iterator, List, Tuple, Optional, Callable, Deque, Union, Dict, BinaryIO
+from tools.FileTools import Encoding, decodeText
+from .CommentRule import CommentRule
+from .Query import ContentQuery, CompiledMatcher, TokenType
+from .RegExGuard import GuardedWorker
+
+__all__ = ['configureVerification', 'verificationThreads', 'verificationProcesses', 'configureRegExBudget', 'isGuarded',
+           'matchesFile', 'verifyFiles', 'MatchesFunction', 'VerificationPager', 'EncodingHints', 'SkippedFiles']
+
+ProgressFunction = Callable[[int], None]
+
+# Receives matches as soon as they are verified
+MatchesFunction = Callable[[List[str]], None]
+
+# Maps the full path of a file to the encoding detected by the index update
+EncodingHints = Dict[str, Encoding]
+
+# Maps the full path of a file which was not verified to the reason
+SkippedFiles = Dict[str, str]
+
+VerificationTask = List[Tuple[str, Optional[CommentRule], Optional[Encoding]]]
+
+defaultThreads = 8
+
+# Number of files verified by one task of the process pool. Passing the query to another process is not free.
+processBatchSize = 16
+
+# Number of tasks which are queued per worker. Limits the memory used for files which are read ahead.
+tasksPerWorker = 4
+
+# Verifications of less files are never paused by a VerificationPager
+pagingThreshold = 2000
+
+# Files of at least this size are memory mapped instead of read
+mmapThreshold = 256 * 1024
+
+# Files which are read while the verification can be canceled are read in blocks of this size
+readBlockSize = 1024 * 1024
+
+reNonAscii = re.compile(rb"[\x80-\xff]")
+
+# Time in seconds a guarded query may spend on a single file and on all files
+defaultFileBudget = 10.0
+defaultSearchBudget = 300.0
+
+_threads = defaultThreads
+_processes = 0
+_executor: Optional[Executor] = None
+_executorLock = threading.Lock()
+_fileBudget = defaultFileBudget
+_searchBudget = defaultSearchBudget
+_idleGuards: List[GuardedWorker] = []
+
+def configureVerification(threads: int, processes: int = 0) -> None:
+    """Sets the number of threads and processes used to verify files. With less than two threads and no processes
+       the files are verified sequentially by the calling thread. If processes is greater than zero a process
+       pool is used instead of threads."""
+    global _threads, _processes, _executor
+    threads = max(threads, 1)
+    processes = max(processes, 0)
+    with _executorLock:
+        if threads == _threads and processes == _processes:
+            return
+        _threads = threads
+        _processes = processes
+        if _executor:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def configureRegExBudget(fileBudget: float, searchBudget: float) -> None:
+    """Sets the time in seconds which a query with a user defined expression or word gap may spend on one file and
+       on all files. Zero means no limit. Without any limit such queries are not guarded."""
+    global _fileBudget, _searchBudget
+    _fileBudget = max(fileBudget, 0.0)
+    _searchBudget = max(searchBudget, 0.0)
+
+def isGuarded(query: ContentQuery) -> bool:
+    """True if the files are verified by worker processes which are killed if the query exceeds its time budget."""
+    if not _fileBudget and not _searchBudget:
+        return False
+    return query.hasPartTypeEqualTo(TokenType.RegExPart) or query.hasPartTypeEqualTo(TokenType.MatchWordsPart)
+
+def verificationThreads() -> int:
+    return _threads
+
+def verificationProcesses() -> int:
+    return _processes
+
+def __getExecutor() -> Tuple[Optional[Executor], int, int]:
+    """Returns the executor, the number of workers and the batch size."""
+    global _executor
+    with _executorLock:
+        if _processes > 0:
+            if not _executor:
+                _executor = ProcessPoolExecutor(_processes)
+            return _executor, _processes, processBatchSize
+        if _threads > 1:
+            if not _executor:
+                _executor = ThreadPoolExecutor(_threads, thread_name_prefix="Verification")
+            return _executor, _threads, 1
+        return None, 1, 1
+
+def __discardExecutor(executor: Executor) -> None:
+    global _executor
+    with _executorLock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def _searchBytes(query: ContentQuery, matcher: CompiledMatcher, data: Union[bytes, mmap.mmap]) -> Optional[bool]:
+    """Searches the undecoded content of an ASCII file. Returns None if the file needs to be decoded to get the answer."""
+    start = 0
+    if data[:3] == codecs.BOM_UTF8:
+        start = 3
+    elif data[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        return None
+    # Unicode character classes and case folding only behave like their ASCII counterparts on ASCII text
+    if reNonAscii.search(data, start):
+        return None
+    # The decoded text has universal newlines. A user defined expression might depend on this.
+    if query.hasPartTypeEqualTo(TokenType.RegExPart) and data.find(b"\r", start) != -1:
+        return None
+    if not matcher.mayMatchBytes(data, start):
+        return False
+    assert matcher.bytesRegEx is not None
+    return matcher.bytesRegEx.search(data, start) is not None
+
+def _matchesContent(query: ContentQuery, data: Union[bytes, mmap.mmap], commentRule: Optional[CommentRule],
+                    encodingHint: Optional[Encoding], cancelEvent: Optional[threading.Event]=None) -> bool:
+    matcher = query.matcher()
+    match = _searchBytes(query, matcher, data) if matcher.bytesRegEx is not None else None
+    if match is False:
+        return False
+    if match and (not query.bExcludeComments or commentRule is None):
+        return True
+    text = decodeText(data[:], encodingHint=encodingHint)[0]
+    for _ in query.matchesWithCommentRule(text, commentRule):
+        return True
+    return False
+
+def _readCancelable(file: BinaryIO, cancelEvent: threading.Event) -> Optional[bytes]:
+    """Reads the file in blocks. Returns None if the read is canceled."""
+    blocks = []
+    while block := file.read(readBlockSize):
+        if cancelEvent.is_set():
+            return None
+        blocks.append(block)
+    return b"".join(blocks)
+
+def matchesFile(query: ContentQuery, fullpath: str, commentRule: Optional[CommentRule], encodingHint: Optional[Encoding]=None,
+                cancelEvent: Optional[threading.Event]=None) -> bool:
+    """Returns true if the content of the file matches the query. Files which can't be read don't match.
+       'encodingHint' is the encoding which was detected when the file was indexed. If 'cancelEvent' is passed
+       large files are read in blocks and the reading stops as soon as the event is set."""
+    try:
+        # The file is read once, the bytes are searched directly or decoded in memory
+        with open(fullpath, "rb") as file:
+            if os.fstat(file.fileno()).st_size < mmapThreshold:
+                return _matchesContent(query, file.read(), commentRule, encodingHint)
+            if cancelEvent:
+                content = _readCancelable(file, cancelEvent)
+                return content is not None and _matchesContent(query, content, commentRule, encodingHint)
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _matchesContent(query, data, commentRule, encodingHint)
+    except:
+        pass
+    return False
+
+def _verifyTask(query: ContentQuery, task: VerificationTask, cancelEvent: Optional[threading.Event]=None) -> List[bool]:
+    return [matchesFile(query, fullpath, commentRule, encodingHint, cancelEvent) for fullpath, commentRule, encodingHint in task]
+
+def _batches(query: ContentQuery, files: Iterable[str], batchSize: int, encodingHints: Optional[EncodingHints]) -> Iterator[VerificationTask]:
+    # The comment rule is determined here because the fetcher is usually not thread safe and can't be passed to another process
+    task: VerificationTask = []
+    for fullpath in files:
+        task.append((fullpath, query.commentRuleFor(fullpath), encodingHints.get(fullpath) if encodingHints else None))
+        if len(task) >= batchSize:
+            yield task
+            task = []
+    if task:
+        yield task
+
+def _acquireGuard() -> GuardedWorker:
+    with _executorLock:
+        if _idleGuards:
+            return _idleGuards.pop()
+    return GuardedWorker(matchesFile)
+
+def _releaseGuard(guard: GuardedWorker) -> None:
+    with _executorLock:
+        # Keep the processes of one verification alive for the next one
+        if len(_idleGuards) < max(_threads, _processes):
+            _idleGuards.append(guard)
+            return
+    guard.close()
+
+class _GuardedVerification:
+    """Verifies the files of a query by guarded workers. The tasks run in several threads, each one uses its own worker."""
+    def __init__(self, cancelEvent: Optional[threading.Event], skippedFiles: Optional[SkippedFiles]) -> None:
+        self.cancelEvent = cancelEvent
+        self.skippedFiles = skippedFiles
+        self.deadline = time.monotonic() + _searchBudget if _searchBudget else None
+        self.fileBudget = _fileBudget or float("inf")
+        self.lock = threading.Lock()
+
+    def skip(self, fullpath: str, reason: str) -> None:
+        if self.skippedFiles is not None:
+            with self.lock:
+                self.skippedFiles[fullpath] = reason
+
+    def verifyTask(self, query: ContentQuery, task: VerificationTask) -> List[bool]:
+        guard = _acquireGuard()
+        try:
+            return [self.__verify(guard, query, fullpath, commentRule, encodingHint) for fullpath, commentRule, encodingHint in task]
+        finally:
+            _releaseGuard(guard)
+
+    def __verify(self, guard: GuardedWorker, query: ContentQuery, fullpath: str, commentRule: Optional[CommentRule],
+                 encodingHint: Optional[Encoding]) -> bool:
+        if self.cancelEvent and self.cancelEvent.is_set():
+            return False
+        timeout = self.fileBudget
+        if self.deadline is not None:
+            timeout = min(timeout, self.deadline - time.monotonic())
+            if timeout <= 0:
+                self.skip(fullpath, "search exceeded %g s" % (_searchBudget,))
+                return False
+        try:
+            finished, match = guard.call(query, (fullpath, commentRule, encodingHint), timeout, self.cancelEvent)
+        except RuntimeError as e:
+            self.skip(fullpath, str(e))
+            return False
+        if finished:
+            return bool(match)
+        if not (self.cancelEvent and self.cancelEvent.is_set()):
+            if timeout < self.fileBudget:
+                self.skip(fullpath, "search exceeded %g s" % (_searchBudget,))
+            else:
+                self.skip(fullpath, "file exceeded %g s" % (_fileBudget,))
+        return False
+
+class VerificationPager:
+    """Pauses a verification of many files in path order once enough matches for the next page have been found.
+       The consumer requests more matches when it needs them, e.g. if the user scrolls to the end of the result list.
+       All members are accessed by the verifying thread and the consumer."""
+    def __init__(self, pageSize: int, minCandidates: int = pagingThreshold) -> None:
+        self.pageSize = max(pageSize, 1)
+        self.minCandidates = minCandidates
+        self.__condition = threading.Condition()
+        self.__limit = self.pageSize
+        self.__candidates = 0
+        self.__verified = 0
+        self.__matches = 0
+        self.__paging = False
+        self.__paused = False
+
+    def requestMore(self) -> None:
+        """Continues the verification until another page of matches has been found."""
+        with self.__condition:
+            self.__limit = max(self.__limit, self.__matches + self.pageSize)
+            self.__condition.notify_all()
+
+    def requestAll(self) -> None:
+        with self.__condition:
+            self.__limit = sys.maxsize
+            self.__condition.notify_all()
+
+    def isPaused(self) -> bool:
+        with self.__condition:
+            return self.__paused
+
+    def estimatedMatches(self) -> Optional[int]:
+        """Extrapolates the number of matches of all candidates from the files verified so far. Returns None if
+           the verification is not paged."""
+        with self.__condition:
+            if not self.__paging or not self.__verified or self.__verified >= self.__candidates:
+                return None
+            return round(self.__matches * self.__candidates / self.__verified)
+
+    def _start(self, candidates: int) -> bool:
+        with self.__condition:
+            self.__candidates = candidates
+            self.__paging = candidates >= self.minCandidates
+            return self.__paging
+
+    def _mustPause(self, verified: int, matches: int) -> bool:
+        with self.__condition:
+            self.__verified = verified
+            self.__matches = matches
+            self.__paused = matches >= self.__limit
+            return self.__paused
+
+    def _wait(self, cancelEvent: Optional[threading.Event]) -> None:
+        """Waits until more matches are requested or the verification is canceled."""
+        with self.__condition:
+            while self.__matches >= self.__limit:
+                if cancelEvent and cancelEvent.is_set():
+                    break
+                # The cancel event can't notify the condition, check it regularly
+                self.__condition.wait(0.1)
+            self.__paused = False
+
+def verifyFiles(query: ContentQuery, files: Iterable[str], cancelEvent: Optional[threading.Event]=None,
+                reportProgress: Optional[ProgressFunction]=None, fileCount: int = 0,
+                reportMatches: Optional[MatchesFunction]=None, pager: Optional[VerificationPager]=None,
+                encodingHints: Optional[EncodingHints]=None, skippedFiles: Optional[SkippedFiles]=None) -> Optional[List[str]]:
+    """Returns the files which match the query in the order of 'files'. If the verification is canceled None is returned.
+       'fileCount' is the number of files and only needed to report the progress. 'reportMatches' receives the matches
+       in batches while the verification is running. If 'pager' is passed the verification of 'fileCount' files is
+       paused after each page of matches. 'encodingHints' spare the attempt to decode files as UTF8 which aren't.
+       Files which exceeded the time budget of a guarded query are added to 'skippedFiles'."""
+    verifyTask: Callable[[ContentQuery, VerificationTask], List[bool]] = _verifyTask
+    guardExecutor: Optional[Executor] = None
+    if isGuarded(query):
+        guarded = _GuardedVerification(cancelEvent, skippedFiles)
+        verifyTask = guarded.verifyTask
+        # The threads only wait for the worker processes
+        workers, batchSize = max(_threads, _processes), 1
+        if workers > 1:
+            guardExecutor = ThreadPoolExecutor(workers, thread_name_prefix="GuardedVerification")
+        executor = guardExecutor
+    else:
+        executor, workers, batchSize = __getExecutor()
+        if cancelEvent and not isinstance(executor, ProcessPoolExecutor):
+            # Threads see the event and can stop reading a large file, an event can't be passed to another process
+            verifyTask = functools.partial(_verifyTask, cancelEvent=cancelEvent)
+    if pager and not pager._start(fileCount):
+        pager = None
+
+    result: List[str] = []
+    done = 0
+    lastProgress = None
+    pending: Deque[Tuple[VerificationTask, Future[List[bool]]]] = deque()
+    tasks = _batches(query, files, batchSize, encodingHints)
+    try:
+        while True:
+            if executor:
+                # Keep the pool busy but don't read all files ahead
+                for task in tasks:
+                    pending.append((task, executor.submit(verifyTask, query, task)))
+                    if len(pending) >= workers * tasksPerWorker:
+                        break
+                if not pending:
+                    break
+                task, future = pending.popleft()
+                try:
+                    matches = future.result()
+                except Exception as e:
+                    # E.g. a broken process pool, verify the task in this thread
+                    logging.warning("Verification failed: %s", str(e))
+                    if isinstance(e, BrokenExecutor):
+                        __discardExecutor(executor)
+                        executor = None
+                    matches = verifyTask(query, task)
+            else:
+                if pending:
+                    # Left over from a broken executor
+                    task = pending.popleft()[0]
+                else:
+                    nextTask = next(tasks, None)
+                    if nextTask is None:
+                        break
+                    task = nextTask
+                matches = verifyTask(query, task)
+
+            newMatches = [fullpath for (fullpath, _, _), match in zip(task, matches) if match]
+            result.extend(newMatches)
+
+            if cancelEvent and cancelEvent.is_set():
+                return None
+
+            if reportMatches and newMatches:
+                reportMatches(newMatches)
+
+            done += len(task)
+            if reportProgress and fileCount:
+                progress = int((done*100)/fileCount)
+                if lastProgress != progress:
+                    lastProgress = progress
+                    reportProgress(progress)
+
+            if pager and pager._mustPause(done, len(result)):
+                # Tell the consumer that the verification is paused
+                if reportProgress and lastProgress is not None:
+                    reportProgress(lastProgress)
+                pager._wait(cancelEvent)
+                if cancelEvent and cancelEvent.is_set():
+                    return None
+    finally:
+        for _, future in pending:
+            future.cancel()
+        if guardExecutor:
+            guardExecutor.shutdown(wait=False)
+    return result
@@ -17,15 +17,30 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
+import re
+import threading
 import unittest
 import shutil
 import stat
-from typing import Callable, List
-from .FullTextIndex import FullTextIndex, Keyword, buildMapFromCommonKeywordFile
-from .Query import ContentQuery, FileQuery, QueryParams
-from .IndexUpdater import IndexUpdater, UpdateStatistics, genFind
+import time
+import codecs
+import sqlite3
+from typing import Callable, List, Tuple, Optional, Set
+from .FullTextIndex import FullTextIndex, Keyword, buildMapFromCommonKeywordFile, FullScanRequired
+from .Query import ContentQuery, FileQuery, QueryParams, PerformanceReport, modifiedWithin
+from tools.FileTools import Encoding
+from .IndexUpdater import IndexUpdater, UpdateStatistics, genFind, genTokens, tokenizeChunkSize
 from .IndexConfiguration import IndexConfiguration, IndexType, IndexMode
-from .SearchMethods import SearchMethods
+from .CommentRule import CommentRule
+from .SearchMethods import SearchMethods, clearResultCache, orderByRecency
+from .Verification import configureVerification, verifyFiles, defaultThreads, VerificationPager, matchesFile, mmapThreshold, \
+                          configureRegExBudget, defaultFileBudget, defaultSearchBudget, isGuarded, SkippedFiles
+from .KeywordDictionary import KeywordDictionary, dictionaryName, fileNameDictionaryName
+from .FileSearch import searchFile, escapeFileName, documentFilter
+from .DirectSearch import findFiles, listFiles, clearFileListings, Listing
+from .KeywordCaching import LruCache, clearCaches, postingCacheStatistics
+from .TokenFilter import TokenFilter
+from .ContentSniffer import ContentSniffer, SkipReason
 
 def delFile (name: str) -> None:
     try:
@@ -682,6 +697,866 @@ class TestGenFindWildcardExcludes(unittest.TestCase):
         result = list(genFind({".c", ".o"}, self.testDir, ["*nonexistent*", "*xyz*"]))
         self.assertEqual(len(result), 4)
 
+    def test_parallel_find(self) -> None:
+        """The parallel directory walk finds the same files as genFind."""
+        for excludes in ([], ["*build"], ["*out*"], ["*.git*", "*node_modules"]):
+            for extensions in ({".c", ".o", ".js", "."}, {".c"}):
+                expected = {os.path.join(d, f) for d, f in genFind(extensions, self.testDir, excludes)}
+                self.assertEqual(set(findFiles(extensions, [self.testDir], excludes, threads=3)), expected)
+
+    def test_parallel_find_cancel(self) -> None:
+        cancelEvent = threading.Event()
+        cancelEvent.set()
+        self.assertEqual(list(findFiles({".c"}, [self.testDir], cancelEvent=cancelEvent)), [])
+        self.assertIsNone(listFiles({".c"}, [self.testDir], cancelEvent=cancelEvent))
+
+    def test_file_listing(self) -> None:
+        """The cached listing contains the files found by genFind and lists only modified directories again."""
+        def files(listing: Optional[Listing]) -> Set[str]:
+            assert listing is not None
+            return {os.path.join(d, f) for d, entry in listing.items() for f in entry.files}
+        past = time.time() - 60
+        def ageDirectories() -> None:
+            for path, _, _ in os.walk(self.testDir):
+                os.utime(path, (past, past))
+
+        clearFileListings()
+        try:
+            extensions, excludes = {".c", ".o", ".js", "."}, ["*build"]
+            expected = {os.path.join(d, f) for d, f in genFind(extensions, self.testDir, excludes)}
+            first = listFiles(extensions, [self.testDir], excludes)
+            self.assertEqual(files(first), expected)
+
+            ageDirectories()
+            second = listFiles(extensions, [self.testDir], excludes)
+            self.assertEqual(files(second), expected)
+            third = listFiles(extensions, [self.testDir], excludes)
+            assert second is not None and third is not None
+            # Unmodified directories are taken from the previous listing
+            for directory, entry in third.items():
+                self.assertIs(entry, second[directory])
+
+            src = os.path.join(self.testDir, "src")
+            with open(os.path.join(src, "new.c"), "w") as fp:
+                fp.write("test")
+            fourth = listFiles(extensions, [self.testDir], excludes)
+            assert fourth is not None
+            self.assertEqual(files(fourth), expected | {os.path.join(src, "new.c")})
+            self.assertIsNot(fourth[src], third[src])
+            self.assertIs(fourth[self.testDir], third[self.testDir])
+        finally:
+            clearFileListings()
+
+
+class TestKeywordDictionary(unittest.TestCase):
+    """The keyword dictionary must resolve wildcards exactly like the LIKE query on the keywords table."""
+
+    def setUp(self) -> None:
+        self.testDir = "test_kwdict"
+        self.testDb = "test-kwdict.dat"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        with open(os.path.join(self.testDir, "a.c"), "w", encoding="utf-8") as fp:
+            fp.write("getValue setValue get_value value_get getter forget target\n")
+        with open(os.path.join(self.testDir, "b.c"), "w", encoding="utf-8") as fp:
+            fp.write("größe grün setter valueSet g x_y_z getValueOfMap\n")
+        delFile(self.testDb)
+        self.updater = IndexUpdater(self.testDb)
+        self.updater.updateIndex(IndexConfiguration("test", ".c", self.testDir))
+        generation = self.updater.indexGeneration()
+        assert generation
+        self.dictionary = KeywordDictionary(dictionaryName(self.testDb, generation))
+
+    def tearDown(self) -> None:
+        self.dictionary.close()
+        del self.updater
+        delDir(self.testDir)
+        for name in os.listdir("."):
+            if name.startswith(self.testDb):
+                delFile(name)
+
+    def __like(self, pattern: str) -> List[str]:
+        q = self.updater.conn.cursor()
+        q.execute("SELECT keyword FROM keywords WHERE keyword LIKE ? ESCAPE '!'", (pattern.replace("_", "!_").replace("*", "%"),))
+        return sorted(r[0] for r in q.fetchall())
+
+    def test_patterns(self) -> None:
+        for pattern in ["get*", "*value", "*val*", "*et*", "g*t", "*e*t*", "*_*", "gr*", "*ße", "*", "g", "getvalue", "missing*", "*missing", "*missing*"]:
+            result = self.dictionary.lookup(pattern)
+            self.assertEqual(sorted(name for _, name in result), self.__like(pattern), pattern)
+
+    def test_ids(self) -> None:
+        q = self.updater.conn.cursor()
+        for kwID, name in self.dictionary.lookup("*"):
+            q.execute("SELECT id FROM keywords WHERE keyword=?", (name,))
+            self.assertEqual(q.fetchone()[0], kwID)
+
+    def test_complete(self) -> None:
+        """Completions are ranked by the number of documents which contain them."""
+        with open(os.path.join(self.testDir, "c.c"), "w", encoding="utf-8") as fp:
+            fp.write("setter\n")
+        self.updater.updateIndex(IndexConfiguration("test", ".c", self.testDir))
+        generation = self.updater.indexGeneration()
+        assert generation
+        dictionary = KeywordDictionary(dictionaryName(self.testDb, generation))
+        try:
+            self.assertEqual(dictionary.complete("set", 10)[0], ("setter", 2))
+            self.assertEqual(sorted(dictionary.complete("set", 10)), [("setter", 2), ("setvalue", 1)])
+            self.assertEqual(dictionary.complete("get", 2)[0][1], 1)
+            self.assertEqual(len(dictionary.complete("get", 2)), 2)
+            self.assertEqual(dictionary.complete("missing", 10), [])
+        finally:
+            dictionary.close()
+        fti = FullTextIndex(self.testDb)
+        self.assertEqual(fti.completeKeyword("SET", 1), [("setter", 2)])
+
+    def test_search(self) -> None:
+        fti = FullTextIndex(self.testDb)
+        result = fti.searchContent(ContentQuery(QueryParams("*valueof*")))
+        self.assertEqual(result, [os.path.join(self.testDir, "b.c")])
+        result = fti.searchContent(ContentQuery(QueryParams("*get")))
+        self.assertEqual(result, [os.path.join(self.testDir, "a.c")])
+
+    def test_file_names(self) -> None:
+        """The file name dictionary resolves '*' and '?' like the LIKE query on the fileName table."""
+        for name in ["FooController.c", "BarController.h", "controller.c", "Größe.c", "Grüße.h", "net_socket.c", "netxsocket.c"]:
+            with open(os.path.join(self.testDir, name), "w", encoding="utf-8") as fp:
+                fp.write("content\n")
+        self.updater.updateIndex(IndexConfiguration("test", ".c,.h", self.testDir))
+        generation = self.updater.indexGeneration()
+        assert generation
+        dictionary = KeywordDictionary(fileNameDictionaryName(self.testDb, generation))
+        try:
+            q = self.updater.conn.cursor()
+            for pattern in ["*controller*", "*controller", "foo*", "gr??e", "gr?*e", "net_socket", "net?socket", "*_*", "*", "?", "missing*"]:
+                q.execute("SELECT id,name FROM fileName WHERE name LIKE ? ESCAPE '!'", (escapeFileName(pattern),))
+                self.assertEqual(sorted(dictionary.lookup(pattern, True)), sorted(q.fetchall()), pattern)
+
+            for search in ["*controller*", "*Controller.h", "gr??e", "*", "net_*"]:
+                query = FileQuery(QueryParams(search))
+                self.assertEqual(searchFile(q, query, None, dictionary), searchFile(q, query), search)
+            fti = FullTextIndex(self.testDb)
+            self.assertEqual(fti.searchFile(FileQuery(QueryParams("*controller"))),
+                             [os.path.join(self.testDir, name) for name in ["BarController.h", "FooController.c", "controller.c"]])
+        finally:
+            dictionary.close()
+
+
+class TestSubTokens(unittest.TestCase):
+    """'^part' finds the same files with and without indexed identifier parts."""
+
+    def setUp(self) -> None:
+        self.testDir = "test_subtokens"
+        self.testDb = "test-subtokens.dat"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        for name, text in [("a.c", "createTcpSocketHandler()\n"), ("b.c", "int tcp_socket;\n"), ("c.c", "websocket sockethandler\n"),
+                           ("d.c", "SOCKET s;\n"), ("e.c", "HTTPServer\n")]:
+            with open(os.path.join(self.testDir, name), "w", encoding="utf-8") as fp:
+                fp.write(text)
+        delFile(self.testDb)
+        clearCaches()
+        clearResultCache()
+
+    def tearDown(self) -> None:
+        delDir(self.testDir)
+        for name in os.listdir("."):
+            if name.startswith(self.testDb):
+                delFile(name)
+
+    searches = ["<^socket^>", "<^handler^>", "<^server^>", "<^http^>", "<^tcp^> <^socket^>"]
+
+    def __search(self, search: str) -> List[str]:
+        result = FullTextIndex(self.testDb).searchContent(ContentQuery(QueryParams(search)))
+        return [os.path.basename(name) for name in result]
+
+    def test(self) -> None:
+        updater = IndexUpdater(self.testDb)
+        updater.updateIndex(IndexConfiguration("test", ".c", self.testDir))
+        self.assertFalse(updater.hasSubTokens())
+        withoutSubTokens = [self.__search(search) for search in self.searches]
+        self.assertEqual(withoutSubTokens, [["a.c", "b.c", "d.c"], ["a.c"], ["e.c"], ["e.c"], ["a.c"]])
+
+        # Enabling the parts reads the unchanged files again
+        statistics = UpdateStatistics()
+        updater.updateIndex(IndexConfiguration("test", ".c", self.testDir, indexSubTokens=True), statistics)
+        self.assertEqual(statistics.nUpdated, 5)
+        self.assertTrue(updater.hasSubTokens())
+        q = updater.conn.cursor()
+        q.execute("SELECT keyword FROM keywords WHERE id IN (SELECT kwID FROM subTokens WHERE subToken='socket') ORDER BY keyword")
+        self.assertEqual([r[0] for r in q.fetchall()], ["createtcpsockethandler", "tcp_socket"])
+        clearCaches()
+        clearResultCache()
+        self.assertEqual([self.__search(search) for search in self.searches], withoutSubTokens)
+
+        updater.updateIndex(IndexConfiguration("test", ".c", self.testDir))
+        self.assertFalse(updater.hasSubTokens())
+
+
+class TestIndexTokenFilter(unittest.TestCase):
+    """Filtered tokens are not indexed but still found by reading the files."""
+
+    def setUp(self) -> None:
+        self.testDir = "test_tokenfilter"
+        self.testDb = "test-tokenfilter.dat"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        for name, text in [("a.c", "int x = 42; // 3f2504e0\n"), ("b.c", "int y = 7;\n"), ("c.json", "{ \"id\": 42 }\n")]:
+            with open(os.path.join(self.testDir, name), "w", encoding="utf-8") as fp:
+                fp.write(text)
+        delFile(self.testDb)
+        clearCaches()
+        clearResultCache()
+
+    def tearDown(self) -> None:
+        delDir(self.testDir)
+        for name in os.listdir("."):
+            if name.startswith(self.testDb):
+                delFile(name)
+
+    def __keywords(self, updater: IndexUpdater) -> List[str]:
+        q = updater.conn.cursor()
+        q.execute("SELECT keyword FROM keywords ORDER BY keyword")
+        return [r[0] for r in q.fetchall()]
+
+    def __search(self, search: str) -> List[str]:
+        result = FullTextIndex(self.testDb).searchContent(ContentQuery(QueryParams(search)))
+        return [os.path.basename(name) for name in result]
+
+    def test(self) -> None:
+        tokenFilter = TokenFilter(minLength=2, skipNumbers=True, skipHexBlobs=True, unfilteredExtensions=[".json"])
+        updater = IndexUpdater(self.testDb)
+        updater.updateIndex(IndexConfiguration("test", ".c,.json", self.testDir, tokenFilter=tokenFilter))
+        self.assertEqual(self.__keywords(updater), ["42", "id", "int"])
+        self.assertEqual(self.__search("42"), ["a.c", "c.json"])
+        self.assertEqual(self.__search("int y"), ["b.c"])
+        self.assertEqual(self.__search("3f2504e0"), ["a.c"])
+        self.assertEqual(self.__search("int x = 4*"), ["a.c"])
+        # Without a keyword in the index all files are read, unless the query doesn't allow it
+        with self.assertRaises(FullScanRequired) as context:
+            FullTextIndex(self.testDb).searchContent(ContentQuery(QueryParams("42", bAllowFullScan=False)))
+        self.assertEqual((context.exception.hiddenParts, context.exception.fileCount), (["42"], 3))
+        self.assertEqual(FullTextIndex(self.testDb).searchContent(ContentQuery(QueryParams("int x = 42", bAllowFullScan=False))), [os.path.join(self.testDir, "a.c")])
+
+        # Without filter all files are indexed again
+        statistics = UpdateStatistics()
+        updater.updateIndex(IndexConfiguration("test", ".c,.json", self.testDir), statistics)
+        self.assertEqual(statistics.nUpdated, 3)
+        self.assertIsNone(updater.tokenFilter())
+        self.assertEqual(self.__keywords(updater), ["3f2504e0", "42", "7", "id", "int", "x", "y"])
+
+
+class TestIndexContentSniffer(unittest.TestCase):
+    """Binary, generated and large files are skipped or indexed partially and the reason is recorded."""
+
+    def setUp(self) -> None:
+        self.testDir = "test_sniffer"
+        self.testDb = "test-sniffer.dat"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        files = [("a.c", b"int main;\n"),
+                 ("b.c", b"int binary\0\0\0\0\1\2\3\0"),
+                 ("c.js", b"var minified=1;" * 20 + b"\n"),
+                 ("d.c", b"int large;\n" * 200 + b"int tail_marker;\n")]
+        for name, data in files:
+            with open(os.path.join(self.testDir, name), "wb") as fp:
+                fp.write(data)
+        delFile(self.testDb)
+        clearCaches()
+        clearResultCache()
+
+    def tearDown(self) -> None:
+        delDir(self.testDir)
+        for name in os.listdir("."):
+            if name.startswith(self.testDb):
+                delFile(name)
+
+    def __search(self, search: str) -> List[str]:
+        result = FullTextIndex(self.testDb).searchContent(ContentQuery(QueryParams(search)))
+        return [os.path.basename(name) for name in result]
+
+    def test(self) -> None:
+        sniffer = ContentSniffer(maxFileSize=1, indexPartially=True, skipBinary=True, maxLineLength=200)
+        config = IndexConfiguration("test", ".c,.js", self.testDir, indexdb=self.testDb, contentSniffer=sniffer)
+        updater = IndexUpdater(self.testDb)
+        updater.updateIndex(config)
+        self.assertEqual(self.__search("int"), ["a.c", "d.c"])
+        self.assertEqual(self.__search("large"), ["d.c"])
+        self.assertEqual(self.__search("tail_marker"), [])
+        self.assertEqual(self.__search("minified"), [])
+        paths = [os.path.join(self.testDir, name) for name in ["a.c", "b.c", "c.js", "d.c"]]
+        reasons = FullTextIndex(self.testDb).skipReasons(paths)
+        self.assertEqual({os.path.basename(name): reason for name, reason in reasons.items()},
+                         {"b.c": SkipReason.Binary, "c.js": SkipReason.Generated, "d.c": SkipReason.Truncated})
+
+        # The file name search tells which of the found files the index skipped
+        result = SearchMethods().searchFileName(FileQuery(QueryParams("b")), config)
+        self.assertEqual(list(result.skipReasons.values()), [SkipReason.Binary])
+
+        # Without partial indexing the large file is skipped
+        updater.updateIndex(IndexConfiguration("test", ".c,.js", self.testDir, contentSniffer=ContentSniffer(maxFileSize=1)))
+        self.assertEqual(list(FullTextIndex(self.testDb).skipReasons(paths).values()), [SkipReason.TooLarge])
+        self.assertEqual(self.__search("int"), ["a.c", "b.c"])
+
+        # Without sniffing all files are indexed again
+        statistics = UpdateStatistics()
+        updater.updateIndex(IndexConfiguration("test", ".c,.js", self.testDir), statistics)
+        self.assertEqual(statistics.nUpdated, 4)
+        self.assertIsNone(updater.contentSniffer())
+        self.assertEqual(FullTextIndex(self.testDb).skipReasons(paths), {})
+        self.assertEqual(self.__search("tail_marker"), ["d.c"])
+
+
+class TestTokenizeChunks(unittest.TestCase):
+    """Large files are tokenized in chunks, tokens which span chunks are found completely."""
+
+    def setUp(self) -> None:
+        self.testDir = "test_chunks"
+        self.testDb = "test-chunks.dat"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        delFile(self.testDb)
+        clearCaches()
+        clearResultCache()
+
+    def tearDown(self) -> None:
+        delDir(self.testDir)
+        for name in os.listdir("."):
+            if name.startswith(self.testDb):
+                delFile(name)
+
+    def test_genTokens(self) -> None:
+        self.assertEqual(list(genTokens(["int fo", "o = b", "ar;", " #if"])), ["int", "foo", "bar", "#if"])
+        self.assertEqual(list(genTokens(["ab", "", "cd", " "])), ["abcd"])
+        self.assertEqual(list(genTokens(["abc", "def", "g h"], maxTokenLength=4)), ["abcdef", "g", "h"])
+        self.assertEqual(list(genTokens([])), [])
+
+    def test_largeFile(self) -> None:
+        # A token spans the first chunk boundary, a Latin1 character after it makes the file invalid UTF8
+        filler = b"x " * ((tokenizeChunkSize - 4) // 2)
+        data = filler + b"spanning " + filler + "caf\xe9 end\n".encode("latin_1")
+        with open(os.path.join(self.testDir, "large.c"), "wb") as fp:
+            fp.write(data)
+        updater = IndexUpdater(self.testDb)
+        updater.updateIndex(IndexConfiguration("test", ".c", self.testDir))
+        q = updater.conn.cursor()
+        q.execute("SELECT keyword FROM keywords ORDER BY keyword")
+        self.assertEqual([r[0] for r in q.fetchall()], ["caf\xe9", "end", "spanning", "x"])
+        q.execute("SELECT encoding FROM documents")
+        self.assertEqual(q.fetchone()[0], int(Encoding.Default))
+
+
+class TestKeywordCache(unittest.TestCase):
+    def test_lru(self) -> None:
+        cache: LruCache[str, str] = LruCache(10, len)
+        cache.put("a", "1234")
+        cache.put("b", "1234")
+        self.assertEqual(cache.get("a"), "1234")
+        # "b" is the least recently used entry and must go
+        cache.put("c", "1234")
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), "1234")
+        self.assertEqual(cache.get("c"), "1234")
+        # Too large for the budget
+        cache.put("d", "12345678901")
+        self.assertEqual(cache.get("d"), None)
+        stats = cache.statistics()
+        self.assertEqual((stats.hits, stats.misses, stats.entries, stats.size), (3, 2, 2, 8))
+        cache.resize(4)
+        self.assertEqual(cache.statistics().entries, 1)
+        self.assertEqual(cache.get("c"), "1234")
+
+    def test_generation(self) -> None:
+        testDir = "test_kwcache"
+        testDb = "test-kwcache.dat"
+        delDir(testDir)
+        os.makedirs(testDir)
+        try:
+            with open(os.path.join(testDir, "a.c"), "w") as fp:
+                fp.write("alpha beta\n")
+            delFile(testDb)
+            clearCaches()
+            config = IndexConfiguration("test", ".c", testDir)
+            IndexUpdater(testDb).updateIndex(config)
+            fti = FullTextIndex(testDb)
+            query = ContentQuery(QueryParams("alpha beta"))
+            self.assertEqual(fti.searchContent(query), [os.path.join(testDir, "a.c")])
+            self.assertEqual(fti.searchContent(query), [os.path.join(testDir, "a.c")])
+            self.assertEqual(postingCacheStatistics().hits, 2)
+
+            # A new generation must not use the postings of the old one
+            with open(os.path.join(testDir, "b.c"), "w") as fp:
+                fp.write("alpha beta\n")
+            IndexUpdater(testDb).updateIndex(config)
+            self.assertEqual(fti.searchContent(query), [os.path.join(testDir, "a.c"), os.path.join(testDir, "b.c")])
+            self.assertEqual(postingCacheStatistics().hits, 2)
+            self.assertEqual(postingCacheStatistics().entries, 2)
+        finally:
+            delDir(testDir)
+            for name in os.listdir("."):
+                if name.startswith(testDb):
+                    delFile(name)
+
+
+class TestResultCache(unittest.TestCase):
+    def test_cache(self) -> None:
+        testDir = "test_resultcache"
+        testDb = "test-resultcache.dat"
+        delDir(testDir)
+        os.makedirs(os.path.join(testDir, "sub"))
+        try:
+            for name in ["a.c", "b.h", os.path.join("sub", "c.c")]:
+                with open(os.path.join(testDir, name), "w") as fp:
+                    fp.write("int alpha = beta;\n")
+            delFile(testDb)
+            clearResultCache()
+            config = IndexConfiguration("test", ".c,.h", testDir, indexdb=testDb)
+            IndexUpdater(testDb).updateIndex(config)
+
+            def search(text: str, folders: str = "", extensions: str = "") -> List[str]:
+                result = SearchMethods().searchContent(ContentQuery(QueryParams(text, folders, extensions)), config, {})
+                self.assertTrue(result.perfReport)
+                self.lastReport = str(result.perfReport)
+                return result.matches
+
+            allFiles = [os.path.join(testDir, name) for name in ["a.c", "b.h", os.path.join("sub", "c.c")]]
+            self.assertEqual(search("alpha = beta"), allFiles)
+            self.assertIn("Not cached", self.lastReport)
+            # Same normalized query, served from the cache
+            self.assertEqual(search("ALPHA=Beta"), allFiles)
+            self.assertIn("3 cached matches", self.lastReport)
+            # Filtered variants are served from the cached unfiltered result
+            self.assertEqual(search("alpha = beta", extensions="c"), [allFiles[0], allFiles[2]])
+            self.assertIn("Filtered 3 cached matches", self.lastReport)
+            self.assertEqual(search("alpha = beta", folders="sub"), [allFiles[2]])
+            self.assertIn("Filtered 3 cached matches", self.lastReport)
+
+            # Changed files are only found after the next index update
+            with open(os.path.join(testDir, "b.h"), "w") as fp:
+                fp.write("int gamma;\n")
+            setModifyTimestamp(os.path.join(testDir, "b.h"), 1586099163.8849764)
+            self.assertEqual(search("alpha = beta"), allFiles)
+            IndexUpdater(testDb).updateIndex(config)
+            self.assertEqual(search("alpha = beta"), [allFiles[0], allFiles[2]])
+            self.assertIn("Not cached", self.lastReport)
+        finally:
+            delDir(testDir)
+            for name in os.listdir("."):
+                if name.startswith(testDb):
+                    delFile(name)
+
+
+class TestDocumentFilter(unittest.TestCase):
+    """The filter condition of the database must keep every document which passes the filters in Python."""
+
+    def test_condition(self) -> None:
+        paths = ["/src/net/Socket.h", "/src/net/socket.cpp", "/src/ui/Main.c", "/SRC/NET/x.H", "/src/größe/a.h",
+                 "/src/ſ/b.h", "/src/net_x/c.c", "/src/net%/d.c", "/test/.h", "/test/noext", "/build/a.c"]
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE documents (id INTEGER PRIMARY KEY, fullpath TEXT)")
+        conn.executemany("INSERT INTO documents (fullpath) VALUES (?)", ((path,) for path in paths))
+        filters = [("src/net", ""), ("net_", ""), ("net%", ""), ("s*net", ""), ("-build", ""), ("src,-net", ""), ("", "h"),
+                   ("", "c*,-cpp"), ("", "."), ("größe", "h"), ("src/?", ""), ("-größe", "-h")]
+        for folders, extensions in filters:
+            query = ContentQuery(QueryParams("x", folders, extensions))
+            expected = [path for path in paths if query.matchFolderAndExtensionFilter(path)]
+            condition = documentFilter(query)
+            if condition is None:
+                continue
+            stmt, params = condition
+            kept = [r[0] for r in conn.execute(f"SELECT fullpath FROM documents WHERE {stmt}", params)]
+            self.assertEqual([path for path in kept if query.matchFolderAndExtensionFilter(path)], expected, (folders, extensions))
+        # Only the folder excludes are pushed down, the extension exclude is checked in Python
+        self.assertIsNotNone(documentFilter(ContentQuery(QueryParams("x", "-build"))))
+        self.assertIsNone(documentFilter(ContentQuery(QueryParams("x", "", "-h"))))
+        conn.close()
+
+    def test_search(self) -> None:
+        testDir = "test_docfilter"
+        testDb = "test-docfilter.dat"
+        delDir(testDir)
+        for sub in ["net", "ui"]:
+            os.makedirs(os.path.join(testDir, sub))
+        try:
+            names = [os.path.join("net", "a.c"), os.path.join("net", "b.h"), os.path.join("ui", "c.c")]
+            for name in names:
+                with open(os.path.join(testDir, name), "w") as fp:
+                    fp.write("int alpha = beta;\n")
+            delFile(testDb)
+            clearCaches()
+            IndexUpdater(testDb).updateIndex(IndexConfiguration("test", ".c,.h", testDir))
+            fti = FullTextIndex(testDb)
+            perfReport = PerformanceReport()
+            result = fti.searchContent(ContentQuery(QueryParams("alpha", "net", "c")), perfReport)
+            self.assertEqual(result, [os.path.join(testDir, names[0])])
+            self.assertIn("1 documents pass the filters", str(perfReport))
+            result = fti.searchContent(ContentQuery(QueryParams("alpha = beta", "-ui")))
+            self.assertEqual(result, [os.path.join(testDir, name) for name in names[:2]])
+            self.assertEqual(fti.searchContent(ContentQuery(QueryParams("alpha", "missing"))), [])
+
+            # A scope restricts the search to the given files, e.g. to a locked result set
+            files = [os.path.join(testDir, name) for name in names]
+            scope = [files[1], files[2], "unknown.c"]
+            self.assertEqual(fti.searchContent(ContentQuery(QueryParams("alpha = beta")), scope=scope), files[1:])
+            self.assertEqual(fti.searchContent(ContentQuery(QueryParams("alpha", "", "c")), scope=scope), [files[2]])
+            self.assertEqual(fti.searchContent(ContentQuery(QueryParams("alpha")), scope=["unknown.c"]), [])
+
+            # The scoped result must not be cached as the result of the query
+            clearResultCache()
+            config = IndexConfiguration("test", ".c,.h", testDir, indexdb=testDb)
+            self.assertEqual(SearchMethods().searchContent(ContentQuery(QueryParams("alpha")), config, {}, scope=scope).matches, files[1:])
+            self.assertEqual(SearchMethods().searchContent(ContentQuery(QueryParams("alpha")), config, {}).matches, files)
+            self.assertEqual(SearchMethods().searchContent(ContentQuery(QueryParams("alpha")), config, {}, scope=scope).matches, files[1:])
+            config = IndexConfiguration("test", ".c,.h", testDir, indexUpdateMode=IndexMode.NoIndexWanted)
+            self.assertEqual(SearchMethods().searchContent(ContentQuery(QueryParams("alpha")), config, {}, scope=scope).matches, files[1:])
+        finally:
+            delDir(testDir)
+            for name in os.listdir("."):
+                if name.startswith(testDb):
+                    delFile(name)
+
+    def test_modified(self) -> None:
+        testDir = "test_modified"
+        testDb = "test-modified.dat"
+        delDir(testDir)
+        os.makedirs(testDir)
+        try:
+            now = time.time()
+            days = [400, 20, 2]
+            files = [os.path.join(testDir, name) for name in ["old.c", "month.c", "week.c"]]
+            for name, age in zip(files, days):
+                with open(name, "w") as fp:
+                    fp.write("int alpha = beta;\n")
+                os.utime(name, (now - age*86400, now - age*86400))
+            delFile(testDb)
+            clearCaches()
+            clearResultCache()
+            indexed = IndexConfiguration("test", ".c", testDir, indexdb=testDb, indexType=IndexType.FileContentAndName)
+            IndexUpdater(testDb).updateIndex(indexed)
+            direct = IndexConfiguration("test", ".c", testDir, indexUpdateMode=IndexMode.NoIndexWanted)
+            since30 = QueryParams("alpha", modifiedSince=now - 30*86400)
+            between = QueryParams("alpha = beta", modifiedSince=now - 30*86400, modifiedBefore=now - 7*86400)
+            for config in [indexed, direct]:
+                self.assertEqual(SearchMethods().searchContent(ContentQuery(since30), config, {}).matches, sorted(files[1:]))
+                self.assertEqual(SearchMethods().searchContent(ContentQuery(between), config, {}).matches, [files[1]])
+                # A cached result of the query without time filter must not be used
+                self.assertEqual(len(SearchMethods().searchContent(ContentQuery(QueryParams("alpha")), config, {}).matches), 3)
+                self.assertEqual(SearchMethods().searchContent(ContentQuery(since30), config, {}).matches, sorted(files[1:]))
+                names = QueryParams("*", modifiedBefore=now - 7*86400)
+                self.assertEqual(SearchMethods().searchFileName(FileQuery(names), config).matches, sorted(files[:2]))
+                self.assertEqual(orderByRecency(sorted(files), config), files[::-1])
+            condition = documentFilter(ContentQuery(between))
+            self.assertIsNotNone(condition)
+            assert condition is not None
+            self.assertEqual(condition[1], [now - 30*86400, now - 7*86400])
+
+            # The bound of the search page only changes every hour, the same search is answered by the result cache
+            self.assertEqual(modifiedWithin(30, 7200.5), modifiedWithin(30, 10799.0))
+            self.assertLess(modifiedWithin(30, 10800.0) - modifiedWithin(30, 10799.0), 3601)
+            clearResultCache()
+            reports = []
+            for _ in range(2):
+                result = SearchMethods().searchContent(ContentQuery(QueryParams("alpha", modifiedSince=modifiedWithin(30))), indexed, {})
+                self.assertEqual(result.matches, sorted(files[1:]))
+                reports.append(str(result.perfReport))
+            self.assertIn("Not cached", reports[0])
+            self.assertIn("2 cached matches", reports[1])
+        finally:
+            delDir(testDir)
+            for name in os.listdir("."):
+                if name.startswith(testDb):
+                    delFile(name)
+
+
+class TestFuzzyFileNames(unittest.TestCase):
+    def test_search(self) -> None:
+        testDir = "test_fuzzy"
+        testDb = "test-fuzzy.dat"
+        delDir(testDir)
+        for sub in ["a", "b"]:
+            os.makedirs(os.path.join(testDir, sub))
+        try:
+            names = [os.path.join("a", "FooBarController.cpp"), os.path.join("b", "FooBarController.cpp"),
+                     os.path.join("a", "FooBarController.h"), os.path.join("a", "fabric.cpp"), os.path.join("b", "Other.cpp")]
+            files = [os.path.join(testDir, name) for name in names]
+            for name in files:
+                with open(name, "w") as fp:
+                    fp.write("int x;\n")
+            delFile(testDb)
+            indexed = IndexConfiguration("test", ".cpp,.h", testDir, indexdb=testDb, indexType=IndexType.FileName)
+            IndexUpdater(testDb).updateIndex(indexed)
+            direct = IndexConfiguration("test", ".cpp,.h", testDir, indexUpdateMode=IndexMode.NoIndexWanted)
+            for config in [indexed, direct]:
+                # The best ranked name comes first, the files with the same name are sorted
+                result = SearchMethods().searchFileNameFuzzy(FileQuery(QueryParams("fbctl")), config).matches
+                self.assertEqual(result[0], files[2])
+                self.assertEqual(sorted(result[1:]), files[:2])
+                self.assertEqual(SearchMethods().searchFileNameFuzzy(FileQuery(QueryParams("fbctl.cpp")), config).matches, files[:2])
+                self.assertEqual(SearchMethods().searchFileNameFuzzy(FileQuery(QueryParams("fbc", os.sep + "b" + os.sep)), config).matches, [files[1]])
+                self.assertEqual(SearchMethods().searchFileNameFuzzy(FileQuery(QueryParams("xyz")), config).matches, [])
+        finally:
+            delDir(testDir)
+            clearFileListings()
+            for name in os.listdir("."):
+                if name.startswith(testDb):
+                    delFile(name)
+
+
+class TestEncodingHints(unittest.TestCase):
+    def test_hints(self) -> None:
+        testDir = "test_encodinghints"
+        testDb = "test-encodinghints.dat"
+        delDir(testDir)
+        os.makedirs(testDir)
+        try:
+            files = {"latin.c": "int \xe4lpha = beta;\n".encode("latin_1"),
+                     "utf8.c": "int \xe4lpha = beta;\n".encode("utf_8"),
+                     "bom.c": codecs.BOM_UTF16_LE + "int \xe4lpha = beta;\n".encode("utf_16_le")}
+            for name, content in files.items():
+                with open(os.path.join(testDir, name), "wb") as fp:
+                    fp.write(content)
+            delFile(testDb)
+            clearResultCache()
+            config = IndexConfiguration("test", ".c", testDir, indexdb=testDb)
+            IndexUpdater(testDb).updateIndex(config)
+
+            # The upgrade of an index without encodings records them for unchanged files
+            with sqlite3.connect(testDb) as conn:
+                conn.execute("UPDATE documents SET encoding=NULL")
+            IndexUpdater(testDb).updateIndex(config)
+
+            result = SearchMethods().searchContent(ContentQuery(QueryParams("\xe4lpha = beta")), config, {})
+            self.assertEqual(len(result.matches), 3)
+            hints = {os.path.basename(name): encoding for name, encoding in result.encodingHints.items()}
+            self.assertEqual(hints, {"latin.c": Encoding.Default, "utf8.c": Encoding.UTF8, "bom.c": Encoding.UTF16_BOM})
+        finally:
+            delDir(testDir)
+            for name in os.listdir("."):
+                if name.startswith(testDb):
+                    delFile(name)
+
+
+class TestOpenWhileUpdating(unittest.TestCase):
+    """Searches open the database without writing to it. An index written by an older version can be searched while
+       an update holds the write lock."""
+
+    def setUp(self) -> None:
+        self.testDir = "test_openwhileupdating"
+        self.testDb = "test-openwhileupdating.dat"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        with open(os.path.join(self.testDir, "a.c"), "w", encoding="utf-8") as fp:
+            fp.write("int alpha;\n")
+        delFile(self.testDb)
+        clearCaches()
+        clearResultCache()
+
+    def tearDown(self) -> None:
+        delDir(self.testDir)
+        for name in os.listdir("."):
+            if name.startswith(self.testDb):
+                delFile(name)
+
+    def __hasObject(self, name: str) -> bool:
+        conn = sqlite3.connect(self.testDb)
+        try:
+            return conn.execute("SELECT 1 FROM sqlite_master WHERE name=?", (name,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def test(self) -> None:
+        config = IndexConfiguration("test", ".c", self.testDir, indexdb=self.testDb)
+        IndexUpdater(self.testDb).updateIndex(config)
+        # Older versions didn't create these
+        conn = sqlite3.connect(self.testDb)
+        conn.execute("DROP INDEX i_documents_timestamp")
+        conn.execute("DROP TABLE indexSettings")
+        conn.commit()
+        conn.close()
+
+        lock = sqlite3.connect(self.testDb)
+        try:
+            lock.execute("BEGIN IMMEDIATE")
+            fti = FullTextIndex(self.testDb)
+            self.assertEqual(len(fti.searchContent(ContentQuery(QueryParams("alpha")))), 1)
+            self.assertIsNone(fti.tokenFilter())
+            self.assertIsNone(fti.contentSniffer())
+            del fti
+        finally:
+            lock.rollback()
+            lock.close()
+        self.assertFalse(self.__hasObject("i_documents_timestamp"))
+        self.assertFalse(self.__hasObject("indexSettings"))
+
+        # The update adds them
+        IndexUpdater(self.testDb).updateIndex(config)
+        self.assertTrue(self.__hasObject("i_documents_timestamp"))
+        self.assertTrue(self.__hasObject("indexSettings"))
+
+
+class TestVerification(unittest.TestCase):
+    def setUp(self) -> None:
+        self.testDir = "test_verification"
+        delDir(self.testDir)
+        os.makedirs(self.testDir)
+        self.files = []
+        for i in range(50):
+            name = os.path.join(self.testDir, "file%02u.c" % (i,))
+            with open(name, "w") as fp:
+                if i % 3 == 0:
+                    fp.write("// alpha beta\n")
+                else:
+                    fp.write("alpha beta\n" if i % 2 else "alpha gamma\n")
+            self.files.append(name)
+        self.files.append(os.path.join(self.testDir, "missing.c"))
+
+    def tearDown(self) -> None:
+        configureVerification(defaultThreads)
+        configureRegExBudget(defaultFileBudget, defaultSearchBudget)
+        delDir(self.testDir)
+
+    def __expected(self, excludeComments: bool) -> List[str]:
+        return [name for i, name in enumerate(self.files[:50]) if (i % 2 or i % 3 == 0) and not (excludeComments and i % 3 == 0)]
+
+    def __verify(self, excludeComments: bool) -> List[str]:
+        commentRule = CommentRule(re.compile("//.*"), None, None, False)
+        query = ContentQuery(QueryParams("alpha beta", bExcludeComments=excludeComments, commentRuleFetcher=lambda _: commentRule))
+        progress: List[int] = []
+        batches: List[List[str]] = []
+        result = verifyFiles(query, self.files, reportProgress=progress.append, fileCount=len(self.files), reportMatches=batches.append)
+        self.assertEqual(progress[-1], 100)
+        self.assertIsNotNone(result)
+        # The streamed batches add up to the result
+        self.assertEqual([name for batch in batches for name in batch], result)
+        return result or []
+
+    def test_sequential(self) -> None:
+        configureVerification(1)
+        self.assertEqual(self.__verify(False), self.__expected(False))
+        self.assertEqual(self.__verify(True), self.__expected(True))
+
+    def test_threads(self) -> None:
+        configureVerification(4)
+        self.assertEqual(self.__verify(False), self.__expected(False))
+        self.assertEqual(self.__verify(True), self.__expected(True))
+
+    def test_processes(self) -> None:
+        configureVerification(1, 2)
+        self.assertEqual(self.__verify(False), self.__expected(False))
+        self.assertEqual(self.__verify(True), self.__expected(True))
+
+    def test_cancel(self) -> None:
+        configureVerification(4)
+        cancelEvent = threading.Event()
+        cancelEvent.set()
+        query = ContentQuery(QueryParams("alpha beta"))
+        self.assertIsNone(verifyFiles(query, self.files, cancelEvent))
+
+    def test_cancel_large_file(self) -> None:
+        name = os.path.join(self.testDir, "large.c")
+        with open(name, "wb") as fp:
+            fp.write(b"x" * mmapThreshold + b" alpha beta")
+        query = ContentQuery(QueryParams("alpha beta"))
+        cancelEvent = threading.Event()
+        self.assertTrue(matchesFile(query, name, None, cancelEvent=cancelEvent))
+        cancelEvent.set()
+        self.assertFalse(matchesFile(query, name, None, cancelEvent=cancelEvent))
+
+    def test_bytes(self) -> None:
+        def check(content: bytes, expected: bool, excludeComments: bool = False) -> None:
+            name = os.path.join(self.testDir, "bytes.c")
+            with open(name, "wb") as fp:
+                fp.write(content)
+            commentRule = CommentRule(re.compile("//.*"), None, None, False)
+            query = ContentQuery(QueryParams("foo bar", bExcludeComments=excludeComments))
+            self.assertEqual(matchesFile(query, name, commentRule), expected, content[:40])
+
+        check(b"int foo bar;", True)
+        check(b"int foo_bar;", False)
+        check(b"\r\nfoo\r\n  bar", True)
+        check(b"x" * mmapThreshold + b" foo bar", True)
+        check(b"x" * mmapThreshold + b" foo", False)
+        check(codecs.BOM_UTF8 + b"foo bar", True)
+        check("foo bar".encode("utf_16_le"), False)
+        check(codecs.BOM_UTF16_LE + "foo bar".encode("utf_16_le"), True)
+        # '\xe4' is a word character, there is no word boundary in front of 'foo'
+        check("\xe4foo bar".encode("utf_8"), False)
+        check("\xe4 foo bar".encode("utf_8"), True)
+        check("\xe4foo bar".encode("latin_1"), False)
+        check(b"// foo bar", False, True)
+        check(b"// foo bar\nfoo bar", True, True)
+
+    def __startPaged(self, pager: VerificationPager, cancelEvent: Optional[threading.Event]=None) -> Tuple[threading.Thread, List[List[str]]]:
+        query = ContentQuery(QueryParams("alpha beta"))
+        result: List[List[str]] = []
+        def verify() -> None:
+            matches = verifyFiles(query, self.files, cancelEvent, fileCount=len(self.files), pager=pager)
+            if matches is not None:
+                result.append(matches)
+        thread = threading.Thread(target=verify)
+        thread.start()
+        while not pager.isPaused():
+            self.assertTrue(thread.is_alive())
+            time.sleep(0.01)
+        return thread, result
+
+    def test_pager(self) -> None:
+        configureVerification(1)
+        pager = VerificationPager(5, minCandidates=10)
+        thread, result = self.__startPaged(pager)
+        estimate = pager.estimatedMatches()
+        self.assertIsNotNone(estimate)
+        pager.requestMore()
+        pager.requestAll()
+        thread.join()
+        self.assertEqual(result, [self.__expected(False)])
+        self.assertIsNone(pager.estimatedMatches())
+
+    def test_pager_cancel(self) -> None:
+        configureVerification(4)
+        cancelEvent = threading.Event()
+        pager = VerificationPager(5, minCandidates=10)
+        thread, result = self.__startPaged(pager, cancelEvent)
+        cancelEvent.set()
+        thread.join()
+        self.assertEqual(result, [])
+
+    def test_pager_small_result(self) -> None:
+        # Less candidates than minCandidates are verified without pause
+        configureVerification(1)
+        query = ContentQuery(QueryParams("alpha beta"))
+        pager = VerificationPager(5)
+        self.assertEqual(verifyFiles(query, self.files, fileCount=len(self.files), pager=pager), self.__expected(False))
+
+    def __verifyGuarded(self) -> Tuple[Optional[List[str]], SkippedFiles]:
+        fast = os.path.join(self.testDir, "fast.c")
+        slow = os.path.join(self.testDir, "slow.c")
+        with open(fast, "w") as fp:
+            fp.write("alpha aax\n")
+        with open(slow, "w") as fp:
+            fp.write("alpha " + "a" * 40 + "\n")
+        query = ContentQuery(QueryParams("alpha <!(?:a+)+x!>"))
+        self.assertTrue(isGuarded(query))
+        skippedFiles: SkippedFiles = {}
+        # Once the budget of the search is exhausted all remaining files are skipped, the slow file comes last
+        result = verifyFiles(query, [fast] + self.files + [slow], skippedFiles=skippedFiles)
+        self.assertEqual(result, [fast])
+        self.assertEqual(list(skippedFiles), [slow])
+        return result, skippedFiles
+
+    def test_guarded(self) -> None:
+        self.assertFalse(isGuarded(ContentQuery(QueryParams("alpha beta"))))
+        configureRegExBudget(0.5, 0)
+        for threads in (1, 4):
+            configureVerification(threads)
+            _, skippedFiles = self.__verifyGuarded()
+            self.assertIn("file exceeded", next(iter(skippedFiles.values())))
+        configureRegExBudget(0, 0.5)
+        _, skippedFiles = self.__verifyGuarded()
+        self.assertIn("search exceeded", next(iter(skippedFiles.values())))
+        configureRegExBudget(0, 0)
+        self.assertFalse(isGuarded(ContentQuery(QueryParams("alpha <!(?:a+)+x!>"))))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,7 @@
 import sys
 from cx_Freeze import setup, Executable  # type: ignore[import-untyped]
 import AppConfig
+import FreezeConfig
 
 options = {
     "build_exe": {
@@ -16,7 +17,8 @@ if sys.platform == "win32":
     targetBase = "gui"
     targetCodeBeagle = "CodeBeagle.exe"
     targetUpdateIndex = "UpdateIndex.exe"
-    options["build_exe"]["excludes"] = "distutils,html,multiprocessing,lib2to3,xml,test,tkinter,pydoc_data,bz2,queue,lzma,ssl,pyreadline,decimal,curses,zipfile,sysconfig"
+    # FreezeConfig.TestFreezeConfig checks that the search still imports with these modules excluded
+    options["build_exe"]["excludes"] = ",".join(FreezeConfig.windowsExcludes)
 else:
     print("Using Linux/MacOS settings")
     codeBeagleScript = "CodeBeagle.py"
@@ -17,7 +17,7 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import threading
-from typing import Callable, Any, Optional, cast
+from typing import Callable, Any, Optional, Set, List, cast
 from PyQt5.QtCore import QThread, pyqtSlot, QObject, pyqtSignal
 from PyQt5.QtWidgets import QWidget
 from dialogs.ProgressBar import ProgressBar
@@ -44,14 +44,17 @@ class AsynchronousTask (QThread):
         if self.bEnableCancel:
             self.cancelEvent = threading.Event()
 
+    def _kwArgs(self) -> dict[str, Any]:
+        kwArgs: dict[str, Any]  = {
+            "cancelEvent": self.cancelEvent
+        }
+        if self.emitProgress:
+            kwArgs["reportProgress"] = self._emitProgress
+        return kwArgs
+
     def run(self) -> None:
         try:
-            kwArgs: dict[str, Any]  = {
-                "cancelEvent": self.cancelEvent
-            }
-            if self.emitProgress:
-                kwArgs["reportProgress"] = self._emitProgress
-            self.result = self.function(*self.args, **kwArgs)
+            self.result = self.function(*self.args, **self._kwArgs())
         except Exception as e:
             self.exception = e
             self.hasException = True
@@ -67,6 +70,37 @@ class AsynchronousTask (QThread):
         """Emit progress signal - Qt will marshal to main thread."""
         self.progressChanged.emit(percent)
 
+class StreamingTask (AsynchronousTask):
+    """A task which runs without a modal progress bar. The function is passed the named parameter 'reportMatches'
+       which emits the signal 'matchesFound'. Connect to 'finished' to fetch the result."""
+    matchesFound = pyqtSignal(list)
+
+    def __init__(self, function: Callable[..., Any], *args: Any, cancelAction: Optional[CancelFunction]=None) -> None:
+        super().__init__(function, *args, bEnableCancel=True, cancelAction=cancelAction, emitProgress=True)
+        self.finished.connect(self.__release)
+
+    def _kwArgs(self) -> dict[str, Any]:
+        kwArgs = super()._kwArgs()
+        kwArgs["reportMatches"] = self._emitMatches
+        return kwArgs
+
+    def _emitMatches(self, matches: List[str]) -> None:
+        self.matchesFound.emit(matches)
+
+    def start(self, priority: QThread.Priority = QThread.Priority.InheritPriority) -> None:
+        # The thread object must stay alive until the thread has finished even if the caller drops it
+        _runningTasks.add(self)
+        super().start(priority)
+
+    def isCanceled(self) -> bool:
+        return bool(self.cancelEvent and self.cancelEvent.is_set())
+
+    @pyqtSlot()
+    def __release(self) -> None:
+        _runningTasks.discard(self)
+
+_runningTasks: Set[StreamingTask] = set()
+
 def execute(parent: QObject, func: Callable[..., Any], *args: Any, bEnableCancel: bool=False, cancelAction: Optional[CancelFunction]=None, hasProgress: bool = False) -> Any:
     """
     Executes the action performed by the callable 'func' called with *args in a seperate thread.
@@ -19,10 +19,11 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 from enum import IntEnum
 import sys
 import os
+import io
 import codecs
 import time
 import collections
-from typing import IO, DefaultDict, Any, Optional, Literal, Tuple, cast
+from typing import IO, BinaryIO, DefaultDict, Any, Optional, Literal, Tuple, Callable, Iterator, List, cast
 import unittest
 
 # pylint: disable=import-outside-toplevel
@@ -37,31 +38,31 @@ class Encoding(IntEnum):
     UTF8_BOM = 3,
     UTF16_BOM = 4
 
+def detectBom(start: bytes) -> Tuple[Optional[str], int]:
+    """Returns the codec and the size of the byte order mark at the start of a file or (None, 0) if there is none."""
+    if start.startswith(codecs.BOM_UTF8):
+        return ("utf_8", 3)
+    if start.startswith(codecs.BOM_UTF16_LE):
+        return ("utf_16_le", 2)
+    if start.startswith(codecs.BOM_UTF16_BE):
+        return ("utf_16_be", 2)
+    return (None, 0)
+
 def fopenEx (name:str, mode: str='r', defaultEncoding: Optional[str]="latin_1") -> Tuple[IO[str], Encoding]:
-    f = open(name, mode, -1, "latin-1")
+    """Opens a text file for reading. The encoding is taken from the byte order mark, otherwise 'defaultEncoding' is used."""
+    if mode not in ("r", "rt"):
+        raise ValueError("Text files can only be opened for reading")
+    # The file is opened once in binary mode and wrapped after the byte order mark has been checked
+    f = open(name, "rb")
     try:
-        start = f.read(3)
-        if len(start) >=3:
-            if codecs.BOM_UTF8 == bytes(start[:3],"latin-1"):
-                f.close()
-                return (open (name, mode, -1, "utf_8_sig"), Encoding.UTF8_BOM)
-        if len(start) >=2:
-            bom = bytes(start[:2],"latin-1")
-            if codecs.BOM_UTF16_LE == bom:
-                f.close()
-                f = open (name, mode, -1, "utf_16_le")
-                f.seek(2)
-                return (f, Encoding.UTF16_BOM)
-            if codecs.BOM_UTF16_BE == bom:
-                f.close()
-                f = open (name, mode, -1, "utf_16_be")
-                f.seek(2)
-                return (f, Encoding.UTF16_BOM)
-            if defaultEncoding and defaultEncoding != "latin-1":
-                f.close()
-                return (open(name, mode, -1, defaultEncoding), Encoding.Default)
-        f.seek(0)
-        return (f, Encoding.Default)
+        codec, bomSize = detectBom(f.peek(3)[:3])
+        if codec:
+            f.seek(bomSize)
+            encoding = Encoding.UTF8_BOM if bomSize == 3 else Encoding.UTF16_BOM
+        else:
+            codec = defaultEncoding or "latin_1"
+            encoding = Encoding.Default
+        return (io.TextIOWrapper(f, codec), encoding)
     except:
         f.close()
         raise
@@ -69,35 +70,107 @@ def fopenEx (name:str, mode: str='r', defaultEncoding: Optional[str]="latin_1")
 def fopen (name: str, mode: str='r', defaultEncoding: str="latin_1") -> IO[str]:
     return fopenEx(name, mode, defaultEncoding)[0]
 
-def freadall(name: str, mode: str='r', defaultEncoding: str="latin_1") -> str:
+def decodeText(data: bytes, defaultEncoding: str="latin_1", encodingHint: Optional[Encoding]=None) -> Tuple[str, Encoding]:
+    """
+    Decodes the content of a text file and translates the line ends to '\\n' like reading the file in text mode.
+    If the data does not start with a byte order mark it is first decoded using UTF8 and if this fails using
+    the given defaultEncoding. An 'encodingHint' of Encoding.Default skips the attempt to decode UTF8.
+    Returns the text and the encoding.
+    """
+    codec, bomSize = detectBom(data[:3])
+    if codec:
+        text = str(data[bomSize:], codec)
+        encoding = Encoding.UTF8_BOM if bomSize == 3 else Encoding.UTF16_BOM
+    elif encodingHint == Encoding.Default and defaultEncoding != "utf_8":
+        text = str(data, defaultEncoding)
+        encoding = Encoding.Default
+    else:
+        try:
+            text = str(data, "utf_8")
+            encoding = Encoding.UTF8
+        except UnicodeDecodeError:
+            if defaultEncoding == "utf_8": # already tried that
+                raise
+            text = str(data, defaultEncoding)
+            encoding = Encoding.Default
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return (text, encoding)
+
+def _genDecodedChunks(f: BinaryIO, codec: str, chunkSize: int, limit: int) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(codec)()
+    remaining = limit
+    while True:
+        data = f.read(chunkSize if remaining < 0 else min(chunkSize, remaining))
+        if not data:
+            if remaining != 0:
+                # A character which is cut at the end of the file is an error like in decodeText
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield tail
+            return
+        text = decoder.decode(data)
+        if remaining > 0:
+            remaining -= len(data)
+            if remaining == 0:
+                # The limit cuts the file, the last line may be incomplete
+                end = text.rfind("\n") + 1
+                yield text[:end] if end else text
+                return
+        if text:
+            yield text
+
+def decodeChunks(f: BinaryIO, consume: Callable[[Iterator[str]], None], chunkSize: int, defaultEncoding: str="latin_1",
+                 limit: int=-1) -> Encoding:
+    """
+    Decodes a file opened in binary mode chunk by chunk and passes the chunks to 'consume'. The encoding is detected
+    like decodeText does but only one chunk is kept in memory. If the file turns out not to be UTF8 'consume' is called
+    a second time with the chunks decoded using 'defaultEncoding' and must discard what it received before. If 'limit'
+    is passed only the start of the file up to the last line end before the limit is decoded. Line ends are not
+    translated. Returns the encoding.
+    """
+    f.seek(0)
+    codec, bomSize = detectBom(f.read(3))
+    attempts: List[Tuple[str, Encoding]]
+    if codec:
+        attempts = [(codec, Encoding.UTF8_BOM if bomSize == 3 else Encoding.UTF16_BOM)]
+    elif defaultEncoding == "utf_8":
+        attempts = [("utf_8", Encoding.UTF8)]
+    else:
+        attempts = [("utf_8", Encoding.UTF8), (defaultEncoding, Encoding.Default)]
+    limit = max(limit - bomSize, 0) if limit >= 0 else -1
+    for codec, encoding in attempts[:-1]:
+        f.seek(bomSize)
+        try:
+            consume(_genDecodedChunks(f, codec, chunkSize, limit))
+            return encoding
+        except UnicodeDecodeError:
+            pass
+    codec, encoding = attempts[-1]
+    f.seek(bomSize)
+    consume(_genDecodedChunks(f, codec, chunkSize, limit))
+    return encoding
+
+def freadall(name: str, mode: str='r', defaultEncoding: str="latin_1", encodingHint: Optional[Encoding]=None) -> str:
     """
     Reads the whole content of a text file. If the file does not contain a byte order mark
     the content is first decoded using UTF8 and if this fails using the given defaultEncoding
     if that differs from UTF8.
     """
-    return freadallEx(name, mode, defaultEncoding)[0]
+    return freadallEx(name, mode, defaultEncoding, encodingHint)[0]
 
-def freadallEx(name: str, mode: str='r', defaultEncoding: str="latin_1") -> Tuple[str, Encoding]:
+def freadallEx(name: str, mode: str='r', defaultEncoding: str="latin_1", encodingHint: Optional[Encoding]=None) -> Tuple[str, Encoding]:
     """
     Reads the whole content of a text file. If the file does not contain a byte order mark
     the content is first decoded using UTF8 and if this fails using the given defaultEncoding
-    if that differs from UTF8.
+    if that differs from UTF8. The file is read once and decoded in memory, see decodeText.
     Returns the text and the encoding.
     """
-    try:
-        file, encoding = fopenEx(name, mode, defaultEncoding="utf_8")
-        with file:
-            text = file.read()
-            if encoding == Encoding.Default:
-                encoding = Encoding.UTF8
-            return (text, encoding)
-    except:
-        if defaultEncoding == "utf_8": # already tried that
-            raise
-        file, _ = fopenEx(name, mode, defaultEncoding=defaultEncoding)
-        with file:
-            text = file.read()
-            return (text, Encoding.Default)
+    if mode not in ("r", "rt"):
+        raise ValueError("Text files can only be read in text mode")
+    with open(name, "rb") as file:
+        data = file.read()
+    return decodeText(data, defaultEncoding, encodingHint)
 
 def getAppDataPath (appName: str) -> str:
     """
@@ -274,6 +347,33 @@ class TestConfig(unittest.TestCase):
         self.assertEqual(res[0], "äö")
         self.assertEqual(res[1], Encoding.UTF16_BOM)       
 
+    def test_decodeText(self) -> None:
+        self.assertEqual(decodeText("äö\r\n\r".encode("utf_8")), ("äö\n\n", Encoding.UTF8))
+        self.assertEqual(decodeText("äö".encode("latin_1")), ("äö", Encoding.Default))
+        self.assertEqual(decodeText(codecs.BOM_UTF8 + "äö".encode("utf_8")), ("äö", Encoding.UTF8_BOM))
+        self.assertEqual(decodeText(codecs.BOM_UTF16_BE + "äö".encode("utf_16_be")), ("äö", Encoding.UTF16_BOM))
+        # The hint skips the attempt to decode UTF8
+        self.assertEqual(decodeText("ä".encode("utf_8"), encodingHint=Encoding.Default), ("Ã¤", Encoding.Default))
+        self.assertRaises(UnicodeDecodeError, decodeText, "äö".encode("latin_1"), "utf_8")
+
+    def test_decodeChunks(self) -> None:
+        def decode(data: bytes, chunkSize: int = 2, limit: int = -1) -> Tuple[List[str], Encoding]:
+            chunks: List[str] = []
+            def consume(decoded: Iterator[str]) -> None:
+                chunks.clear()
+                chunks.extend(decoded)
+            encoding = decodeChunks(io.BytesIO(data), consume, chunkSize, limit=limit)
+            return chunks, encoding
+        # Characters which span chunks are decoded completely
+        self.assertEqual(decode("aäöb".encode("utf_8")), (["a", "ä", "öb"], Encoding.UTF8))
+        self.assertEqual(decode("aäöb".encode("latin_1")), (["aä", "öb"], Encoding.Default))
+        self.assertEqual(decode(codecs.BOM_UTF8 + "äö".encode("utf_8")), (["ä", "ö"], Encoding.UTF8_BOM))
+        self.assertEqual(decode(codecs.BOM_UTF16_LE + "ab\ncd".encode("utf_16_le"), 4), (["ab", "\nc", "d"], Encoding.UTF16_BOM))
+        # The limit cuts after the last line end
+        self.assertEqual(decode(b"ab\ncd\nef", 8, limit=7), (["ab\ncd\n"], Encoding.UTF8))
+        self.assertEqual(decode("ab\nä".encode("utf_8"), 8, limit=4), (["ab\n"], Encoding.UTF8))
+        self.assertEqual(decode("abcd".encode("utf_8"), 2, limit=3), (["ab", "c"], Encoding.UTF8))
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -16,7 +16,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
-from typing import Tuple, Pattern, List, Optional, Iterable
+from typing import Tuple, Pattern, Optional, Iterable
 import re
 import threading
 from PyQt5.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
@@ -24,7 +24,7 @@ from PyQt5.QtWidgets import QWidget
 from PyQt5.QtGui import QFocusEvent, QColor
 from tools.AsynchronousTask import AsynchronousTask
 from .Ui_InDocumentSearchWidget import Ui_InDocumentSearchWidget
-from fulltextindex.IStringMatcher import IStringMatcher, MatchPosition
+from fulltextindex.IStringMatcher import IStringMatcher, MatchPosition, MatchList
 
 class StringMatcher (IStringMatcher):
     def __init__(self) -> None:
@@ -48,22 +48,22 @@ class StringMatcher (IStringMatcher):
                 return
 
 class InDocumentSearchResult:
-    def __init__(self, results: List[MatchPosition], matcher: Optional[IStringMatcher]) -> None:
+    def __init__(self, results: MatchList, matcher: Optional[IStringMatcher]) -> None:
         self.results = results
         self.matcher = matcher
 
 def findAllMatches(text: str, searchRegex: Pattern[str], cancelEvent: threading.Event) -> InDocumentSearchResult:
     if not text or not searchRegex:
-        return InDocumentSearchResult([], None)
+        return InDocumentSearchResult(MatchList(), None)
 
     matcher = StringMatcher()
     matcher.setRegex(searchRegex)
 
-    results: List[MatchPosition] = []
-    for match in matcher.matches(text):
-        results.append(match)
+    results = MatchList()
+    for index, length in matcher.matches(text):
+        results.append(index, length)
         if cancelEvent and cancelEvent.is_set():
-            return InDocumentSearchResult([], None)
+            return InDocumentSearchResult(MatchList(), None)
 
     return InDocumentSearchResult(results, matcher)
 
@@ -97,7 +97,7 @@ class InDocumentSearchWidget(QWidget):
         self.text = ""
         self.searchRegex: Optional[Pattern[str]] = None
         self.currentMatch = -1
-        self.matches: List[MatchPosition] = []
+        self.matches = MatchList()
         self.ui.labelCurrentMatch.setText("")
 
     def setSearch(self, search: str) -> None:
@@ -127,7 +127,7 @@ class InDocumentSearchWidget(QWidget):
         self.__updateCurrentMatch(num)
         self.__enableButtons()
 
-    def __setMatches(self, results: List[MatchPosition]) -> None:
+    def __setMatches(self, results: MatchList) -> None:
         self.matches = results
         self.currentMatch = -1
         self.__updateCurrentMatch(0)
@@ -161,12 +161,12 @@ class InDocumentSearchWidget(QWidget):
         self.__startSearch()
 
     def __startSearch(self) -> None:
-        self.__setMatches([])
+        self.__setMatches(MatchList())
 
         text = self.text
         searchRegex = self.searchRegex
         if not text or not searchRegex:
-            self.searchFinished.emit(InDocumentSearchResult([],None))
+            self.searchFinished.emit(InDocumentSearchResult(MatchList(),None))
             return
 
         if self.__searchTask:
@@ -17,13 +17,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 from typing import Tuple, List, Optional, Pattern, Union
-import bisect
 import re
 import unittest
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QTextCharFormat, QFont, QBrush, QColor
 from fulltextindex.IStringMatcher import IStringMatcher
-from fulltextindex.CommentDetection import TextSpan, analyzeText, isInsideTextSpan
+from fulltextindex.CommentDetection import TextSpans, analyzeText
 
 type foregroundType = QBrush|Qt.GlobalColor|QColor
 
@@ -108,8 +107,8 @@ class SyntaxHighlighter:
         self.searchStringFormats[1].setBackground(SyntaxHighlighter.match2BackgroundColor)
         self.searchStringFormats[1].setForeground(SyntaxHighlighter.match2ForegroundColor)
 
-        self.strings: List[TextSpan]  = []
-        self.comments: List[TextSpan]  = []
+        self.strings = TextSpans()
+        self.comments = TextSpans()
         self.searchDatas: List[Optional[IStringMatcher]] = [None, None]
         self.filename = ""
 
@@ -126,11 +125,12 @@ class SyntaxHighlighter:
                 strFormat.setFont(rules.font)
             strFormat.setFontWeight(QFont.Bold)
 
-    # Find all comments in the document and store them as TextSpan objects in self.comments
+    # Find all strings and comments in the document and store them in self.strings and self.comments
     def setTextDocument(self, text: str, filename: str = "") -> None:
         self.filename = filename
         if not self.highlightingRules:
-            self.comments = []
+            self.strings = TextSpans()
+            self.comments = TextSpans()
             return
 
         # Use the shared comment detection logic from CommentDetection module
@@ -179,15 +179,14 @@ class SyntaxHighlighter:
         return formats
     
     @staticmethod
-    def __colorizeTextSpans(text: str, position: int, textSpans: List[TextSpan], format: QTextCharFormat, formats: List[Tuple[QTextCharFormat, int, int]]) -> None:
-        pos = bisect.bisect_right (textSpans,  TextSpan(position))
-        if pos > 0:
-            pos -= 1
-        while pos < len(textSpans):
-            textSpan = textSpans[pos]
+    def __colorizeTextSpans(text: str, position: int, textSpans: TextSpans, format: QTextCharFormat, formats: List[Tuple[QTextCharFormat, int, int]]) -> None:
+        starts, ends = textSpans.starts, textSpans.ends
+        pos = textSpans.indexAt(position)
+        while pos < len(starts):
+            start = starts[pos]
             # Comment or string starts before end of line
-            if textSpan.index < position+len(text):
-                formats.append((format, textSpan.index-position, textSpan.length))
+            if start < position+len(text):
+                formats.append((format, start-position, ends[pos]-start))
             else:
                 break
             pos += 1
@@ -205,10 +204,10 @@ class SyntaxHighlighter:
         return formats
 
     def isInsideComment(self, position: int) -> bool:
-        return isInsideTextSpan(position, self.comments)
+        return self.comments.contains(position)
 
     def isInsideString(self, position: int) -> bool:
-        return isInsideTextSpan(position, self.strings)
+        return self.strings.contains(position)
     
 class TestCommentDetectionWithStrings(unittest.TestCase):
     """Test that comment markers inside strings are not treated as comments."""